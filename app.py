@@ -1,5 +1,8 @@
+import threading
+
 import flet as ft
-import sqlite3
+
+import suumo_db
 
 def main(page: ft.Page):
     page.title = "SUUMO賃貸データ検索アプリ"
@@ -9,37 +12,53 @@ def main(page: ft.Page):
     page.padding = 20
 
     # 1. データベースからデータを取る関数
-    def get_data_from_db(keyword=""):
-        conn = sqlite3.connect('suumo.db')
-        cur = conn.cursor()
-        
-        if keyword:
-            query = """
-                SELECT name, station, price, age, floor_plan 
-                FROM properties 
-                WHERE station LIKE ? OR name LIKE ?
-            """
-            cur.execute(query, (f'%{keyword}%', f'%{keyword}%'))
-        else:
-            cur.execute("SELECT name, station, price, age, floor_plan FROM properties LIMIT 100")
-            
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+    #    テーブル・索引の確認は起動時の1回だけにして、接続を使い回す
+    #    （イベント処理は別のスレッドから呼ばれることがあるので、ロックして1つずつ使う）
+    conn = suumo_db.get_connection(check_same_thread=False)
+    db_lock = threading.Lock()
+
+    #    登録順なら id で続きを取得（キーセットページング）、それ以外の並び順は OFFSET で1ページずつ取得する
+    #    件数は別の COUNT クエリで数える。3文字以上のキーワードは全文検索索引（FTS5）から関連度順に、
+    #    2文字以下は駅の一覧から名前に含む駅を探して取得する
+    def get_page_from_db(keyword="", filters=None, sort="rank", descending=False, after_id=0, offset=0):
+        with db_lock:
+            if suumo_db.uses_keyset_paging(keyword, sort, descending):
+                return suumo_db.query_properties(conn, keyword, filters, "id", after_id=after_id)
+            return suumo_db.query_properties(conn, keyword, filters, sort, descending, offset=offset)
+
+    def count_in_db(keyword="", filters=None):
+        with db_lock:
+            return suumo_db.count_properties(conn, keyword, filters)
+
+    def get_floor_plans_from_db():
+        with db_lock:
+            return suumo_db.get_floor_plans(conn)
+
+    def get_station_names_from_db():
+        with db_lock:
+            return suumo_db.get_station_names(conn)
+
+    def get_price_summary_from_db():
+        # 集計テーブルから読むだけなので、物件が何件あってもすぐ返る
+        with db_lock:
+            return suumo_db.get_price_by_plan(conn)
+
+    # 2. データを画面の「表」の行に変換する関数（読み込んだページの分だけ作る）
+    column_widths = [260, 260, 110, 80, 90]
 
-    # 2. データを画面の「表」に変換する関数
     def create_table_rows(data):
         rows = []
         for row in data:
             rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(row[0], size=12, weight="bold")), # 物件名
-                        ft.DataCell(ft.Text(row[1], size=12)),                # 駅
-                        ft.DataCell(ft.Text(f"{row[2]:,}円", color="blue")),  # 家賃
-                        ft.DataCell(ft.Text(f"築{row[3]}年")),                # 築年数
-                        ft.DataCell(ft.Text(row[4])),                         # 間取り
-                    ]
+                ft.Row(
+                    controls=[
+                        ft.Text(row[1], size=12, weight="bold", width=column_widths[0]), # 物件名
+                        ft.Text(row[2], size=12, width=column_widths[1]),                # 駅
+                        ft.Text(f"{row[3]:,}円", color="blue", width=column_widths[2]),  # 家賃
+                        ft.Text(f"築{row[4]}年", width=column_widths[3]),                # 築年数
+                        ft.Text(row[5], width=column_widths[4]),                         # 間取り
+                    ],
+                    height=32,
                 )
             )
         return rows
@@ -48,35 +67,151 @@ def main(page: ft.Page):
     title_text = ft.Text("賃貸データ分析ダッシュボード", size=24, weight="bold", color="teal")
     status_text = ft.Text("データを読み込み中...", color="grey")
 
-    data_table = ft.DataTable(
-        columns=[
-            ft.DataColumn(ft.Text("物件名")),
-            ft.DataColumn(ft.Text("最寄駅")),
-            ft.DataColumn(ft.Text("家賃"), numeric=True),
-            ft.DataColumn(ft.Text("築年数"), numeric=True),
-            ft.DataColumn(ft.Text("間取り")),
+    header_row = ft.Container(
+        content=ft.Row(
+            controls=[
+                ft.Text(label, weight="bold", width=width)
+                for label, width in zip(["物件名", "最寄駅", "家賃", "築年数", "間取り"], column_widths)
+            ]
+        ),
+        bgcolor="blueGrey50",
+        padding=5,
+    )
+
+    # 間取りごとの家賃の相場（中央値の棒と、四分位の範囲）
+    def create_summary_rows(summary):
+        max_price = max((row[6] for row in summary), default=0) or 1
+        rows = []
+        for plan, listings, mean, low, q1, median, q3, high in summary:
+            rows.append(
+                ft.Row(
+                    controls=[
+                        ft.Text(plan, width=90),
+                        ft.Container(width=400 * median / max_price, height=14, bgcolor="teal200",
+                                     border_radius=3),
+                        ft.Text(f"中央値 {median / 10000:.1f}万円（{q1 / 10000:.1f}〜{q3 / 10000:.1f}万円）"
+                                f" / {listings:,} 件", size=12),
+                    ],
+                    height=20,
+                )
+            )
+        return rows
+
+    summary_column = ft.Column(create_summary_rows(get_price_summary_from_db()), spacing=2)
+    summary_container = ft.Container(content=summary_column, padding=10, visible=False)
+
+    def toggle_summary(e):
+        summary_container.visible = not summary_container.visible
+        page.update()
+
+    summary_button = ft.TextButton(content=ft.Text("間取り別の家賃相場"), on_click=toggle_summary)
+
+    # ListView は画面に見えている行だけを描画する。下端までスクロールしたら次のページを読み込む
+    result_list = ft.ListView(
+        controls=[],
+        item_extent=32,
+        expand=True,
+        on_scroll_interval=100,
+    )
+
+    # 現在の検索条件と読み込み状況
+    state = {"keyword": "", "filters": {}, "sort": "rank", "descending": False,
+             "last_id": 0, "loaded": 0, "total": 0, "done": False, "loading": False}
+
+    def load_next_page():
+        if state["done"] or state["loading"]:
+            return
+        state["loading"] = True
+        try:
+            rows = get_page_from_db(state["keyword"], state["filters"], state["sort"], state["descending"],
+                                    after_id=state["last_id"], offset=state["loaded"])
+            if len(rows) < suumo_db.PAGE_SIZE:
+                state["done"] = True
+            if rows:
+                state["last_id"] = rows[-1][0]
+                state["loaded"] += len(rows)
+                result_list.controls.extend(create_table_rows(rows))
+            status_text.value = f"検索結果: {state['total']:,} 件（{state['loaded']:,} 件表示中）"
+            page.update()
+        finally:
+            state["loading"] = False
+
+    # 絞り込み・並び替えの入力欄
+    price_min_field = ft.TextField(label="家賃 下限(万円)", width=130, keyboard_type=ft.KeyboardType.NUMBER)
+    price_max_field = ft.TextField(label="家賃 上限(万円)", width=130, keyboard_type=ft.KeyboardType.NUMBER)
+    age_max_field = ft.TextField(label="築年数 上限(年)", width=130, keyboard_type=ft.KeyboardType.NUMBER)
+    floor_min_field = ft.TextField(label="階数 下限(階)", width=130, keyboard_type=ft.KeyboardType.NUMBER)
+    area_min_field = ft.TextField(label="面積 下限(m²)", width=130, keyboard_type=ft.KeyboardType.NUMBER)
+    walk_max_field = ft.TextField(label="駅徒歩 上限(分)", width=130, keyboard_type=ft.KeyboardType.NUMBER)
+    floor_plan_checks = [ft.Checkbox(label=plan, value=False) for plan in get_floor_plans_from_db()]
+    station_dropdown = ft.Dropdown(
+        label="駅",
+        width=150,
+        value="",
+        options=[ft.dropdown.Option(key="", text="すべて")]
+                + [ft.dropdown.Option(key=name, text=f"{name}駅") for name in get_station_names_from_db()],
+    )
+    sort_dropdown = ft.Dropdown(
+        label="並び替え",
+        width=150,
+        value="rank",
+        options=[
+            ft.dropdown.Option(key="rank", text="関連度順"),
+            ft.dropdown.Option(key="id", text="登録順"),
+            ft.dropdown.Option(key="price", text="家賃"),
+            ft.dropdown.Option(key="age", text="築年数"),
+            ft.dropdown.Option(key="floor", text="階数"),
+            ft.dropdown.Option(key="area", text="面積"),
+            ft.dropdown.Option(key="walk", text="駅徒歩"),
+            ft.dropdown.Option(key="floor_plan", text="間取り"),
         ],
-        rows=[],
-        border=ft.border.all(1, "grey"),
-        vertical_lines=ft.border.BorderSide(1, "grey"),
-        heading_row_color="blueGrey50", 
-        expand=True
     )
+    descending_check = ft.Checkbox(label="降順", value=False)
+
+    def to_number(field, scale=1):
+        # 空欄・数字以外は条件なし
+        try:
+            return int(float(field.value) * scale)
+        except (TypeError, ValueError):
+            return None
+
+    def read_filters():
+        return {
+            "price_min": to_number(price_min_field, 10000),
+            "price_max": to_number(price_max_field, 10000),
+            "age_max": to_number(age_max_field),
+            "floor_min": to_number(floor_min_field),
+            "area_min": to_number(area_min_field),
+            "walk_max": to_number(walk_max_field),
+            "floor_plans": [check.label for check in floor_plan_checks if check.value],
+            "station": station_dropdown.value or None,
+        }
 
     # 4. イベント処理
     def search_click(e):
-        keyword = search_field.value
-        results = get_data_from_db(keyword)
-        data_table.rows = create_table_rows(results)
-        
-        if len(results) == 0:
+        keyword = search_field.value or ""
+        filters = read_filters()
+        state.update(keyword=keyword, filters=filters, sort=sort_dropdown.value or "rank",
+                     descending=bool(descending_check.value), last_id=0, loaded=0, done=False)
+        state["total"] = count_in_db(keyword, filters)
+        result_list.controls.clear()
+
+        if state["total"] == 0:
+            state["done"] = True
             status_text.value = "データが見つかりませんでした。"
             status_text.color = "red"
-        else:
-            status_text.value = f"検索結果: {len(results)} 件"
-            status_text.color = "black"
-            
-        page.update()
+            page.update()
+            return
+
+        status_text.color = "black"
+        load_next_page()
+
+    def on_list_scroll(e):
+        # 下端の手前まで来たら次のページを読み込む
+        if e.max_scroll_extent is not None and e.pixels >= e.max_scroll_extent - 200:
+            load_next_page()
+
+    result_list.on_scroll = on_list_scroll
 
     search_field = ft.TextField(
         label="駅名や物件名で検索（例: 新宿）", 
@@ -87,18 +222,19 @@ def main(page: ft.Page):
     
     search_button = ft.ElevatedButton(content=ft.Text("検索"), on_click=search_click)
 
-    initial_data = get_data_from_db()
-    data_table.rows = create_table_rows(initial_data)
-    status_text.value = f"全データ表示中（最新100件）"
-
     page.add(
         ft.Column([
             title_text,
             ft.Divider(),
             ft.Row([search_field, search_button], alignment="center"),
+            ft.Row([price_min_field, price_max_field, age_max_field, floor_min_field,
+                    area_min_field, walk_max_field, station_dropdown, sort_dropdown, descending_check], alignment="center", wrap=True),
+            ft.Row(floor_plan_checks, alignment="center", wrap=True),
+            summary_button,
+            summary_container,
             status_text,
             ft.Container(
-                content=ft.Column([data_table], scroll=ft.ScrollMode.AUTO),
+                content=ft.Column([header_row, result_list]),
                 height=500,
                 border=ft.border.all(1, "grey50"),
                 border_radius=10,
@@ -107,5 +243,8 @@ def main(page: ft.Page):
         ])
     )
 
+    # 初期表示（全データを先頭から）
+    search_click(None)
+
 if __name__ == "__main__":
-    ft.app(target=main)
\ No newline at end of file
+    ft.app(target=main)
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import contextvars
+import threading
+import time
+
+# 表示すべきでない（取り消された・後のクリックに置き換えられた）ことを表す値
+SUPERSEDED = object()
+
+# 実行中の処理の取り消し要求（スレッド側からは cancel_requested() で確認する）
+_cancel_token = contextvars.ContextVar("area_task_cancel_token", default=None)
+
+
+def cancel_requested():
+    """AreaTaskRunner で実行中の処理が取り消されていれば True（スレッドの中から呼ぶ）"""
+    token = _cancel_token.get()
+    return token is not None and token.is_set()
+
+
+class AreaTaskRunner:
+    """Fletのイベントハンドラから重い処理をスレッドで実行するための管理クラス
+
+    - 同じ (地域, 種類) の処理が実行中なら、新しく実行せずにその結果を待つ（連打をまとめる）
+    - 同じ地域の別の種類の処理が実行中なら、それを取り消す
+    - 最後にクリックされた処理以外は SUPERSEDED を返し、画面に反映させない
+
+    実行中のスレッドは外から止められないため、取り消しても始まっている通信やSQLは最後まで動く。
+    取り消し要求はスレッドの中から cancel_requested() で確認できるので、通信の後のDB書き込みなど
+    区切りのよいところで確認して打ち切る。
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._tokens = {}
+        self._latest = None
+
+    async def run(self, area_code: str, kind: str, func):
+        """func(area_code) をスレッドで実行して結果を返す"""
+        key = (area_code, kind)
+        self._latest = key
+
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            for other_key, other in list(self._inflight.items()):
+                if other_key[0] == area_code and other_key != key:
+                    self._tokens[other].set()
+                    other.cancel()
+                    del self._inflight[other_key]
+            token = threading.Event()
+            task = asyncio.ensure_future(self._call(func, area_code, token))
+            self._inflight[key] = task
+            self._tokens[task] = token
+            task.add_done_callback(lambda t: self._forget(key, t))
+
+        try:
+            # 待っている側が取り消されても、共有しているタスク自体は止めない
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            return SUPERSEDED
+
+        if self._latest != key:
+            return SUPERSEDED
+        return result
+
+    @staticmethod
+    async def _call(func, area_code, token):
+        # to_thread は現在のコンテキストをコピーするので、スレッド側で token を参照できる
+        _cancel_token.set(token)
+        return await asyncio.to_thread(func, area_code)
+
+    def _forget(self, key, task):
+        self._tokens.pop(task, None)
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def inflight_count(self):
+        """実行中の処理数"""
+        return sum(1 for task in self._inflight.values() if not task.done())
+
+
+async def _measure_lag(stop, interval=0.01):
+    """イベントループが interval ごとに動けているかを測り、最大の遅れ [ms] を返す"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst * 1000
+
+
+def responsiveness_test(delay: float = 0.5, clicks: int = 5):
+    """遅いスタブサーバーに対してボタンの処理を実行し、画面（イベントループ）の応答性を確かめる
+
+    1. 以前のようにハンドラの中で直接取得した場合のループの止まり方
+    2. 同じ地域の連打（clicks 回）が1回の取得にまとめられること
+    3. 同じ地域の別の種類のクリックで、前の処理のDB書き込みが打ち切られること
+    を測り、結果を辞書で返す。
+    """
+    import tempfile
+
+    import requests
+
+    from jma_fetcher import FORECAST_PATH_TEMPLATE, build_stub_directory, start_stub_server
+
+    area_code = "130000"
+    counts = {"fetches": 0, "writes": 0}
+    lock = threading.Lock()
+
+    with tempfile.TemporaryDirectory() as directory:
+        build_stub_directory(directory)
+        server, base_url = start_stub_server(directory, delay=delay)
+        session = requests.Session()
+
+        def fetch_and_store(code):
+            # weather_app_with_db.get_weather_forecast_api と同じく、取得してからDBに書き込む
+            with lock:
+                counts["fetches"] += 1
+            data = session.get(base_url + FORECAST_PATH_TEMPLATE.format(code), timeout=10).json()
+            if cancel_requested():
+                return None
+            with lock:
+                counts["writes"] += 1
+            return data[0]["reportDatetime"]
+
+        def load_from_db(code):
+            return "DB"
+
+        async def blocking_click():
+            fetch_and_store(area_code)
+
+        async def scenario(clicks_coroutine):
+            stop = asyncio.Event()
+            lag_task = asyncio.create_task(_measure_lag(stop))
+            await asyncio.sleep(0.05)
+            started = time.perf_counter()
+            results = await clicks_coroutine()
+            elapsed = time.perf_counter() - started
+            stop.set()
+            return await lag_task, elapsed, results
+
+        async def duplicate_clicks():
+            runner = AreaTaskRunner()
+            return await asyncio.gather(*(runner.run(area_code, "API", fetch_and_store)
+                                          for _ in range(clicks)))
+
+        async def api_then_db():
+            runner = AreaTaskRunner()
+            api = asyncio.create_task(runner.run(area_code, "API", fetch_and_store))
+            await asyncio.sleep(delay / 5)
+            db_result = await runner.run(area_code, "DB", load_from_db)
+            api_result = await api
+            # 取り消されたスレッドが通信を終えてDB書き込みを判断するまで待つ
+            await asyncio.sleep(delay)
+            return api_result, db_result
+
+        try:
+            blocking_lag, _, _ = asyncio.run(scenario(blocking_click))
+
+            counts.update(fetches=0, writes=0)
+            duplicate_lag, duplicate_elapsed, results = asyncio.run(scenario(duplicate_clicks))
+            duplicate_counts = dict(counts)
+
+            counts.update(fetches=0, writes=0)
+            _, _, (api_result, db_result) = asyncio.run(scenario(api_then_db))
+            cancel_counts = dict(counts)
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+    return {
+        "delay_ms": delay * 1000,
+        "blocking_max_lag_ms": round(blocking_lag, 1),
+        "async_max_lag_ms": round(duplicate_lag, 1),
+        "clicks": clicks,
+        "fetches": duplicate_counts["fetches"],
+        "clicks_elapsed_ms": round(duplicate_elapsed * 1000, 1),
+        "all_clicks_rendered": all(r is not SUPERSEDED and r is not None for r in results),
+        "cancelled_api_superseded": api_result is SUPERSEDED and db_result == "DB",
+        "cancelled_api_writes": cancel_counts["writes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ボタンの処理をスレッドで実行したときの応答性を測る")
+    parser.add_argument("--delay", type=float, default=0.5, help="スタブサーバーが応答ごとに待つ秒数")
+    parser.add_argument("--clicks", type=int, default=5, help="同じ地域を連打する回数")
+    args = parser.parse_args()
+
+    result = responsiveness_test(args.delay, args.clicks)
+    print(f"応答の遅れ {result['delay_ms']:.0f} ms のサーバーに対して")
+    print(f"  ハンドラ内で直接取得: イベントループの最大停止 {result['blocking_max_lag_ms']} ms")
+    print(f"  AreaTaskRunner 経由: イベントループの最大停止 {result['async_max_lag_ms']} ms")
+    print(f"  {result['clicks']} 回の連打 → 取得 {result['fetches']} 回 / {result['clicks_elapsed_ms']} ms")
+    print(f"  取り消した取得のDB書き込み: {result['cancelled_api_writes']} 回")
+
+    assert result["async_max_lag_ms"] < result["delay_ms"] / 2, "イベントループが止まっています"
+    assert result["fetches"] == 1 and result["all_clicks_rendered"], "連打がまとめられていません"
+    assert result["cancelled_api_superseded"] and result["cancelled_api_writes"] == 0, "取り消しが効いていません"
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,42 @@
 # Extended with Scientific Calculation features (sin, cos, log, etc.).
 # Original Source: https://github.com/flet-dev/examples/tree/main/python/apps/calc
 
+import re
+from decimal import Decimal
+from fractions import Fraction
+
 import flet as ft
-import math
+
+import calc_engine
+
+# 式の最後の数（"12.5" / "π" / "50%"）と、括弧の前の関数名
+LAST_NUMBER_PATTERN = re.compile(r'(?:\d+\.?\d*|\.\d+|π)%*$')
+FUNCTION_NAME_PATTERN = re.compile(r'[a-z]+$')
+# 分数の分子・分母がこの桁数を超えたら小数の近似で表示する
+MAX_FRACTION_DIGITS = 30
+
+
+def split_last_operand(expression):
+    """式を (前の部分, 最後の数または括弧のまとまり) に分ける（最後が数や ")" でなければ None）
+
+    "2+9" → ("2+", "9")、"2*(1+3)" → ("2*", "(1+3)")、"1+sin(2)" → ("1+", "sin(2)")
+    """
+    if expression.endswith(")"):
+        depth = 0
+        for position in range(len(expression) - 1, -1, -1):
+            if expression[position] == ")":
+                depth += 1
+            elif expression[position] == "(":
+                depth -= 1
+                if depth == 0:
+                    name = FUNCTION_NAME_PATTERN.search(expression[:position])
+                    start = name.start() if name else position
+                    return expression[:start], expression[start:]
+        return None
+    match = LAST_NUMBER_PATTERN.search(expression)
+    if match:
+        return expression[:match.start()], match.group()
+    return None
 
 # ボタン定義
 class CalcButton(ft.ElevatedButton):
@@ -44,8 +78,11 @@ class CalculatorApp(ft.Container):
     def __init__(self):
         super().__init__()
         self.reset()
+        # 数の型（float / decimal / fraction）。decimal の桁数は calc_engine.DECIMAL_PRECISION
+        self.backend = calc_engine.get_backend("float")
 
         self.result = ft.Text(value="0", color=ft.Colors.WHITE, size=30, text_align="right") # 修正
+        self.mode = ft.Text(value=self.backend.name, color=ft.Colors.WHITE54, size=12)
         self.width = 370 
         self.bgcolor = ft.Colors.BLACK    # 修正: colors -> Colors
         self.border_radius = ft.border_radius.all(20)
@@ -76,12 +113,20 @@ class CalculatorApp(ft.Container):
                         ScienceButton(text=")", button_clicked=self.button_clicked),
                     ]
                 ),
+                # 数の型の切り替え（decimal: 10進数で精度を指定、fraction: 分数で誤差なし）
+                ft.Row(
+                    controls=[
+                        ScienceButton(text="float", button_clicked=self.button_clicked),
+                        ScienceButton(text="decimal", button_clicked=self.button_clicked),
+                        ScienceButton(text="fraction", button_clicked=self.button_clicked),
+                    ]
+                ),
             ]
         )
 
         self.content = ft.Column(
             controls=[
-                ft.Row(controls=[self.result], alignment="end"),
+                ft.Row(controls=[self.mode, self.result], alignment="spaceBetween"),
                 
                 # 科学計算エリア
                 self.sci_rows,
@@ -136,103 +181,103 @@ class CalculatorApp(ft.Container):
         if self.result.value == "Error" or data == "AC":
             self.result.value = "0"
             self.reset()
-        
+            self.update()
+            return
+
         elif data == "Sci":
             self.sci_rows.visible = not self.sci_rows.visible
-            self.update()
 
-        elif data in ("1", "2", "3", "4", "5", "6", "7", "8", "9", "0", "."):
-            if self.result.value == "0" or self.new_operand == True:
-                self.result.value = data
-                self.new_operand = False
-            else:
-                self.result.value = self.result.value + data
+        elif data in calc_engine.BACKEND_NAMES:
+            self.backend = calc_engine.get_backend(data)
+            self.mode.value = self.backend.name
 
-        elif data in ("+", "-", "*", "/", "^"):
-            self.result.value = self.calculate(self.operand1, float(self.result.value), self.operator)
-            self.operator = data
-            if self.result.value == "Error":
-                self.operand1 = "0"
-            else:
-                self.operand1 = float(self.result.value)
-            self.new_operand = True
-
-        elif data in ("="):
-            self.result.value = self.calculate(self.operand1, float(self.result.value), self.operator)
-            self.reset()
+        elif data in ("1", "2", "3", "4", "5", "6", "7", "8", "9", "0", ".", "π", "("):
+            # 計算結果の後に数を押したら新しい式にする
+            if self.new_operand or self.expression == "0":
+                self.expression = ""
+            self.expression += data
+            self.new_operand = False
 
-        elif data in ("%"):
-            self.result.value = self.format_number(float(self.result.value) / 100)
-            self.reset()
-        
-        elif data == "π":
-            self.result.value = str(math.pi)
+        elif data in ("+", "-", "*", "/", "^", "%", ")"):
+            # 計算結果の後に演算子を押したら結果の続きから
+            if not self.expression and data != "-":
+                self.expression = "0"
+            self.expression += data
             self.new_operand = False
 
         elif data in ("sin", "cos", "tan", "log", "sqrt"):
-            try:
-                val = float(self.result.value)
-                res = 0
-                if data == "sin":
-                    res = math.sin(val)
-                elif data == "cos":
-                    res = math.cos(val)
-                elif data == "tan":
-                    res = math.tan(val)
-                elif data == "log":
-                    if val <= 0: res = "Error"
-                    else: res = math.log(val)
-                elif data == "sqrt":
-                    if val < 0: res = "Error"
-                    else: res = math.sqrt(val)
-                
-                if res == "Error":
-                    self.result.value = "Error"
-                else:
-                    self.result.value = self.format_number(res)
-                
-                self.new_operand = True 
+            if self.new_operand and self.expression:
+                # 計算結果にそのまま関数をかける
+                self.expression = f"{data}({self.expression})"
+                self.evaluate_expression()
+            elif not self.new_operand and split_last_operand(self.expression):
+                # 入力中の数にかける（"9" → sqrt(9)、"2+9" → 2+sqrt(9)）
+                head, operand = split_last_operand(self.expression)
+                self.expression = f"{head}{data}({operand})"
+                if not head:
+                    self.evaluate_expression()
+            else:
+                if self.new_operand:
+                    self.expression = ""
+                self.expression += f"{data}("
+                self.new_operand = False
 
-            except Exception:
-                self.result.value = "Error"
+        elif data == "=":
+            # 末尾の二項演算子は無視し、何も無ければ 0 とする（"" → 0、"5+" → 5）
+            self.expression = self.expression.rstrip("+-*/^") or "0"
+            self.evaluate_expression()
 
-        elif data in ("+/-"):
-            if float(self.result.value) > 0:
-                self.result.value = "-" + str(self.result.value)
-            elif float(self.result.value) < 0:
-                self.result.value = str(self.format_number(abs(float(self.result.value))))
+        elif data == "+/-":
+            if self.expression:
+                self.expression = f"-({self.expression})"
+                self.evaluate_expression()
 
+        if self.result.value != "Error" and not self.new_operand:
+            self.result.value = self.expression or "0"
         self.update()
 
+    def evaluate_expression(self):
+        """入力した式を計算して表示する（表示用の整形はここで1回だけ）"""
+        try:
+            raw = calc_engine.evaluate(self.expression, backend=self.backend)
+            value = self.format_number(raw)
+            text = str(value)
+        except (ArithmeticError, ValueError):    # CalcError・大きすぎて文字列にできない数
+            self.result.value = "Error"
+            self.reset()
+            return
+        self.result.value = text
+        # 続けて入力するときは結果をひとまとまりの数として扱う（"-5" や "1/3" の後の ^ など）
+        if self.backend.name != "float" and (isinstance(value, float) or value != raw or "E" in text):
+            # 表示が近似・指数表記のとき（sqrt(2)、大きな分数、1E+30 など）は、
+            # 表示の値を読み直さずに式のまま続ける
+            self.expression = f"({self.expression})"
+        elif isinstance(value, Fraction) or value < 0:
+            self.expression = f"({value})"
+        else:
+            self.expression = str(value)
+        self.new_operand = True
+
     def format_number(self, num):
         if isinstance(num, str): return num 
-        if num % 1 == 0:
+        if isinstance(num, Fraction):
+            if max(abs(num.numerator), num.denominator).bit_length() > MAX_FRACTION_DIGITS * 10 // 3:
+                # 巨大な分数は小数の近似（float に収まらなければ OverflowError → Error）
+                return float(num)
+            return int(num) if num.denominator == 1 else num    # 分数のまま（"1/3"）
+        elif isinstance(num, Decimal):
+            # 精度の桁数以上の数では num % 1 が InvalidOperation になるので、整数に丸めた値と比べる。
+            # 精度より桁の多い整数は指数表記のまま（"1E+5000"。int にすると桁数の上限を超える）
+            if num == num.to_integral_value() and num.adjusted() < calc_engine.DECIMAL_PRECISION:
+                return int(num)
+            return num.normalize()     # 指定した精度のまま（丸めない）
+        elif num % 1 == 0:
             return int(num)
         else:
             return round(num, 10)
 
-    def calculate(self, operand1, operand2, operator):
-        try:
-            if operator == "+":
-                return self.format_number(operand1 + operand2)
-            elif operator == "-":
-                return self.format_number(operand1 - operand2)
-            elif operator == "*":
-                return self.format_number(operand1 * operand2)
-            elif operator == "/":
-                if operand2 == 0:
-                    return "Error"
-                else:
-                    return self.format_number(operand1 / operand2)
-            elif operator == "^":
-                return self.format_number(math.pow(operand1, operand2))
-        except Exception:
-            return "Error"
-        return "Error"
-
     def reset(self):
-        self.operator = "+"
-        self.operand1 = 0
+        self.expression = ""
         self.new_operand = True
 
 
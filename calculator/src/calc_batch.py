@@ -0,0 +1,250 @@
+"""電卓の式を NumPy の配列の列全体に対して計算する（画面なしで使う一括計算）
+
+式は calc_engine と同じ文法で、変数に列の配列を渡す。命令ごとに配列全体を1回で計算する。
+電卓で "Error" になる行（0での割り算、log の引数が0以下、sqrt の引数が負、最後の値が大きすぎる）は
+例外にせず、マスクした行として返す。入力が NULL（NaN）の行もマスクする。
+途中で ±inf / NaN になっても電卓と同じく計算を続け、有限かどうかは最後の結果だけで調べる
+（1/(x*1e308) は電卓でも 0）。
+
+    evaluate_batch("(price + management_fee) / floor_area", {"price": ..., ...})
+    evaluate_table(conn, "price / 10000")        # suumo.db の properties の列で計算する
+
+使い方:
+    python calc_batch.py --db ../../suumo.db "price / 10000"    # suumo.db の家賃を万円にする
+    python calc_batch.py --bench 1000000                       # 1行ずつの計算と速さを比べる
+    python calc_batch.py --check                               # 境界の値で1行ずつの計算と結果を比べる
+"""
+
+import argparse
+import math
+import sqlite3
+import time
+
+import numpy as np
+
+from calc_engine import CONST, UNARY, VAR, CalcError, compile_expression
+
+NUMPY_UNARY = {
+    "neg": np.negative,
+    "percent": lambda x: x / 100,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "log": np.log,
+    "sqrt": np.sqrt,
+}
+NUMPY_BINARY = {
+    "+": np.add,
+    "-": np.subtract,
+    "*": np.multiply,
+    "/": np.divide,
+    "^": np.power,
+}
+
+# calc_engine（math の関数）が例外を出す条件。NumPy は例外を出さずに inf / NaN を返すので、
+# 同じ行を Error にするためにここで調べる（引数と結果を受け取り、Error の行を True にする）
+NUMPY_UNARY_ERRORS = {
+    "sin": lambda x, result: np.isinf(x),
+    "cos": lambda x, result: np.isinf(x),
+    "tan": lambda x, result: np.isinf(x),
+    "log": lambda x, result: x <= 0,
+    "sqrt": lambda x, result: x < 0,
+}
+NUMPY_BINARY_ERRORS = {
+    "/": lambda a, b, result: b == 0,
+    # math.pow: 0 の負の乗、負の数の整数でない乗、有限の数どうしでのあふれ
+    "^": lambda a, b, result: np.isfinite(a) & np.isfinite(b) & (
+        ((a == 0) & (b < 0)) | ((a < 0) & (b != np.floor(b))) | np.isinf(result)),
+}
+
+# evaluate_batch と1行ずつの計算が一致するかを調べる式（途中の inf・定義域の境界を含む）
+CHECK_EXPRESSIONS = (
+    "1/(x*1e308)",
+    "(x*1e308) - (y*1e308)",
+    "x / y",
+    "log(x) - log(y)",
+    "sqrt(x) + sqrt(y)",
+    "x ^ y",
+    "0 ^ y",
+    "x ^ 0.5",
+    "10 ^ (x * 100)",
+    "sin(x * 1e308)",
+    "tan(x) / cos(y)",
+    "sqrt(x) + log(y) / (x - y) + sin(x)^2",
+)
+
+
+def _as_column(values):
+    """入力の列を float64 の配列にする（マスクされた行と None は NaN）"""
+    if np.ma.isMaskedArray(values):
+        values = values.astype(float).filled(np.nan)
+    return np.asarray(values, dtype=float)
+
+
+def evaluate_batch(source: str, columns=None, length: int = None):
+    """式を列 columns {変数名: 配列} の全行について計算し、np.ma.MaskedArray を返す
+
+    電卓で "Error" になる行はマスクする。変数の無い式は length 行（省略時は1行）の結果を返す。
+    式が読めない・変数の列が無いときは CalcError。
+    """
+    expression = compile_expression(source)
+    columns = columns or {}
+    missing = [name for name in expression.variables if name not in columns]
+    if missing:
+        raise CalcError(f"変数 {', '.join(missing)} の列がありません")
+
+    data = {name: _as_column(columns[name]) for name in expression.variables}
+    if data:
+        shape = np.broadcast_shapes(*(values.shape for values in data.values()))
+    else:
+        shape = (1 if length is None else length,)
+
+    # 入力が NaN の行と、途中で電卓が例外を出す行を覚えておく
+    errors = np.zeros(shape, dtype=bool)
+    for values in data.values():
+        errors |= ~np.isfinite(values)
+
+    stack = []
+    with np.errstate(all="ignore"):
+        for kind, value in expression.rpn:
+            if kind == CONST:
+                stack.append(float(value))
+                continue
+            if kind == VAR:
+                stack.append(data[value])
+                continue
+            if kind == UNARY:
+                x = stack.pop()
+                result = NUMPY_UNARY[value](x)
+                if value in NUMPY_UNARY_ERRORS:
+                    errors |= NUMPY_UNARY_ERRORS[value](x, result)
+            else:
+                b = stack.pop()
+                a = stack.pop()
+                result = NUMPY_BINARY[value](a, b)
+                if value in NUMPY_BINARY_ERRORS:
+                    errors |= NUMPY_BINARY_ERRORS[value](a, b, result)
+            stack.append(result)
+
+    result = np.broadcast_to(np.asarray(stack.pop(), dtype=float), shape).copy()
+    # 電卓と同じく、有限かどうかは最後の結果だけで調べる
+    errors |= ~np.isfinite(result)
+    return np.ma.masked_array(result, mask=errors)
+
+
+def evaluate_scalar(source: str, columns=None):
+    """evaluate_batch と同じ計算を1行ずつ calc_engine で行う（比較用）"""
+    expression = compile_expression(source)
+    names = expression.variables
+    data = [_as_column(columns[name]) for name in names]
+    length = len(data[0]) if data else 1
+    result = np.zeros(length)
+    errors = np.zeros(length, dtype=bool)
+    for i, row in enumerate(zip(*(values.tolist() for values in data)) if data else [()]):
+        if not all(map(math.isfinite, row)):    # 入力が NaN / ±inf の行
+            errors[i] = True
+            continue
+        try:
+            result[i] = expression.evaluate(dict(zip(names, row)))
+        except CalcError:
+            errors[i] = True
+    return np.ma.masked_array(result, mask=errors)
+
+
+def same_result(batch, scalar):
+    """evaluate_batch と evaluate_scalar の結果が一致するか（Error の行と値）"""
+    return bool(np.array_equal(batch.mask, scalar.mask)
+                and np.allclose(batch.filled(0), scalar.filled(0), rtol=1e-12, atol=1e-12))
+
+
+def check_agreement(expressions=CHECK_EXPRESSIONS, count: int = 10_000, seed: int = 0):
+    """境界の値（0、負の数、とても大きい・小さい数）を含む列で、各式の evaluate_batch と
+    evaluate_scalar の結果を比べ、一致しなかった式のリストを返す"""
+    rng = np.random.default_rng(seed)
+    special = np.array([0.0, -0.0, 1.0, -1.0, 0.5, -0.5, 10.0, -10.0, 1e-308, 1e308, -1e308, 2.5, -2.5])
+    columns = {
+        name: np.concatenate([special, rng.choice(special, count), rng.uniform(-20, 20, count)])
+        for name in ("x", "y")
+    }
+    columns["y"] = rng.permutation(columns["y"])
+    return [source for source in expressions
+            if not same_result(evaluate_batch(source, columns), evaluate_scalar(source, columns))]
+
+
+def evaluate_table(conn, source: str, table: str = "properties"):
+    """SQLite のテーブル table の列を変数にして式を計算する（変数名はテーブルの列名）"""
+    expression = compile_expression(source)
+    table_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    missing = [name for name in expression.variables if name not in table_columns]
+    if missing:
+        raise CalcError(f"{table} に列 {', '.join(missing)} がありません")
+    if not expression.variables:
+        length = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return evaluate_batch(source, length=length)
+
+    rows = conn.execute(f"SELECT {', '.join(expression.variables)} FROM {table}").fetchall()
+    values = np.array(rows, dtype=float).reshape(len(rows), len(expression.variables))
+    return evaluate_batch(source, {name: values[:, i] for i, name in enumerate(expression.variables)})
+
+
+def benchmark(count: int = 1_000_000, source: str = "sqrt(x) + log(y) / (x - y) + sin(x)^2", seed: int = 0):
+    """evaluate_batch と、1行ずつ計算する evaluate_scalar の時間を比べる（Error の行も含む）"""
+    rng = np.random.default_rng(seed)
+    columns = {"x": rng.integers(-5, 100, count).astype(float), "y": rng.integers(-5, 100, count).astype(float)}
+
+    started = time.perf_counter()
+    batch = evaluate_batch(source, columns)
+    batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scalar = evaluate_scalar(source, columns)
+    scalar_seconds = time.perf_counter() - started
+
+    same = same_result(batch, scalar)
+    return {
+        "rows": count,
+        "errors": int(batch.mask.sum()),
+        "batch_seconds": round(batch_seconds, 3),
+        "scalar_seconds": round(scalar_seconds, 3),
+        "speedup": round(scalar_seconds / batch_seconds, 1),
+        "same": same,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="電卓の式を列全体に対して計算する")
+    parser.add_argument("expression", nargs="?", help="式（変数はテーブルの列名）")
+    parser.add_argument("--db", help="計算に使う SQLite のDB")
+    parser.add_argument("--table", default="properties")
+    parser.add_argument("--bench", type=int, metavar="ROWS", help="ROWS 行で1行ずつの計算と速さを比べる")
+    parser.add_argument("--check", action="store_true", help="境界の値で1行ずつの計算と結果が一致するか調べる")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_agreement()
+        assert not mismatches, f"1行ずつの計算と結果が違う式: {mismatches}"
+        print(f"OK（{len(CHECK_EXPRESSIONS)} 式）")
+        return
+    if args.bench:
+        result = benchmark(args.bench)
+        print(result)
+        assert result["same"], "1行ずつの計算と結果が違います"
+        return
+    if not (args.db and args.expression):
+        parser.error("--db と式を指定してください（または --bench）")
+
+    conn = sqlite3.connect(args.db)
+    try:
+        result = evaluate_table(conn, args.expression, args.table)
+    except CalcError as e:
+        print(f"Error: {e}")
+        return
+    finally:
+        conn.close()
+    print(f"{result.size:,} 行（Error {int(np.ma.count_masked(result)):,} 行）")
+    if result.count():
+        print(f"平均 {result.mean():.4g} / 最小 {result.min():.4g} / 最大 {result.max():.4g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+"""電卓の式の計算エンジン（字句解析 → 操場アルゴリズムで逆ポーランド記法 → 関数にコンパイル）
+
+- 優先順位: + -  <  * /  <  単項の -  <  ^（右結合）  <  %（後置。1/100 にする）
+- 関数: sin cos tan log sqrt（引数は括弧で囲む）、定数: π（pi）, e
+- 数字・定数・括弧が続くときは掛け算を補う（"2π", "3(1+2)"）。閉じていない括弧は最後に閉じる
+- 定数・関数以外の名前は変数になる（evaluate に値を渡す。同じ式を値を変えて何度も計算するとき用）
+- コンパイルした式は文字列ごとにキャッシュし、変数の無い式はコンパイル時に値まで計算しておく
+- 数の型（Backend）は float / decimal（精度を指定できる）/ fraction（分数で誤差なし）から選ぶ。
+  sin cos tan と π, e はどの型でも float の精度で計算する。fraction で分数にならない結果
+  （sin cos tan log、平方数でない sqrt、整数でない指数の ^）は float になる
+
+    evaluate("2+3*4")              # 14.0
+    expr = compile_expression("x^2 + 1")
+    expr.evaluate({"x": 3})        # 10.0
+    evaluate("0.1+0.2", backend=get_backend("fraction"))    # Fraction(3, 10)
+
+使い方（ベンチマーク）:
+    python calc_engine.py --count 1000000
+    python calc_engine.py --backends        # 数の型ごとの速さと誤差を比べる
+"""
+
+import argparse
+import decimal
+import math
+import operator
+import random
+import re
+import time
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
+
+COMPILE_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 4096
+DECIMAL_PRECISION = 28
+# 分数の累乗で、結果の分子・分母がこのビット数を超えそうなら float で計算する
+# （指数だけでなく底の大きさも見る。(9^999)^999 のような計算で固まらないように）
+MAX_EXACT_BITS = 10_000
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>π|[A-Za-z_][A-Za-z_0-9]*)
+      | (?P<symbol>[-+*/^%()])
+    )""", re.VERBOSE)
+
+# 二項演算子: (優先順位, 右結合か)
+BINARY_OPERATORS = {"+": (1, False), "-": (1, False), "*": (2, False), "/": (2, False), "^": (4, True)}
+NEGATE_PRECEDENCE = 3
+
+CONSTANTS = {"π": math.pi, "pi": math.pi, "e": math.e}
+FUNCTIONS = ("sin", "cos", "tan", "log", "sqrt")
+
+# 逆ポーランド記法の命令の種類
+CONST, VAR, UNARY, BINARY = range(4)
+
+# float で計算するときの関数（単項は関数名・"neg"・"percent"、二項は演算子）
+FLOAT_UNARY = {
+    "neg": operator.neg,
+    "percent": lambda x: x / 100,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "log": math.log,
+    "sqrt": math.sqrt,
+}
+FLOAT_BINARY = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "^": math.pow,
+}
+
+
+class CalcError(ValueError):
+    """式が読めない・計算できない（0での割り算、定義域の外など）"""
+
+
+def _error_message(error):
+    # decimal の例外は str() が "[<class 'decimal.DivisionByZero'>]" になるのでクラス名にする
+    if isinstance(error, decimal.DecimalException):
+        return type(error).__name__
+    return str(error)
+
+
+class Backend:
+    """数の型ごとの計算方法
+
+    number は数の文字列や他の型の数をこの型にする関数、unary / binary は演算の関数の表、
+    is_finite は結果が有限か（無限大・NaN なら "Error"）を調べる関数。
+    """
+
+    def __init__(self, name: str, number, unary, binary, is_finite=math.isfinite):
+        self.name = name
+        self.number = number
+        self.unary = unary
+        self.binary = binary
+        self.is_finite = is_finite
+
+    def __repr__(self):
+        return f"Backend({self.name!r})"
+
+
+def _fraction(value):
+    if isinstance(value, Fraction):
+        return value
+    if isinstance(value, float):
+        return Fraction(repr(value))    # 0.1 は 1/10 として扱う（2進数の誤差を持ち込まない）
+    return Fraction(str(value))
+
+
+def _fraction_via_float(func):
+    # 結果は分数にならない（無理数）ので、float の近似を巨大な分数にせず float のまま返す
+    return lambda x: func(float(x))
+
+
+def _fraction_sqrt(x):
+    # 分子・分母が平方数なら誤差なしで計算する（それ以外は float）
+    if isinstance(x, Fraction) and x >= 0:
+        numerator, denominator = math.isqrt(x.numerator), math.isqrt(x.denominator)
+        if numerator * numerator == x.numerator and denominator * denominator == x.denominator:
+            return Fraction(numerator, denominator)
+    return math.sqrt(x)
+
+
+def _fraction_power(a, b):
+    # 整数の指数で結果が大きすぎなければ誤差なしで計算する
+    # （それ以外は float。"2^0.5" は 1.414...、float に収まらなければ OverflowError）
+    if isinstance(a, Fraction) and isinstance(b, Fraction) and b.denominator == 1:
+        bits = abs(b.numerator) * max(a.numerator.bit_length(), a.denominator.bit_length(), 1)
+        if bits <= MAX_EXACT_BITS:
+            return a ** b.numerator
+    return math.pow(a, b)
+
+
+FRACTION_BACKEND = Backend(
+    "fraction", _fraction,
+    unary={
+        "neg": operator.neg,
+        "percent": lambda x: x / 100,
+        "sin": _fraction_via_float(math.sin),
+        "cos": _fraction_via_float(math.cos),
+        "tan": _fraction_via_float(math.tan),
+        "log": _fraction_via_float(math.log),
+        "sqrt": _fraction_sqrt,
+    },
+    binary={
+        "+": operator.add,
+        "-": operator.sub,
+        "*": operator.mul,
+        "/": operator.truediv,
+        "^": _fraction_power,
+    },
+    is_finite=lambda x: not isinstance(x, float) or math.isfinite(x),
+)
+
+
+def _decimal_backend(precision: int):
+    # 0での割り算・定義域の外・桁あふれは decimal の例外（ArithmeticError）になる
+    context = decimal.Context(prec=precision)
+
+    def number(value):
+        if isinstance(value, Decimal):
+            return context.plus(value)
+        if isinstance(value, Fraction):
+            return context.divide(Decimal(value.numerator), Decimal(value.denominator))
+        return context.create_decimal(repr(value) if isinstance(value, float) else str(value))
+
+    def via_float(func):
+        return lambda x: context.create_decimal_from_float(func(float(x)))
+
+    return Backend(
+        f"decimal:{precision}", number,
+        unary={
+            "neg": context.minus,
+            "percent": lambda x: context.divide(x, 100),
+            "sin": via_float(math.sin),
+            "cos": via_float(math.cos),
+            "tan": via_float(math.tan),
+            "log": context.ln,
+            "sqrt": context.sqrt,
+        },
+        binary={
+            "+": context.add,
+            "-": context.subtract,
+            "*": context.multiply,
+            "/": context.divide,
+            "^": context.power,
+        },
+        is_finite=lambda x: x.is_finite(),
+    )
+
+
+FLOAT_BACKEND = Backend("float", float, FLOAT_UNARY, FLOAT_BINARY)
+BACKEND_NAMES = ("float", "decimal", "fraction")
+
+
+@lru_cache(maxsize=None)
+def get_backend(name: str = "float", precision: int = DECIMAL_PRECISION):
+    """数の型 name（BACKEND_NAMES のどれか）の Backend。decimal は precision 桁で計算する"""
+    if name == "float":
+        return FLOAT_BACKEND
+    if name == "fraction":
+        return FRACTION_BACKEND
+    if name == "decimal":
+        return _decimal_backend(precision)
+    raise CalcError(f"数の型 {name} はありません（{', '.join(BACKEND_NAMES)}）")
+
+
+def tokenize(source: str):
+    """式の文字列を [(種類, 文字列), ...] にする（種類は "number" / "name" / "symbol"）"""
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = TOKEN_PATTERN.match(source, position)
+        if not match:
+            raise CalcError(f"読めない文字があります: {source[position:].strip()[:1]!r}")
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+    return tokens
+
+
+def to_rpn(tokens):
+    """トークンの列を逆ポーランド記法の命令のタプル ((種類, 値), ...) にする（操場アルゴリズム）
+
+    数（CONST）は文字列のまま置き、数の型への変換はコンパイルのときに行う。
+    """
+    output = []
+    stack = []    # ("op", 演算子) / ("neg", "neg") / ("func", 関数名) / ("paren", "(")
+    expect_operand = True
+
+    def emit(item):
+        kind, value = item
+        if kind == "op":
+            output.append((BINARY, value))
+        elif kind == "neg":
+            output.append((UNARY, "neg"))
+        elif kind == "func":
+            output.append((UNARY, value))
+
+    def push_binary(symbol):
+        precedence, right = BINARY_OPERATORS[symbol]
+        while stack and stack[-1][0] in ("op", "neg"):
+            top_kind, top = stack[-1]
+            top_precedence = NEGATE_PRECEDENCE if top_kind == "neg" else BINARY_OPERATORS[top][0]
+            if top_precedence > precedence or (top_precedence == precedence and not right):
+                emit(stack.pop())
+            else:
+                break
+        stack.append(("op", symbol))
+
+    previous = None
+    for kind, value in tokens:
+        if stack and stack[-1][0] == "func" and value != "(":
+            raise CalcError(f"{stack[-1][1]} の後には ( が必要です")
+        if kind == "number" and previous == "number":
+            raise CalcError(f"数の書き方が正しくありません: {value}")
+        previous = kind
+        if (kind in ("number", "name") or value == "(") and not expect_operand:
+            push_binary("*")    # "2π" → 2*π
+            expect_operand = True
+
+        if kind == "number":
+            output.append((CONST, value))
+            expect_operand = False
+        elif kind == "name":
+            if value in FUNCTIONS:
+                stack.append(("func", value))
+            elif value in CONSTANTS:
+                output.append((CONST, repr(CONSTANTS[value])))
+                expect_operand = False
+            else:
+                output.append((VAR, value))
+                expect_operand = False
+        elif value == "(":
+            stack.append(("paren", value))
+        elif value == ")":
+            if expect_operand:
+                raise CalcError(") の前に数がありません")
+            while stack and stack[-1][0] != "paren":
+                emit(stack.pop())
+            if not stack:
+                raise CalcError("( が足りません")
+            stack.pop()
+            if stack and stack[-1][0] == "func":
+                emit(stack.pop())
+        elif value == "%":
+            if expect_operand:
+                raise CalcError("% の前に数がありません")
+            output.append((UNARY, "percent"))
+        elif expect_operand:
+            # 数の前の + - は符号
+            if value == "-":
+                stack.append(("neg", "neg"))
+            elif value != "+":
+                raise CalcError(f"{value} の前に数がありません")
+        else:
+            push_binary(value)
+            expect_operand = True
+
+    if expect_operand:
+        raise CalcError("式が途中で終わっています")
+    while stack:
+        emit(stack.pop())    # 閉じていない括弧はここで閉じる
+    return tuple(output)
+
+
+def build_function(rpn, backend=FLOAT_BACKEND):
+    """逆ポーランド記法の命令を、変数の辞書を受け取って値を返す関数にする
+
+    命令ごとの分岐を計算のたびに繰り返さないよう、式の木の形のまま関数を入れ子にする。
+    backend を差し替えると、同じ式を別の型で計算できる。
+    """
+    unary, binary = backend.unary, backend.binary
+    stack = []
+    for kind, value in rpn:
+        if kind == CONST:
+            stack.append(lambda env, value=backend.number(value): value)
+        elif kind == VAR:
+            stack.append(operator.itemgetter(value))
+        elif kind == UNARY:
+            stack.append(lambda env, f=unary[value], a=stack.pop(): f(a(env)))
+        else:
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(lambda env, f=binary[value], a=a, b=b: f(a(env), b(env)))
+    return stack.pop()
+
+
+class Expression:
+    """コンパイル済みの式"""
+
+    __slots__ = ("source", "backend", "rpn", "variables", "_function", "_value", "_error")
+
+    def __init__(self, source: str, backend: Backend = FLOAT_BACKEND):
+        self.source = source
+        self.backend = backend
+        self.rpn = to_rpn(tokenize(source))
+        self.variables = tuple(dict.fromkeys(value for kind, value in self.rpn if kind == VAR))
+        self._function = build_function(self.rpn, backend)
+        self._value = None
+        self._error = None
+        if not self.variables:
+            # 変数の無い式は一度だけ計算して結果を覚えておく
+            try:
+                self._value = self._call({})
+            except CalcError as e:
+                self._error = e
+
+    def _call(self, variables):
+        try:
+            value = self._function(variables)
+        except KeyError as e:
+            raise CalcError(f"変数 {e.args[0]} の値がありません") from None
+        except (ArithmeticError, ValueError) as e:
+            raise CalcError(_error_message(e)) from None
+        if not self.backend.is_finite(value):
+            raise CalcError("値が大きすぎます")
+        return value
+
+    def evaluate(self, variables=None):
+        """式の値（backend の型）を返す。計算できなければ CalcError"""
+        if not self.variables:
+            if self._error is not None:
+                raise self._error
+            return self._value
+        return self._call(variables or {})
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(source: str, backend: Backend = FLOAT_BACKEND):
+    """式の文字列を backend の型で計算するようにコンパイルする（同じ組み合わせはキャッシュから返す）"""
+    return Expression(source, backend)
+
+
+def evaluate(source: str, variables=None, backend: Backend = FLOAT_BACKEND):
+    """式の文字列を計算して値（backend の型）を返す。計算できなければ CalcError"""
+    return compile_expression(source, backend).evaluate(variables)
+
+
+@lru_cache(maxsize=RESULT_CACHE_SIZE)
+def calculate(symbol: str, operand1, operand2, backend: Backend = FLOAT_BACKEND):
+    """operand1 symbol operand2（symbol は + - * / ^）を backend の型で計算する
+
+    同じ (演算子, 数, 数, 型) の結果はキャッシュから返す。計算できなければ CalcError。
+    """
+    if symbol not in backend.binary:
+        raise CalcError(f"演算子 {symbol} はありません")
+    try:
+        value = backend.binary[symbol](backend.number(operand1), backend.number(operand2))
+    except (ArithmeticError, ValueError) as e:
+        raise CalcError(_error_message(e)) from None
+    if not backend.is_finite(value):
+        raise CalcError("値が大きすぎます")
+    return value
+
+
+def random_expression(rng: random.Random, depth: int = 3, names=()):
+    """ベンチマーク用のランダムな式"""
+    if depth == 0 or rng.random() < 0.3:
+        if names and rng.random() < 0.5:
+            return rng.choice(names)
+        return str(rng.randint(1, 99))
+    choice = rng.random()
+    if choice < 0.15:
+        return f"{rng.choice(FUNCTIONS[:3])}({random_expression(rng, depth - 1, names)})"
+    if choice < 0.3:
+        return f"({random_expression(rng, depth - 1, names)})"
+    symbol = rng.choice("+-*/")
+    return f"{random_expression(rng, depth - 1, names)}{symbol}{random_expression(rng, depth - 1, names)}"
+
+
+def _rate(count: int, seconds: float):
+    return {"count": count, "seconds": round(seconds, 3), "per_second": int(count / seconds) if seconds else None}
+
+
+def benchmark(count: int = 1_000_000, distinct: int = 1000, seed: int = 0):
+    """式の計算の速さを測る
+
+    - compile:  distinct 種類の式を初めてコンパイルする
+    - cached:   その式を合わせて count 回計算する（キャッシュから値を返す）
+    - variable: 変数 x, y を含む式を count 回、値を変えて計算する
+    """
+    rng = random.Random(seed)
+    sources = [random_expression(rng) for _ in range(distinct)]
+    variable_sources = [random_expression(rng, names=("x", "y")) for _ in range(distinct)]
+    compile_expression.cache_clear()
+    results = {}
+
+    started = time.perf_counter()
+    for source in sources:
+        try:
+            compile_expression(source)
+        except CalcError:
+            pass
+    results["compile"] = _rate(len(sources), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(count):
+        try:
+            evaluate(sources[i % distinct])
+        except CalcError:
+            pass
+    results["cached"] = _rate(count, time.perf_counter() - started)
+
+    expressions = [compile_expression(source) for source in variable_sources]
+    rows = [{"x": rng.uniform(-10, 10), "y": rng.uniform(-10, 10)} for _ in range(1000)]
+    started = time.perf_counter()
+    for i in range(count):
+        try:
+            expressions[i % distinct].evaluate(rows[i % len(rows)])
+        except CalcError:
+            pass
+    results["variable"] = _rate(count, time.perf_counter() - started)
+    return results
+
+
+def benchmark_backends(count: int = 100_000, distinct: int = 1000, seed: int = 0,
+                       precisions=(DECIMAL_PRECISION, 50)):
+    """数の型ごとに calculate と式の計算の速さ、0.1 を count 回足したときの誤差を比べる
+
+    - calculate:        distinct 種類の (演算子, 数, 数) を初めて計算する
+    - calculate_cached: その組み合わせを合わせて count 回計算する（キャッシュから返す）
+    - chain:            前の結果に続けて count 回足す（毎回新しい数なのでキャッシュは効かない）
+    - expression:       変数 x を含む式を count 回、値を変えて計算する
+    """
+    rng = random.Random(seed)
+    operations = [(rng.choice("+-*/"), str(round(rng.uniform(1, 100), 2)), str(round(rng.uniform(1, 100), 2)))
+                  for _ in range(distinct)]
+    xs = [str(round(rng.uniform(1, 100), 2)) for _ in range(1000)]
+    backends = ([get_backend("float")]
+                + [get_backend("decimal", precision) for precision in precisions]
+                + [get_backend("fraction")])
+
+    results = {}
+    for backend in backends:
+        calculate.cache_clear()
+        result = {}
+        started = time.perf_counter()
+        for symbol, a, b in operations:
+            calculate(symbol, a, b, backend)
+        result["calculate"] = _rate(distinct, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for i in range(count):
+            symbol, a, b = operations[i % distinct]
+            calculate(symbol, a, b, backend)
+        result["calculate_cached"] = _rate(count, time.perf_counter() - started)
+
+        # 電卓で 0.1 を続けて足していくのと同じ計算
+        total = backend.number("0")
+        step = backend.number("0.1")
+        add = backend.binary["+"]
+        started = time.perf_counter()
+        for _ in range(count):
+            total = add(total, step)
+        result["chain"] = _rate(count, time.perf_counter() - started)
+        result["chain_error"] = float(abs(_fraction(total) - Fraction(count, 10)))
+
+        expression = compile_expression("(x + 1/3) * x - x / 7", backend)
+        values = [{"x": backend.number(x)} for x in xs]
+        started = time.perf_counter()
+        for i in range(count):
+            expression.evaluate(values[i % len(values)])
+        result["expression"] = _rate(count, time.perf_counter() - started)
+        results[backend.name] = result
+    calculate.cache_clear()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="電卓の式の計算エンジンのベンチマーク")
+    parser.add_argument("--count", type=int, default=1_000_000, help="計算する式の数")
+    parser.add_argument("--distinct", type=int, default=1000, help="式の種類の数")
+    parser.add_argument("--backends", action="store_true", help="数の型（float / decimal / fraction）ごとに比べる")
+    args = parser.parse_args()
+
+    if args.backends:
+        for name, result in benchmark_backends(args.count, args.distinct).items():
+            print(f"--- {name} ---")
+            for key in ("calculate", "calculate_cached", "chain", "expression"):
+                print(f"{key:>16}: {result[key]['per_second']:>12,} 件/秒")
+            print(f"  0.1 を足した誤差: {result['chain_error']:.3g}")
+        return
+
+    for name, result in benchmark(args.count, args.distinct).items():
+        print(f"{name:>8}: {result['count']:,} 件 {result['seconds']} 秒 ({result['per_second']:,} 件/秒)")
+
+
+if __name__ == "__main__":
+    main()
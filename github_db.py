@@ -0,0 +1,337 @@
+"""google_repos_all.db（GitHub の google organization のリポジトリ）のテーブルと分析用の問い合わせ
+
+- repositories: リポジトリ名で一意。language_id で languages を参照する
+- languages:    言語の一覧（スクレイパーが言語名を探すときにも使う）
+- 索引:         (language_id, stars DESC, name) と (stars DESC) で、言語ごとの上位・件数・分位数を
+                テーブルを読まずに索引だけで答える
+
+使い方（50万件の検証用DBで、索引を使う問い合わせと全件を読む問い合わせを比べる）:
+    python github_db.py --bench 500000
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+from ingest_pipeline import tune_for_ingest
+
+DB_PATH = "google_repos_all.db"
+BENCH_DB_PATH = "github_bench.db"
+
+# 最初から languages に入れておく言語（以降はクロールで見つかった言語が追加される）
+KNOWN_LANGUAGES = ["Python", "Java", "C++", "C", "Go", "JavaScript", "TypeScript", "HTML", "Dart", "Rust", "Shell", "Kotlin", "Swift", "Jupyter Notebook"]
+UNKNOWN_LANGUAGE = "Unknown"
+
+UPSERT_SQL = """
+    INSERT INTO repositories (name, language, stars) VALUES (?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET
+        language = excluded.language, stars = excluded.stars, updated_at = CURRENT_TIMESTAMP
+"""
+
+ANALYTICS_INDEXES = [
+    # 言語ごとのスター数の順（名前まで含めるので上位の一覧もテーブルを読まない）
+    "CREATE INDEX IF NOT EXISTS idx_repositories_language_stars ON repositories (language_id, stars DESC, name)",
+    # 全体のスター数の順
+    "CREATE INDEX IF NOT EXISTS idx_repositories_stars ON repositories (stars DESC)",
+]
+PERCENTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+def get_connection(db_path: str = DB_PATH):
+    """google_repos_all.db に接続し、テーブル・索引・トリガーを用意する"""
+    conn = sqlite3.connect(db_path)
+    tune_for_ingest(conn)
+    ensure_schema(conn)
+    ensure_language_index(conn)
+    return conn
+
+
+def ensure_schema(conn):
+    """repositories（リポジトリ名で一意）と crawl_progress を用意する
+
+    以前の版で作った repositories（名前が重複し得る）は、名前ごとに最後の行だけ残して一意にする。
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS repositories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            language TEXT,
+            stars INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # ページ単位の取得状況（途中で止まったクロールを続きから再開するため）
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_progress (
+            base_url TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (base_url, page)
+        )
+    """)
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(repositories)")}
+    with conn:
+        if "updated_at" not in columns:
+            conn.execute("ALTER TABLE repositories ADD COLUMN updated_at TIMESTAMP")
+            conn.execute("""
+                DELETE FROM repositories WHERE id NOT IN (
+                    SELECT MAX(id) FROM repositories GROUP BY name
+                )
+            """)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_repositories_name ON repositories (name)")
+
+
+def ensure_language_index(conn):
+    """languages テーブル・repositories.language_id・分析用の索引と、language_id を埋めるトリガーを用意する
+
+    language_id の無い古い google_repos_all.db は、既存の行の言語から languages を作って埋める。
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS languages (
+            language_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(repositories)")}
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO languages (name) VALUES (?)",
+                         [(language,) for language in KNOWN_LANGUAGES + [UNKNOWN_LANGUAGE]])
+        if "language_id" not in columns:
+            conn.execute("ALTER TABLE repositories ADD COLUMN language_id INTEGER REFERENCES languages(language_id)")
+            conn.execute("""
+                INSERT OR IGNORE INTO languages (name)
+                SELECT DISTINCT language FROM repositories WHERE language IS NOT NULL
+            """)
+            conn.execute("""
+                UPDATE repositories SET language_id = languages.language_id
+                FROM languages WHERE languages.name = repositories.language
+            """)
+        for index_sql in ANALYTICS_INDEXES:
+            conn.execute(index_sql)
+
+        # 言語名から language_id を埋める（language_id を指定して INSERT したときは何もしない）
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS repositories_language_ai AFTER INSERT ON repositories
+            WHEN new.language_id IS NULL AND new.language IS NOT NULL
+            BEGIN
+                INSERT OR IGNORE INTO languages (name) VALUES (new.language);
+                UPDATE repositories SET language_id = (SELECT language_id FROM languages WHERE name = new.language)
+                WHERE id = new.id;
+            END
+        """)
+        # UPSERT で言語が変わったとき
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS repositories_language_au AFTER UPDATE OF language ON repositories
+            WHEN old.language IS NOT new.language
+            BEGIN
+                INSERT OR IGNORE INTO languages (name) VALUES (new.language);
+                UPDATE repositories SET language_id = (SELECT language_id FROM languages WHERE name = new.language)
+                WHERE id = new.id;
+            END
+        """)
+
+
+def record_crawl_progress(conn, base_url: str, pages):
+    """取得済みページ [(page, row_count), ...] を記録する（呼び出し側のトランザクションの中で使う）"""
+    conn.executemany("""
+        INSERT OR REPLACE INTO crawl_progress (base_url, page, row_count) VALUES (?, ?, ?)
+    """, ((base_url, page, row_count) for page, row_count in pages))
+
+
+def load_crawl_progress(conn, base_url: str):
+    """取得済みのページ番号と件数の辞書 {page: row_count}"""
+    return dict(conn.execute(
+        "SELECT page, row_count FROM crawl_progress WHERE base_url = ?", (base_url,)).fetchall())
+
+
+def clear_crawl_progress(conn, base_url: str):
+    with conn:
+        conn.execute("DELETE FROM crawl_progress WHERE base_url = ?", (base_url,))
+
+
+def get_known_languages(conn):
+    """言語名の一覧（長い順。"JavaScript" を "Java" より先に探すため）"""
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM languages WHERE name <> ? ORDER BY LENGTH(name) DESC, name", (UNKNOWN_LANGUAGE,))]
+
+
+def _language_id(conn, language: str):
+    row = conn.execute("SELECT language_id FROM languages WHERE name = ?", (language,)).fetchone()
+    return row[0] if row else None
+
+
+def top_repositories(conn, limit: int = 30, language: str = None):
+    """スター数の多いリポジトリ (name, language, stars) のリスト（language を指定するとその言語だけ）"""
+    if language is None:
+        return conn.execute("""
+            SELECT name, language, stars FROM repositories ORDER BY stars DESC LIMIT ?
+        """, (limit,)).fetchall()
+    return conn.execute("""
+        SELECT r.name, l.name, r.stars
+        FROM repositories r JOIN languages l ON l.language_id = r.language_id
+        WHERE r.language_id = ? ORDER BY r.stars DESC LIMIT ?
+    """, (_language_id(conn, language), limit)).fetchall()
+
+
+def top_repositories_by_language(conn, limit: int = 5):
+    """言語ごとのスター数上位 {language: [(name, stars), ...]}（言語名の順）
+
+    言語ごとに idx_repositories_language_stars の先頭 limit 件だけを読む。
+    """
+    rows = conn.execute("""
+        SELECT l.name, r.name, r.stars
+        FROM languages l JOIN repositories r ON r.id IN (
+            SELECT id FROM repositories
+            WHERE language_id = l.language_id ORDER BY stars DESC LIMIT ?
+        )
+        ORDER BY l.name, r.stars DESC
+    """, (limit,)).fetchall()
+    top = {}
+    for language, name, stars in rows:
+        top.setdefault(language, []).append((name, stars))
+    return top
+
+
+def get_language_counts(conn):
+    """言語ごとのリポジトリ数 [(language, count), ...]（多い順）"""
+    return conn.execute("""
+        SELECT l.name, c.repositories
+        FROM (SELECT language_id, COUNT(*) AS repositories FROM repositories GROUP BY language_id) c
+        JOIN languages l ON l.language_id = c.language_id
+        ORDER BY c.repositories DESC, l.name
+    """).fetchall()
+
+
+def get_star_percentiles(conn, language: str = None, percentiles=PERCENTILES):
+    """スター数の分位数 {q: 値}（線形補間。language を指定するとその言語だけ）
+
+    件数を数えてから、q ごとに索引を近い方の端から読み、q の位置の前後2件を取り出す
+    （全件を取り出して並べ替えない）。OFFSET の読み飛ばしも索引を1件ずつたどるので、
+    1つの q で読む件数は端からの位置の分（中央値なら約 count / 2 件）。
+    """
+    if language is None:
+        where, params = "", ()
+    else:
+        where, params = "WHERE language_id = ?", (_language_id(conn, language),)
+    count = conn.execute(f"SELECT COUNT(*) FROM repositories {where}", params).fetchone()[0]
+    if count == 0:
+        return {}
+
+    result = {}
+    for q in percentiles:
+        position = (count - 1) * q
+        lower = int(position)
+        upper = min(lower + 1, count - 1)
+        if lower <= count - 1 - upper:
+            values = [row[0] for row in conn.execute(
+                f"SELECT stars FROM repositories {where} ORDER BY stars LIMIT 2 OFFSET ?", params + (lower,))]
+        else:
+            # 上位の分位数は大きい方の端から読む
+            values = [row[0] for row in conn.execute(
+                f"SELECT stars FROM repositories {where} ORDER BY stars DESC LIMIT 2 OFFSET ?",
+                params + (count - 1 - upper,))][::-1]
+        if upper == lower:  # q = 1（最後の1件）
+            values = [values[-1]] * 2
+        result[q] = values[0] + (values[1] - values[0]) * (position - lower)
+    return result
+
+
+def make_synthetic_db(db_path: str = BENCH_DB_PATH, rows: int = 500_000):
+    """rows 件の架空のリポジトリを入れた検証用のDBを作る（言語は偏りあり、スター数はべき分布に近い形）"""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = get_connection(db_path)
+    languages = len(KNOWN_LANGUAGES) + 1
+    with conn:
+        conn.execute("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?),
+            -- 乱数を1行に1回だけ計算する（MATERIALIZED にしないと JOIN の条件で計算し直される）
+            s AS MATERIALIZED (
+                SELECT n,
+                       1 + MIN(ABS(RANDOM()) % ?, ABS(RANDOM()) % ?) AS language_id,
+                       CAST(100000.0 / (1 + ABS(RANDOM()) % 100000) AS INTEGER) - 1 AS stars
+                FROM seq
+            )
+            INSERT INTO repositories (name, language_id, language, stars)
+            SELECT 'repo-' || s.n, l.language_id, l.name, s.stars
+            FROM s JOIN languages l ON l.language_id = s.language_id
+        """, (rows, languages, languages))
+    conn.execute("ANALYZE")
+    return conn
+
+
+def _timed(func):
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000
+
+
+def benchmark(conn, language: str = "Python", limit: int = 10):
+    """索引を使う問い合わせと、同じことを索引なし（以前のテーブル）で問い合わせた時間 [ms] を比べる"""
+    def scan_top_by_language():
+        for (name,) in conn.execute("SELECT DISTINCT language FROM repositories NOT INDEXED").fetchall():
+            conn.execute("""
+                SELECT name, stars FROM repositories NOT INDEXED
+                WHERE language = ? ORDER BY stars DESC LIMIT ?
+            """, (name, limit)).fetchall()
+
+    def scan_percentiles():
+        stars = [row[0] for row in conn.execute(
+            "SELECT stars FROM repositories NOT INDEXED WHERE language = ? ORDER BY stars", (language,))]
+        return [stars[int((len(stars) - 1) * q)] for q in PERCENTILES]
+
+    cases = {
+        "top N（言語指定）": (
+            lambda: top_repositories(conn, limit, language),
+            lambda: conn.execute("""
+                SELECT name, language, stars FROM repositories NOT INDEXED
+                WHERE language = ? ORDER BY stars DESC LIMIT ?
+            """, (language, limit)).fetchall()),
+        "言語ごとの top N": (
+            lambda: top_repositories_by_language(conn, limit), scan_top_by_language),
+        "言語ごとの件数": (
+            lambda: get_language_counts(conn),
+            lambda: conn.execute(
+                "SELECT language, COUNT(*) FROM repositories NOT INDEXED GROUP BY language").fetchall()),
+        "分位数（言語指定）": (
+            lambda: get_star_percentiles(conn, language), scan_percentiles),
+        "分位数（全体）": (
+            lambda: get_star_percentiles(conn),
+            lambda: [row[0] for row in conn.execute("SELECT stars FROM repositories NOT INDEXED ORDER BY stars")]),
+    }
+    return {name: {"index_ms": round(_timed(indexed), 2), "scan_ms": round(_timed(scan), 2)}
+            for name, (indexed, scan) in cases.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="google_repos_all.db の言語・スター数の集計")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--bench", type=int, metavar="ROWS", help="ROWS 件の検証用DBで索引の効果を測る")
+    args = parser.parse_args()
+
+    if args.bench:
+        conn = make_synthetic_db(BENCH_DB_PATH, args.bench)
+        print(f"{args.bench:,} 件")
+        for name, result in benchmark(conn).items():
+            print(f"{name:<12}: 索引 {result['index_ms']:>8} ms / 全件 {result['scan_ms']:>8} ms")
+        conn.close()
+        return
+
+    conn = get_connection(args.db)
+    print("--- 言語ごとのリポジトリ数 ---")
+    for language, count in get_language_counts(conn):
+        print(f"{language:<20} {count:>6}")
+    print("\n--- スター数の分位数 ---")
+    for q, stars in get_star_percentiles(conn).items():
+        print(f"{int(q * 100):>3}%: {stars:,.0f}")
+    print("\n--- 言語ごとの上位3件 ---")
+    for language, repos in top_repositories_by_language(conn, 3).items():
+        print(f"{language}: " + ", ".join(f"{name} ({stars:,})" for name, stars in repos))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
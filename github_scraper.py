@@ -0,0 +1,223 @@
+"""GitHub の google organization のリポジトリ一覧をスクレイピングして google_repos_all.db に保存する
+
+- ページは頻度を制限しながら並行に取得する（page_crawler）
+- 解析はリポジトリのカード（li.Box-row）の部分だけ木を作る
+- 行はリポジトリ名で UPSERT する（テーブルは作り直さない）。BATCH_SIZE 行ごとに1トランザクション
+- 書き込んだページは crawl_progress に記録し、途中で止まっても続きのページから再開する
+- テーブル・索引・集計の問い合わせは github_db にある。言語名は languages テーブルの一覧から探す
+
+使い方:
+    python github_scraper.py                     # 取得して上位30件を表示
+    python github_scraper.py --save pages/       # 取得したページを保存する
+    python github_scraper.py --fixture pages/    # 保存したページをローカルサーバーから取得する（計測用）
+    python github_scraper.py --check             # fixtures/github のページで、カードだけの解析が全体の解析と同じか確かめる
+"""
+
+import argparse
+import glob
+import os
+import time
+from functools import partial
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import github_db
+import page_crawler
+from github_db import DB_PATH, KNOWN_LANGUAGES, UNKNOWN_LANGUAGE
+from ingest_pipeline import BatchWriter
+from page_crawler import ConcurrentCrawler, PageFetcher, pages_to_fetch
+
+BASE_URL = "https://github.com/orgs/google/repositories"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+MAX_PAGES = 100
+REQUESTS_PER_SECOND = 1.0   # 以前の逐次版（1ページごとに1秒待つ）と同じ頻度
+MAX_IN_FLIGHT = 4
+
+# 一覧ページのマークアップに合わせた検証用のページ（page_<番号>.html）
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "fixtures", "github", "orgs", "google", "repositories")
+
+# リポジトリのカードは <li class="Box-row"> なので、その部分だけ木を作る
+# （ナビゲーション・フッターなどの li は読み飛ばす）
+REPO_CARD_CLASS = "Box-row"
+REPO_CARD_STRAINER = SoupStrainer("li", class_=REPO_CARD_CLASS)
+
+
+def parse_repositories(html: str, known_languages=KNOWN_LANGUAGES):
+    """一覧ページのHTMLから (name, language, stars) のリストを返す
+
+    言語の表示が見つからないときは、known_languages の言語名をカードの文字列から探す。
+    """
+    soup = BeautifulSoup(html, "html.parser", parse_only=REPO_CARD_STRAINER)
+    return _parse_cards(soup.find_all("li", class_=REPO_CARD_CLASS), known_languages)
+
+
+def _parse_cards(cards, known_languages):
+    """li 要素の並びから (name, language, stars) のリストを返す（リポジトリのカードでない li は飛ばす）"""
+    repos = []
+    for li in cards:
+        # リポジトリ名の取得
+        h3 = li.find("h3")
+        if not h3: continue
+        link = h3.find("a")
+        if not link: continue
+
+        # Googleのリポジトリリンクか確認
+        href = link.get("href")
+        if not href or "google" not in href: continue
+
+        repo_name = link.get_text(strip=True)
+
+        # --- プログラミング言語 ---
+        language = UNKNOWN_LANGUAGE
+
+        # 1. itemprop属性
+        lang_tag = li.find("span", itemprop="programmingLanguage")
+        if lang_tag:
+            language = lang_tag.get_text(strip=True)
+
+        # 2. カラードットの親要素
+        if language == UNKNOWN_LANGUAGE:
+            color_dot = li.find("span", class_=lambda c: c and "repo-language-color" in c)
+            if color_dot and color_dot.parent:
+                text = color_dot.parent.get_text(strip=True)
+                for lang in known_languages:
+                    if lang in text:
+                        language = lang
+                        break
+                if language == UNKNOWN_LANGUAGE and len(text) < 20:
+                     language = text.replace("●", "").strip()
+
+        # 3. テキスト全体から探索
+        if language == UNKNOWN_LANGUAGE:
+            full_text = li.get_text()
+            for lang in known_languages:
+                if lang in full_text:
+                    language = lang
+                    break
+
+        # --- スター数 ---
+        stars = 0
+        star_link = li.find("a", href=lambda h: h and h.endswith("/stargazers"))
+        if star_link:
+            raw_star = star_link.get_text(strip=True).replace(",", "")
+            try:
+                if "k" in raw_star:
+                     stars = int(float(raw_star.replace("k", "")) * 1000)
+                else:
+                     stars = int(raw_star)
+            except:
+                stars = 0
+
+        repos.append((repo_name, language, stars))
+    return repos
+
+
+def check_fixture_pages(fixture_dir: str = FIXTURE_DIR):
+    """fixture_dir のページで、カード（li.Box-row）だけの解析が、木全体の li をすべて調べる解析と同じか確かめる
+
+    {ファイル名: リポジトリ数} を返す。結果が違うページがあれば AssertionError。
+    """
+    paths = sorted(glob.glob(os.path.join(fixture_dir, "page_*.html")))
+    assert paths, f"ページがありません: {fixture_dir}"
+    counts = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        strained = parse_repositories(html)
+        full = _parse_cards(BeautifulSoup(html, "html.parser").find_all("li"), KNOWN_LANGUAGES)
+        assert strained == full, f"{os.path.basename(path)}: カードだけの解析 {strained} / 全体の解析 {full}"
+        assert strained, f"{os.path.basename(path)}: リポジトリが見つかりません"
+        counts[os.path.basename(path)] = len(strained)
+    return counts
+
+
+def scrape(db_path: str = DB_PATH, max_pages: int = MAX_PAGES, base_url: str = BASE_URL,
+           rate: float = REQUESTS_PER_SECOND, max_in_flight: int = MAX_IN_FLIGHT,
+           parse_workers: int = 0, save_dir: str = None):
+    """一覧を並行に取得して repositories に UPSERT し、取得状況を辞書で返す
+
+    リポジトリが0件のページ（一覧の最後）まで取得できたら取得状況を消し、次回は最初から取得する。
+    失敗したページがあれば取得状況を残し、次回はまだ書き込んでいないページだけ取得する。
+    """
+    conn = github_db.get_connection(db_path)
+    progress = github_db.load_crawl_progress(conn, base_url)
+    if progress:
+        print(f"Resume: {len(progress)} pages already saved")
+
+    fetcher = PageFetcher(base_url + "?page={page}", headers=HEADERS, rate=rate, save_dir=save_dir)
+    # 以前のクロールで見つかった言語も探す（長い順なので "JavaScript" が "Java" と判定されない）
+    parse = partial(parse_repositories, known_languages=github_db.get_known_languages(conn))
+    crawler = ConcurrentCrawler(fetcher.fetch, parse, max_in_flight=max_in_flight, parse_workers=parse_workers)
+    pages, last_page = pages_to_fetch(progress, max_pages)
+
+    def report(pages):
+        for page_num, repos in pages:
+            print(f"Processing Page {page_num:<3} ... Done. ({len(repos)} repos)", flush=True)
+            yield page_num, repos
+
+    print(f"Scraping Start: {base_url}")
+    print(f"Target Pages: {max_pages}")
+    started = time.perf_counter()
+    writer = BatchWriter(conn, github_db.UPSERT_SQL,
+                         on_flush=lambda conn, pages: github_db.record_crawl_progress(conn, base_url, pages))
+    with writer:
+        writer.write_pages(report(crawler.iter_pages(pages, last_page)))
+    fetcher.close()
+
+    if not crawler.failed:
+        github_db.clear_crawl_progress(conn, base_url)
+    total = conn.execute("SELECT COUNT(*) FROM repositories").fetchone()[0]
+    conn.close()
+    return {
+        "pages": crawler.last_page,
+        "failed": sorted(crawler.failed),
+        "rows": writer.stats["rows"],
+        "repositories": total,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def print_top_repositories(db_path: str = DB_PATH, limit: int = 30):
+    print(f"\n--- Top {limit} Starred Repositories ---")
+    print(f"{'Rank':<5} | {'Repository Name':<35} | {'Language':<15} | {'Stars':<10}")
+    print("-" * 75)
+    conn = github_db.get_connection(db_path)
+    rows = github_db.top_repositories(conn, limit)
+    conn.close()
+    for i, row in enumerate(rows, 1):
+        print(f"{i:<5} | {row[0]:<35} | {row[1]:<15} | {row[2]:<10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GitHub の google organization のリポジトリ一覧を取得する")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--pages", type=int, default=MAX_PAGES, help="取得する最大ページ数")
+    parser.add_argument("--save", metavar="DIR", help="取得したページを DIR/page_<番号>.html に保存する")
+    parser.add_argument("--fixture", metavar="DIR", nargs="?", const=FIXTURE_DIR,
+                        help="DIR（省略時は fixtures/github の検証用ページ）をローカルサーバーから取得する")
+    parser.add_argument("--check", action="store_true",
+                        help="検証用ページで、カードだけの解析が木全体の li を調べる解析と同じか確かめる")
+    args = parser.parse_args()
+
+    if args.check:
+        counts = check_fixture_pages()
+        print(f"OK: {len(counts)} ページ, {sum(counts.values())} リポジトリ {counts}")
+        return
+    if args.fixture:
+        # 保存したページで計測するときは頻度を制限しない
+        server, root_url = page_crawler.start_fixture_server(args.fixture)
+        result = scrape(args.db, args.pages, f"{root_url}/orgs/google/repositories", rate=1000)
+        server.shutdown()
+    else:
+        result = scrape(args.db, args.pages, save_dir=args.save)
+
+    print("-" * 50)
+    print(f"Scraping Completed. {result}")
+    print_top_repositories(args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""スクレイピング結果をSQLiteに書き込むパイプライン（ページ数が増えてもメモリ使用量は一定）
+
+取得 → 解析 → 正規化 → 書き込み をジェネレーターでつなぐ。
+書き込み側（BatchWriter）が必要になったときに前の段から1ページずつ取り出すので、
+書き込みが遅いと取得も止まる（バックプレッシャー）。メモリに溜まるのは1バッチ分の行だけ。
+
+    pages = crawl_pages(fetch, parse)                 # (page, rows) を1ページずつ返す
+    pages = normalize(pages, to_row)                  # 行ごとの変換
+    with BatchWriter(conn, INSERT_SQL) as writer:
+        writer.write_pages(pages)
+"""
+
+import time
+
+BATCH_SIZE = 500          # この行数たまったら書き込む
+FLUSH_SECONDS = 5.0       # 行数に達しなくても、この秒数たったら書き込む
+
+
+def tune_for_ingest(conn, synchronous: str = "NORMAL"):
+    """大量に書き込むための設定（WAL + synchronous=NORMAL）
+
+    WAL ではコミットごとの fsync が減り、書き込み中も他の接続から読める。
+    synchronous=NORMAL は電源断のときに最後のコミットが失われることがあるが、DBは壊れない。
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+
+
+def crawl_pages(fetch, parse, start_page: int = 1, max_pages: int = None):
+    """fetch(page) でHTMLを取得し parse(html) で解析して (page, rows) を返すジェネレーター
+
+    rows が空のページ（最後のページの次）で終わる。
+    """
+    page = start_page
+    while max_pages is None or page < start_page + max_pages:
+        rows = parse(fetch(page))
+        if not rows:
+            return
+        yield page, rows
+        page += 1
+
+
+def normalize(pages, func):
+    """各行を func で変換する（func が None を返した行は捨てる）"""
+    for page, rows in pages:
+        yield page, [row for row in map(func, rows) if row is not None]
+
+
+class BatchWriter:
+    """行をためて、batch_size 行ごと・flush_seconds 秒ごとに1トランザクションで書き込む
+
+    on_flush(conn, pages) を渡すと、同じトランザクションの中で呼ばれる
+    （pages はそのバッチに含まれる (page, 行数) のリスト）。
+    取得済みページの記録などを行と一緒に確定させるのに使う。
+    """
+
+    def __init__(self, conn, insert_sql: str, batch_size: int = BATCH_SIZE,
+                 flush_seconds: float = FLUSH_SECONDS, on_flush=None):
+        self.conn = conn
+        self.insert_sql = insert_sql
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.on_flush = on_flush
+        self._rows = []
+        self._pages = []
+        self._last_flush = time.monotonic()
+        self.stats = {"rows": 0, "pages": 0, "batches": 0, "seconds_writing": 0.0}
+
+    def write(self, rows, page: int = None):
+        """1ページ分の行を追加する（必要ならその場で書き込む）"""
+        self._rows.extend(rows)
+        if page is not None:
+            self._pages.append((page, len(rows)))
+        if (len(self._rows) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def write_pages(self, pages):
+        """(page, rows) のイテラブルをすべて書き込み、計測値を返す"""
+        for page, rows in pages:
+            self.write(rows, page)
+        self.flush()
+        return self.stats
+
+    def flush(self):
+        """ためている行を1トランザクションで書き込む"""
+        if not self._rows and not self._pages:
+            return
+        started = time.perf_counter()
+        with self.conn:
+            self.conn.executemany(self.insert_sql, self._rows)
+            if self.on_flush is not None:
+                self.on_flush(self.conn, self._pages)
+        self.stats["rows"] += len(self._rows)
+        self.stats["pages"] += len(self._pages)
+        self.stats["batches"] += 1
+        self.stats["seconds_writing"] = round(
+            self.stats["seconds_writing"] + time.perf_counter() - started, 3)
+        self._rows = []
+        self._pages = []
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 例外のときは書きかけのバッチを捨てる（記録していないページは次回取り直す）
+        if exc_type is None:
+            self.flush()
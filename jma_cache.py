@@ -0,0 +1,162 @@
+import json
+import sqlite3
+import threading
+import time
+
+import requests
+
+CACHE_PATH = "http_cache.db"
+DEFAULT_TTL = 600                   # 秒。この間はサーバーに問い合わせない
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+REQUEST_TIMEOUT = 10
+
+
+class HttpCache:
+    """ETag/Last-Modifiedによる条件付きGETを行うディスクキャッシュ
+
+    weather_app.py と weather_app_with_db.py で共有して使う。
+    - TTL内: サーバーに問い合わせずにキャッシュを返す（hit）
+    - TTL切れ: If-None-Match/If-Modified-Since付きで再検証し、304ならキャッシュを返す（revalidated）
+    - それ以外: 通常のGET（miss）
+    合計サイズが max_bytes を超えたら最終アクセスが古い順に削除する（LRU）。
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES, session=None,
+                 timeout: float = REQUEST_TIMEOUT):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                latency REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)')
+        self._conn.commit()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """カウンタを初期化"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.revalidated = 0
+            self.bytes_saved = 0
+            self.seconds_saved = 0.0
+
+    def stats(self):
+        """キャッシュの効果を辞書で返す"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "bytes_saved": self.bytes_saved,
+                "seconds_saved": self.seconds_saved,
+            }
+
+    def get(self, url: str, session=None, timeout: float = None):
+        """URLの本文(bytes)を返す。必要な場合だけサーバーに問い合わせる
+
+        session を渡すと、そのSession（呼び出し側のKeep-Alive接続）で問い合わせる。
+        """
+        session = session or self.session
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT body, etag, last_modified, fetched_at, size, latency FROM responses WHERE url = ?',
+                (url,)).fetchone()
+
+        now = time.time()
+        if row:
+            body, etag, last_modified, fetched_at, size, latency = row
+            if now - fetched_at < self.ttl:
+                self._touch(url, now, fetched=False)
+                with self._lock:
+                    self.hits += 1
+                    self.bytes_saved += size
+                    self.seconds_saved += latency
+                return body
+
+        headers = {}
+        if row:
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        started = time.perf_counter()
+        response = session.get(url, headers=headers, timeout=timeout)
+        elapsed = time.perf_counter() - started
+
+        if row and response.status_code == 304:
+            self._touch(url, now, fetched=True)
+            with self._lock:
+                self.revalidated += 1
+                self.bytes_saved += size
+                self.seconds_saved += max(latency - elapsed, 0.0)
+            return body
+
+        response.raise_for_status()
+        self._store(url, response, now, elapsed)
+        return response.content
+
+    def get_json(self, url: str, session=None, timeout: float = None):
+        """URLのJSONを返す"""
+        return json.loads(self.get(url, session, timeout))
+
+    def _touch(self, url, now, fetched):
+        with self._lock:
+            if fetched:
+                self._conn.execute('UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE url = ?',
+                                   (now, now, url))
+            else:
+                self._conn.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (now, url))
+            self._conn.commit()
+
+    def _store(self, url, response, now, elapsed):
+        body = response.content
+        with self._lock:
+            self.misses += 1
+            with self._conn:
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO responses
+                    (url, body, etag, last_modified, fetched_at, accessed_at, size, latency)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                      now, now, len(body), elapsed))
+                self._evict()
+
+    def _evict(self):
+        """合計サイズが上限を超えていれば、最終アクセスが古いものから削除"""
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self._conn.execute(
+                'SELECT url, size FROM responses ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM responses WHERE url = ?', (url,))
+            total -= size
+
+    def clear(self):
+        """キャッシュを全削除"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute('DELETE FROM responses')
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 定数：気象庁API
+JMA_BASE_URL = "https://www.jma.go.jp"
+AREA_PATH = "/bosai/common/const/area.json"
+FORECAST_PATH_TEMPLATE = "/bosai/forecast/data/forecast/{}.json"
+AREA_URL = JMA_BASE_URL + AREA_PATH
+FORECAST_URL_TEMPLATE = JMA_BASE_URL + FORECAST_PATH_TEMPLATE
+
+# 通信設定
+REQUEST_TIMEOUT = 10
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# 記録済みの気象庁JSON（area.json と予報1件）。オフラインでの検証に使う
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "jma")
+FIXTURE_FORECAST_CODE = "130000"
+
+# data[0] が短期予報（3日先まで）、data[1] が週間予報
+REPORT_KINDS = ("short", "weekly")
+
+
+def parse_latest_weather(data):
+    """予報JSONから直近の (地域名, 天気) を取り出す"""
+    time_series = data[0]['timeSeries'][0]
+    weather_area = time_series['areas'][0]
+    return weather_area['area']['name'], weather_area['weathers'][0]
+
+
+def parse_forecast(data):
+    """予報JSONの全timeSeries（天気・風・波・降水確率・気温、週間予報）を正規化する
+
+    発表ごとに {"kind", "publishing_office", "report_datetime", "areas", "values"} を返す。
+    areas は (区域コード, 区域名)、values は (区域コード, 時刻, 要素名, 値) のリスト。
+    """
+    reports = []
+    for index, report in enumerate(data):
+        kind = REPORT_KINDS[index] if index < len(REPORT_KINDS) else f"report{index}"
+        areas = {}
+        values = []
+        for series in report.get('timeSeries', []):
+            time_defines = series['timeDefines']
+            for area in series['areas']:
+                code = area['area']['code']
+                areas[code] = area['area']['name']
+                for element, items in area.items():
+                    if element == 'area' or not isinstance(items, list):
+                        continue
+                    for time_define, value in zip(time_defines, items):
+                        # 週間予報の当日分などは空文字で来るので保存しない
+                        if value == "":
+                            continue
+                        values.append((code, time_define, element, str(value)))
+        reports.append({
+            "kind": kind,
+            "publishing_office": report.get('publishingOffice'),
+            "report_datetime": report['reportDatetime'],
+            "areas": list(areas.items()),
+            "values": values,
+        })
+    return reports
+
+
+def parse_forecast_rows(area_code, data):
+    """forecastsテーブル用に、先頭区域の天気を予報対象の日時ごとの行にする"""
+    time_series = data[0]['timeSeries'][0]
+    weathers = time_series['areas'][0]['weathers']
+    return [
+        # timeDefines は "2025-01-01T17:00:00+09:00" 形式
+        (area_code, time_define[:10], time_define[11:16], weather)
+        for time_define, weather in zip(time_series['timeDefines'], weathers)
+    ]
+
+
+class ForecastFetcher:
+    """気象庁APIから複数地域の予報をまとめて並行取得する"""
+
+    def __init__(self, base_url: str = JMA_BASE_URL, max_workers: int = 8,
+                 per_host_limit: int = 4, timeout: float = REQUEST_TIMEOUT,
+                 retries: int = 3, backoff: float = 0.5, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # jma_cache.HttpCache を渡すと条件付きGETで取得する
+        self.cache = cache
+
+        # Sessionを使い回してKeep-Aliveで接続を再利用する
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # ホストごとの同時接続数の上限
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_limits[host]
+
+    def get_json(self, url):
+        """タイムアウトとリトライ（指数バックオフ）付きでJSONを取得"""
+        semaphore = self._host_semaphore(url)
+        for attempt in range(self.retries + 1):
+            try:
+                with semaphore:
+                    if self.cache is not None:
+                        # キャッシュからの問い合わせもこのSession（Keep-Alive）で行う
+                        return self.cache.get_json(url, self.session, self.timeout)
+                    response = self.session.get(url, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS and attempt < self.retries:
+                    raise requests.HTTPError(f"status {response.status_code}", response=response)
+                response.raise_for_status()
+                return response.json()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                status = e.response.status_code if e.response is not None else None
+                retryable = status is None or status in RETRY_STATUS
+                if not retryable or attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
+
+    def fetch_offices(self):
+        """area.jsonのofficesを取得"""
+        return self.get_json(self.base_url + AREA_PATH)['offices']
+
+    def fetch_forecast(self, area_code: str):
+        """1地域分の予報JSONを取得"""
+        return self.get_json(self.base_url + FORECAST_PATH_TEMPLATE.format(area_code))
+
+    def iter_forecasts(self, area_codes):
+        """全地域の予報を並行取得し、完了した順に (area_code, data, error) を返す"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.fetch_forecast, code): code for code in area_codes}
+            for future in as_completed(futures):
+                code = futures[future]
+                try:
+                    yield code, future.result(), None
+                except Exception as e:
+                    yield code, None, e
+
+    def fetch_all(self, db, area_codes=None, batch_size: int = 20):
+        """全地域の予報を取得し、batch_size件ごとにDBへまとめて書き込む"""
+        if area_codes is None:
+            offices = self.fetch_offices()
+            db.insert_areas((code, info['name']) for code, info in offices.items())
+            area_codes = list(offices)
+
+        started = time.perf_counter()
+        batch = []
+        saved = 0
+        errors = {}
+        for code, data, error in self.iter_forecasts(area_codes):
+            if error is not None:
+                errors[code] = error
+                continue
+            try:
+                batch.append((code, parse_forecast(data), parse_forecast_rows(code, data)))
+            except (KeyError, IndexError, TypeError) as e:
+                errors[code] = e
+                continue
+            if len(batch) >= batch_size:
+                saved += self._save_batch(db, batch)
+                batch = []
+        if batch:
+            saved += self._save_batch(db, batch)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "saved": saved,
+            "errors": errors,
+            "elapsed": elapsed,
+            "per_second": saved / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def _save_batch(self, db, batch):
+        # バッチ全体を1トランザクションで保存する。失敗したら（ロールバックされるので）
+        # レスポンスごとに保存し直し、壊れたレスポンス以外は保存する
+        if db.insert_forecast_reports(batch):
+            return len(batch)
+        return sum(db.insert_forecast_report(code, reports, rows) for code, reports, rows in batch)
+
+    def close(self):
+        self.session.close()
+
+
+def start_stub_server(directory: str, port: int = 0, delay: float = 0.0):
+    """記録済みJSONを返すローカルHTTPサーバーを起動する（オフライン検証用）
+
+    directory 以下に気象庁と同じパス構成（bosai/common/const/area.json,
+    bosai/forecast/data/forecast/<code>.json）でファイルを置いておく。
+    返り値の base_url を ForecastFetcher(base_url=...) に渡して使う。
+    delay を指定すると、応答ごとにその秒数だけ待つ（遅い回線の代わり）。
+    """
+    handler = partial(_QuietHandler, directory=directory, delay=delay)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    # HTTP/1.1でKeep-Aliveを有効にする
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, delay: float = 0.0, **kwargs):
+        self.delay = delay
+        super().__init__(*args, **kwargs)
+
+    def send_head(self):
+        if self.delay:
+            time.sleep(self.delay)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def build_stub_directory(directory: str, fixture_dir: str = FIXTURE_DIR):
+    """fixture_dir の area.json にある全地域分の予報JSONを directory に並べる
+
+    地域ごとの記録が無い地域には、FIXTURE_FORECAST_CODE の記録を置く。地域数を返す。
+    """
+    area_path = os.path.join(directory, AREA_PATH.lstrip("/"))
+    os.makedirs(os.path.dirname(area_path), exist_ok=True)
+    shutil.copyfile(os.path.join(fixture_dir, AREA_PATH.lstrip("/")), area_path)
+
+    forecast_dir = os.path.join(fixture_dir, os.path.dirname(FORECAST_PATH_TEMPLATE.lstrip("/")))
+    template = os.path.join(forecast_dir, f"{FIXTURE_FORECAST_CODE}.json")
+    with open(area_path, encoding="utf-8") as f:
+        offices = json.load(f)["offices"]
+    for code in offices:
+        recorded = os.path.join(forecast_dir, f"{code}.json")
+        target = os.path.join(directory, FORECAST_PATH_TEMPLATE.format(code).lstrip("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(recorded if os.path.exists(recorded) else template, target)
+    return len(offices)
+
+
+def run_offline(max_workers: int = 8, delay: float = 0.0, use_cache: bool = False, rounds: int = 1):
+    """記録済みJSONを返すスタブサーバーに対して fetch_all を実行し、結果を回ごとに返す
+
+    DB・キャッシュは一時ディレクトリに作る。use_cache=True のときは HttpCache を通して取得し、
+    2回目以降はキャッシュ（TTL内）から返る。
+    """
+    from jma_cache import HttpCache
+    from weather_db import WeatherDatabase
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        serve_dir = os.path.join(directory, "www")
+        offices = build_stub_directory(serve_dir)
+        server, base_url = start_stub_server(serve_dir, delay=delay)
+        cache = HttpCache(os.path.join(directory, "http_cache.db")) if use_cache else None
+        fetcher = ForecastFetcher(base_url=base_url, max_workers=max_workers, cache=cache)
+        db = WeatherDatabase(os.path.join(directory, "weather_data.db"))
+        try:
+            for _ in range(rounds):
+                result = fetcher.fetch_all(db)
+                result["offices"] = offices
+                if cache is not None:
+                    result["cache"] = cache.stats()
+                    cache.reset_stats()
+                results.append(result)
+        finally:
+            db.close()
+            fetcher.close()
+            if cache is not None:
+                cache.close()
+            server.shutdown()
+            server.server_close()
+    return results
+
+
+def _print_result(result):
+    print(f"{result['saved']} 件保存 / エラー {len(result['errors'])} 件 / "
+          f"{result['elapsed']:.2f} 秒 ({result['per_second']:.1f} 件/秒)")
+    if "cache" in result:
+        print(f"  キャッシュ: {result['cache']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全地域の予報を並行取得してDBに保存する")
+    parser.add_argument("--offline", action="store_true",
+                        help="気象庁の代わりに fixtures/jma の記録を返すスタブサーバーから取得する")
+    parser.add_argument("--delay", type=float, default=0.0, help="--offline で応答ごとに待つ秒数")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--cache", action="store_true", help="HttpCache を通して取得する")
+    parser.add_argument("--rounds", type=int, default=1, help="--offline で繰り返す回数")
+    args = parser.parse_args()
+
+    if args.offline:
+        for result in run_offline(args.workers, args.delay, args.cache, args.rounds):
+            _print_result(result)
+        return
+
+    from jma_cache import HttpCache
+    from weather_db import WeatherDatabase
+
+    fetcher = ForecastFetcher(max_workers=args.workers, cache=HttpCache() if args.cache else None)
+    result = fetcher.fetch_all(WeatherDatabase())
+    fetcher.close()
+    _print_result(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""ページ番号つきの一覧ページを並行に取得するための部品（SUUMO・GitHub のスクレイパーで共通）
+
+- TokenBucket:       リクエスト頻度の制限
+- PageFetcher:       1ページ分のHTMLの取得（頻度制限・再試行・保存つき）
+- ConcurrentCrawler: 取得（スレッド）と解析（プロセス）を並行に進め、終わったページから返す
+- start_fixture_server: 保存したページを返すローカルサーバー（オフラインでの検証・計測用）
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """トークンバケットによるリクエスト頻度の制限（スレッドセーフ）
+
+    rate 件/秒でトークンが貯まり、最大 capacity 件までまとめて送れる。
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンが1つ取れるまで待つ"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class PageFetcher:
+    """url_template（"{page}" を含むURL）のページを取得する
+
+    頻度はトークンバケット（rate 件/秒）で制限し、429/5xx と通信エラーは
+    指数バックオフで再試行する（Retry-After があればそれに従う）。
+    save_dir を指定すると取得したHTMLを page_<番号>.html として保存する。
+    """
+
+    def __init__(self, url_template: str, headers=None, rate: float = 1.0, burst: int = 1,
+                 retries: int = 3, backoff: float = 2.0, timeout: float = 10, save_dir: str = None):
+        self.url_template = url_template
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.save_dir = save_dir
+        self.bucket = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+
+    def fetch(self, page: int):
+        """1ページ分のHTMLを取得する"""
+        url = self.url_template.format(page=page)
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                res = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
+                continue
+            if res.status_code in RETRY_STATUS and attempt < self.retries:
+                retry_after = res.headers.get("Retry-After", "")
+                wait = float(retry_after) if retry_after.isdigit() else self.backoff * (2 ** attempt)
+                time.sleep(wait)
+                continue
+            res.raise_for_status()
+            res.encoding = 'utf-8'
+            if self.save_dir:
+                with open(os.path.join(self.save_dir, f"page_{page}.html"), "w", encoding="utf-8") as f:
+                    f.write(res.text)
+            return res.text
+
+    def close(self):
+        self.session.close()
+
+
+class ConcurrentCrawler:
+    """ページを並行に取得・解析し、終わったページから (page, rows) を返す
+
+    fetch(page) はスレッドで最大 max_in_flight 件同時に、parse(html) は parse_workers 個の
+    プロセスで実行する（0ならその場で解析。プロセスで動かす parse はモジュールの関数にする）。
+    rows が空のページ（最後のページの次）が出たら、それより後のページは取得しない。
+    取得・解析に失敗したページは failed に入る。
+    """
+
+    def __init__(self, fetch, parse, max_in_flight: int = 4, parse_workers: int = 0):
+        self.fetch = fetch
+        self.parse = parse
+        self.max_in_flight = max_in_flight
+        self.parse_workers = parse_workers
+        self.failed = []
+        self.last_page = None
+
+    def iter_pages(self, pages, last_page: int):
+        """pages（昇順のページ番号）を last_page まで取得するジェネレーター
+
+        呼び出し側が次のページを取り出すまで新しい取得は始めないので、
+        書き込みが遅れても取得済みのHTMLや行が溜まり続けることはない。
+        """
+        self.last_page = last_page
+        self.failed = []
+        pending = iter(pages)
+
+        parse_pool = ProcessPoolExecutor(self.parse_workers) if self.parse_workers != 0 else None
+        try:
+            with ThreadPoolExecutor(self.max_in_flight) as fetch_pool:
+                running = {}
+
+                def schedule_fetches():
+                    while sum(1 for kind, _ in running.values() if kind == "fetch") < self.max_in_flight:
+                        page = next(pending, None)
+                        if page is None:
+                            return
+                        if page <= self.last_page:
+                            running[fetch_pool.submit(self.fetch, page)] = ("fetch", page)
+
+                schedule_fetches()
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        kind, page = running.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"Page {page}: エラー（次回の実行で再取得します）: {e}")
+                            self.failed.append(page)
+                            continue
+
+                        if kind == "fetch":
+                            if parse_pool is not None:
+                                running[parse_pool.submit(self.parse, result)] = ("parse", page)
+                                continue
+                            result = self.parse(result)
+
+                        if not result:
+                            # 0件のページ以降は取得しない
+                            self.last_page = min(self.last_page, page - 1)
+                        yield page, result
+                    schedule_fetches()
+        finally:
+            if parse_pool is not None:
+                parse_pool.shutdown()
+
+
+def pages_to_fetch(progress, max_pages: int):
+    """取得済みページ {page: row_count} を除いた、これから取得するページ番号と最終ページ
+
+    以前のクロールで0件のページ（最終ページの次）まで取得していれば、そこまでで終わる。
+    """
+    last_page = min([page - 1 for page, count in progress.items() if count == 0] + [max_pages])
+    return [page for page in range(1, last_page + 1) if page not in progress], last_page
+
+
+def start_fixture_server(directory: str, port: int = 0):
+    """保存したHTML（directory/page_<番号>.html）を返すローカルサーバーを起動する
+
+    URLのクエリの page=<番号> でページを選ぶ（パスは何でもよい）。
+    ファイルの無いページには中身の無いページを返す。返り値は (server, "http://127.0.0.1:<port>")。
+    """
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            page = query.get("page", ["1"])[0]
+            path = os.path.join(directory, f"page_{page}.html")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    body = f.read()
+            else:
+                body = b"<html><body></body></html>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
@@ -0,0 +1,977 @@
+"""suumo.db（SUUMO賃貸物件データ）の検索処理"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+from ingest_pipeline import BATCH_SIZE, FLUSH_SECONDS, BatchWriter, tune_for_ingest
+
+DB_PATH = "suumo.db"
+BENCH_DB_PATH = "suumo_bench.db"
+LIST_COLUMNS = "p.name, p.station, p.price, p.age, p.floor_plan"
+PAGE_SIZE = 50
+
+# スクレイピングで取得する列
+PROPERTY_COLUMNS = "name, station, price, age, floor_plan, floor_num"
+PROPERTY_COLUMNS_SQL = """
+            name TEXT,
+            station TEXT,
+            price INTEGER,
+            age INTEGER,
+            floor_plan TEXT,
+            floor_num TEXT"""
+
+# 取り込むときに文字列から変換して持つ数値の列（絞り込み・集計はこちらを使う）
+TYPED_COLUMNS = "floor_number, floor_area, management_fee, walk_minutes"
+TYPED_COLUMNS_SQL = """
+            floor_number INTEGER,
+            floor_area REAL,
+            management_fee INTEGER,
+            walk_minutes INTEGER"""
+
+FLOOR_NUMBER_PATTERN = re.compile(r'(B?)(\d+)')
+FLOOR_AREA_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*m')
+MANAGEMENT_FEE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(万?)円')
+# 間取りの並び順（狭い順）: ワンルーム, 1K, 1DK, 1LDK, 2K, ...
+FLOOR_PLAN_PATTERN = re.compile(r'^(\d+)([SLDKR]+)$')
+FLOOR_PLAN_RANKS = {"K": 1, "DK": 2, "LDK": 3, "SK": 4, "SDK": 5, "SLDK": 6}
+# "東京メトロ有楽町線/麹町駅 歩4分"（バスを使う場合は徒歩の分数なし）
+ACCESS_PATTERN = re.compile(r'^(?P<line>[^/]+)/(?P<station>\S+?)駅?(?:\s+歩(?P<walk>\d+)分|\s|$)')
+
+# trigram トークナイザは3文字未満の語を索引から引けない
+MIN_FTS_KEYWORD_LENGTH = 3
+
+# 範囲で絞り込める列・並び替えできる列
+RANGE_COLUMNS = {
+    "price": "p.price", "age": "p.age", "floor": "p.floor_number",
+    "area": "p.floor_area", "walk": "p.walk_minutes",
+}
+SORT_COLUMNS = {
+    "id": "p.id", "name": "p.name", "station": "p.station", "price": "p.price",
+    "age": "p.age", "floor_plan": "p.floor_plan", "floor": "p.floor_number",
+    "area": "p.floor_area", "walk": "p.walk_minutes",
+    # 関連度順（全文検索の bm25）。全文検索を使わないキーワードでは登録順と同じ
+    "rank": "properties_fts.rank",
+}
+
+# 絞り込み・並び替えのパターンに合わせた索引
+#   間取り IN + 家賃の範囲/並び替え、家賃の範囲、築年数・階数・面積・駅徒歩の範囲、駅
+FILTER_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_properties_plan_price ON properties (floor_plan, price)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_price ON properties (price)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_age_price ON properties (age, price)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_floor_number ON properties (floor_number, price)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_area_price ON properties (floor_area, price)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_walk_price ON properties (walk_minutes, price)",
+    # removed_at も含めて、駅で絞った件数を表を読まずに数えられるようにする
+    "CREATE INDEX IF NOT EXISTS idx_properties_station_active ON properties (station_id, removed_at, price)",
+]
+# 以前の版で作っていた索引（floor_num の式に対する索引は floor_number に、
+# 駅の索引は removed_at を含むものに置き換えた）
+OBSOLETE_INDEXES = ["idx_properties_floor", "idx_properties_station"]
+
+
+def get_connection(db_path: str = DB_PATH, check_same_thread: bool = True):
+    """suumo.db に接続し、テーブルと全文検索・絞り込み用の索引・集計テーブルを用意する
+
+    テーブル・索引の確認に時間がかかるので、アプリでは起動時に1回だけ呼んで接続を使い回す。
+    複数のスレッドから使うときは check_same_thread=False にし、呼び出し側でロックする。
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    tune_for_ingest(conn)
+    ensure_schema(conn)
+    ensure_search_index(conn)
+    ensure_filter_indexes(conn)
+    ensure_aggregates(conn)
+    return conn
+
+
+def listing_key(name, station, floor_num, floor_plan, price):
+    """物件（部屋）を識別する安定したキー"""
+    raw = "\x1f".join(str(value) for value in (name, station, floor_num, floor_plan, price))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def parse_floor_number(floor_num):
+    """"3階" → 3、"B1階" → -1、"1-2階" → 1（読めなければ None）"""
+    match = FLOOR_NUMBER_PATTERN.search(floor_num or "")
+    if not match:
+        return None
+    number = int(match.group(2))
+    return -number if match.group(1) else number
+
+
+def parse_floor_area(floor_area):
+    """"25.5m2" → 25.5（読めなければ None）"""
+    match = FLOOR_AREA_PATTERN.search(floor_area or "")
+    return float(match.group(1)) if match else None
+
+
+def parse_management_fee(management_fee):
+    """"10000円" → 10000、"1.2万円" → 12000、"-"（なし） → 0（空なら None）"""
+    if not management_fee:
+        return None
+    match = MANAGEMENT_FEE_PATTERN.search(management_fee)
+    if not match:
+        return 0 if management_fee.strip() in ("-", "－") else None
+    return int(float(match.group(1)) * (10000 if match.group(2) else 1))
+
+
+def floor_plan_order(floor_plan):
+    """間取りを狭い順に並べるためのキー"""
+    if floor_plan == "ワンルーム":
+        return (0, 0, "")
+    match = FLOOR_PLAN_PATTERN.match(floor_plan or "")
+    if not match:
+        return (99, 0, floor_plan or "")
+    return (int(match.group(1)), FLOOR_PLAN_RANKS.get(match.group(2), 9), match.group(2))
+
+
+def parse_access(access):
+    """交通の文字列から (路線, 駅, 徒歩分数) を返す（読めなければ None の組）
+
+    "東京メトロ有楽町線/麹町駅 歩4分" → ("東京メトロ有楽町線", "麹町", 4)
+    バスを使う場合など、駅からの徒歩分数が無いときは分数が None。
+    """
+    match = ACCESS_PATTERN.match(access or "")
+    if not match:
+        return None, None, None
+    walk = match.group("walk")
+    return match.group("line").strip(), match.group("station"), int(walk) if walk else None
+
+
+def ensure_schema(conn):
+    """properties / properties_staging / stations を用意し、古い suumo.db には足りない列を追加する"""
+    # 駅（路線と駅名の組ごとに1行）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stations (
+            station_id INTEGER PRIMARY KEY,
+            line TEXT NOT NULL,
+            name TEXT NOT NULL,
+            UNIQUE (line, name)
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS properties (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            {PROPERTY_COLUMNS_SQL},
+            listing_key TEXT,
+            first_seen TIMESTAMP,
+            last_seen TIMESTAMP,
+            removed_at TIMESTAMP,
+            {TYPED_COLUMNS_SQL.strip()},
+            station_id INTEGER REFERENCES stations(station_id),
+            base_url TEXT
+        )
+    ''')
+
+    # 取り込み途中のデータを置く作業用テーブル（アプリからは読まない）
+    # 行はクロールの base_url ごとに分ける（別の URL のクロールが途中でも消さない）
+    # 列が足りない古い作業用テーブルは中身ごと作り直す（次のクロールは最初から）
+    staging_columns = {row[1] for row in conn.execute("PRAGMA table_info(properties_staging)")}
+    if staging_columns and "base_url" not in staging_columns:
+        with conn:
+            conn.execute("DROP TABLE properties_staging")
+            conn.execute("DROP TABLE IF EXISTS crawl_progress")
+            conn.execute("DROP TABLE IF EXISTS crawl_listing")
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS properties_staging (
+            {PROPERTY_COLUMNS_SQL},
+            {TYPED_COLUMNS_SQL.strip()},
+            station_line TEXT,
+            station_name TEXT,
+            listing_key TEXT NOT NULL,
+            base_url TEXT NOT NULL,
+            PRIMARY KEY (base_url, listing_key)
+        )
+    ''')
+
+    # ページ単位の取得状況（途中で止まったクロールを続きから再開するため）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_progress (
+            base_url TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (base_url, page)
+        )
+    ''')
+    # 1ページ目から読み取った検索結果の件数と最終ページ（全件そろったかの判定に使う）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_listing (
+            base_url TEXT PRIMARY KEY,
+            total_count INTEGER,
+            last_page INTEGER
+        )
+    ''')
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(properties)")}
+    with conn:
+        for column in ("listing_key", "first_seen", "last_seen", "removed_at"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE properties ADD COLUMN {column} {'TEXT' if column == 'listing_key' else 'TIMESTAMP'}")
+        if "listing_key" not in columns:
+            # 既存の行にキーを付け、同じキーの重複行は最初の1行だけ残す
+            conn.create_function("listing_key", 5, listing_key, deterministic=True)
+            conn.execute('''
+                UPDATE properties
+                SET listing_key = listing_key(name, station, floor_num, floor_plan, price),
+                    first_seen = CURRENT_TIMESTAMP, last_seen = CURRENT_TIMESTAMP
+            ''')
+            conn.execute('''
+                DELETE FROM properties WHERE id NOT IN (
+                    SELECT MIN(id) FROM properties GROUP BY listing_key
+                )
+            ''')
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_properties_listing_key ON properties (listing_key)")
+        # 物件を最後に見つけたクロールの base_url（掲載終了を付ける範囲。以前の行は NULL）
+        if "base_url" not in columns:
+            conn.execute("ALTER TABLE properties ADD COLUMN base_url TEXT")
+
+    if "floor_number" not in columns:
+        backfill_typed_columns(conn)
+
+
+def backfill_typed_columns(conn):
+    """数値の列と station_id が無い古い suumo.db に列を追加し、既存の行の文字列から埋める
+
+    管理費・専有面積は以前は保存していなかったので NULL のまま（次のクロールで埋まる）。
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(properties)")}
+    with conn:
+        for column, column_type in (("floor_number", "INTEGER"), ("floor_area", "REAL"),
+                                    ("management_fee", "INTEGER"), ("walk_minutes", "INTEGER"),
+                                    ("station_id", "INTEGER REFERENCES stations(station_id)")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE properties ADD COLUMN {column} {column_type}")
+
+        conn.create_function("parse_floor_number", 1, parse_floor_number, deterministic=True)
+        conn.execute("UPDATE properties SET floor_number = parse_floor_number(floor_num)")
+
+        # 駅は異なる文字列ごとに1回だけ解析する
+        for (station,) in conn.execute("SELECT DISTINCT station FROM properties").fetchall():
+            line, name, walk = parse_access(station)
+            if name is None:
+                continue
+            conn.execute("INSERT OR IGNORE INTO stations (line, name) VALUES (?, ?)", (line, name))
+            conn.execute('''
+                UPDATE properties
+                SET station_id = (SELECT station_id FROM stations WHERE line = ? AND name = ?),
+                    walk_minutes = ?
+                WHERE station = ?
+            ''', (line, name, walk, station))
+
+
+STAGING_INSERT_SQL = f'''
+    INSERT OR REPLACE INTO properties_staging
+        ({PROPERTY_COLUMNS}, {TYPED_COLUMNS}, station_line, station_name, listing_key, base_url)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def staging_row(row, base_url: str):
+    """スクレイピングした1行を作業用テーブルの列の順にする
+
+    階数・専有面積・管理費・交通の文字列を数値に変換し、listing_key とクロールの base_url を付ける。
+    """
+    name, station, price, age, floor_plan, floor_num, management_fee, floor_area, access = row
+    line, station_name, walk_minutes = parse_access(access)
+    return (name, station, price, age, floor_plan, floor_num,
+            parse_floor_number(floor_num), parse_floor_area(floor_area),
+            parse_management_fee(management_fee), walk_minutes,
+            line, station_name,
+            listing_key(name, station, floor_num, floor_plan, price),
+            base_url)
+
+
+def stage_rows(conn, rows, base_url: str):
+    """スクレイピングした行（suumo_extract の出力）を base_url のクロールの作業用テーブルに書く"""
+    with conn:
+        conn.executemany(STAGING_INSERT_SQL, (staging_row(row, base_url) for row in rows))
+
+
+def record_crawl_progress(conn, base_url: str, pages):
+    """取得済みページ [(page, row_count), ...] を記録する（呼び出し側のトランザクションの中で使う）"""
+    conn.executemany('''
+        INSERT OR REPLACE INTO crawl_progress (base_url, page, row_count)
+        VALUES (?, ?, ?)
+    ''', ((base_url, page, row_count) for page, row_count in pages))
+
+
+def staging_writer(conn, base_url: str, batch_size: int = BATCH_SIZE, flush_seconds: float = FLUSH_SECONDS):
+    """作業用テーブルへのバッチ書き込み（行と取得済みページの記録を同じトランザクションで書く）
+
+    staging_row（base_url は同じもの）で変換した (page, rows) を write_pages に渡して使う。
+    """
+    return BatchWriter(conn, STAGING_INSERT_SQL, batch_size, flush_seconds,
+                       on_flush=lambda conn, pages: record_crawl_progress(conn, base_url, pages))
+
+
+def load_crawl_progress(conn, base_url: str):
+    """取得済みのページ番号と件数の辞書 {page: row_count}"""
+    return dict(conn.execute(
+        "SELECT page, row_count FROM crawl_progress WHERE base_url = ?", (base_url,)).fetchall())
+
+
+def forget_crawl_pages(conn, base_url: str, pages):
+    """取得済みの記録からページを消す（次回もう一度取得する）"""
+    with conn:
+        conn.executemany("DELETE FROM crawl_progress WHERE base_url = ? AND page = ?",
+                         ((base_url, page) for page in pages))
+
+
+def record_crawl_listing(conn, base_url: str, total_count, last_page):
+    """1ページ目から読み取った件数と最終ページを記録する（読めなかった値は None）"""
+    with conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO crawl_listing (base_url, total_count, last_page)
+            VALUES (?, ?, ?)
+        ''', (base_url, total_count, last_page))
+
+
+def load_crawl_listing(conn, base_url: str):
+    """記録した (total_count, last_page)。まだ記録していなければ None"""
+    return conn.execute(
+        "SELECT total_count, last_page FROM crawl_listing WHERE base_url = ?", (base_url,)).fetchone()
+
+
+def clear_crawl_progress(conn, base_url: str):
+    with conn:
+        conn.execute("DELETE FROM crawl_progress WHERE base_url = ?", (base_url,))
+        conn.execute("DELETE FROM crawl_listing WHERE base_url = ?", (base_url,))
+
+
+def clear_staging(conn, base_url: str):
+    """base_url のクロールの作業用の行を消す（他の URL のクロールの行は残す）"""
+    with conn:
+        conn.execute("DELETE FROM properties_staging WHERE base_url = ?", (base_url,))
+
+
+def merge_staging(conn, base_url: str, complete: bool = True):
+    """base_url のクロールの作業用の行を properties に1トランザクションで反映する
+
+    - 既存の物件は築年数と last_seen を更新し、新しい物件は追加する（どちらも base_url を記録）
+    - complete=True（全ページを取得できた）ときだけ、同じ base_url の物件（以前の版で入れた
+      base_url の無い物件を含む）のうち今回見つからなかったものに removed_at を付ける。
+      別の URL のクロールで見つかった物件には付けない
+    反映は1トランザクションなので、アプリは反映前か反映後のどちらかしか見ない。
+    件数を辞書で返す。
+    """
+    with conn:
+        staged = conn.execute(
+            "SELECT COUNT(*) FROM properties_staging WHERE base_url = ?", (base_url,)).fetchone()[0]
+        conn.execute('''
+            INSERT OR IGNORE INTO stations (line, name)
+            SELECT DISTINCT station_line, station_name FROM properties_staging
+            WHERE base_url = ? AND station_name IS NOT NULL
+        ''', (base_url,))
+        seen = conn.execute('''
+            UPDATE properties
+            SET age = s.age, floor_number = s.floor_number, floor_area = s.floor_area,
+                management_fee = s.management_fee, walk_minutes = s.walk_minutes,
+                station_id = st.station_id, base_url = s.base_url,
+                last_seen = CURRENT_TIMESTAMP, removed_at = NULL
+            FROM properties_staging s
+            LEFT JOIN stations st ON st.line = s.station_line AND st.name = s.station_name
+            WHERE s.base_url = ? AND properties.listing_key = s.listing_key
+        ''', (base_url,)).rowcount
+        typed_columns = ", ".join(f"s.{column.strip()}" for column in TYPED_COLUMNS.split(","))
+        property_columns = ", ".join(f"s.{column.strip()}" for column in PROPERTY_COLUMNS.split(","))
+        inserted = conn.execute(f'''
+            INSERT INTO properties ({PROPERTY_COLUMNS}, {TYPED_COLUMNS}, station_id,
+                                    listing_key, base_url, first_seen, last_seen)
+            SELECT {property_columns}, {typed_columns}, st.station_id,
+                   s.listing_key, s.base_url, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+            FROM properties_staging s
+            LEFT JOIN stations st ON st.line = s.station_line AND st.name = s.station_name
+            WHERE s.base_url = ?
+              AND NOT EXISTS (SELECT 1 FROM properties p WHERE p.listing_key = s.listing_key)
+        ''', (base_url,)).rowcount
+        removed = 0
+        if complete and staged:
+            removed = conn.execute('''
+                UPDATE properties SET removed_at = CURRENT_TIMESTAMP
+                WHERE removed_at IS NULL
+                  AND (base_url = ?1 OR base_url IS NULL)
+                  AND listing_key NOT IN (SELECT listing_key FROM properties_staging WHERE base_url = ?1)
+            ''', (base_url,)).rowcount
+        conn.execute("DELETE FROM properties_staging WHERE base_url = ?", (base_url,))
+        # 件数・合計はトリガーで更新済み。四分位数は変わった間取りだけ計算し直す
+        refresh_plan_stats(conn)
+    return {"staged": staged, "inserted": inserted, "seen": seen, "removed": removed}
+
+
+def _aggregate_sql(row: str, sign: int):
+    """row（new / old）の物件を集計に加える（sign=1）・集計から除く（sign=-1）トリガー用のSQL
+
+    掲載中（removed_at IS NULL）の物件だけを数える。
+    """
+    active = f"{row}.removed_at IS NULL AND {row}.price IS NOT NULL"
+    statements = []
+    for table, column in (("stats_price_by_age", "age"), ("stats_price_by_floor", "floor_number")):
+        statements.append(f'''
+            INSERT INTO {table} ({column}, listings, price_sum)
+            SELECT {row}.{column}, {sign}, {sign} * {row}.price WHERE {active} AND {row}.{column} IS NOT NULL
+            ON CONFLICT ({column}) DO UPDATE SET
+                listings = listings + excluded.listings, price_sum = price_sum + excluded.price_sum;''')
+        if sign < 0:
+            statements.append(f"DELETE FROM {table} WHERE {column} = {row}.{column} AND listings <= 0;")
+    # 四分位数は差分で更新できないので、変わった間取りを記録しておき merge_staging の最後に計算し直す
+    statements.append(f'''
+            INSERT OR IGNORE INTO stats_dirty_plans (floor_plan)
+            SELECT {row}.floor_plan WHERE {active} AND {row}.floor_plan IS NOT NULL;''')
+    return "\n".join(statements)
+
+
+def ensure_aggregates(conn):
+    """分析用の集計テーブルと、properties の変更を集計に反映するトリガーを用意する
+
+    - stats_price_by_plan:  間取りごとの件数・平均・箱ひげ図の値（四分位数・ひげ）
+    - stats_price_by_age:   築年数ごとの件数・家賃の合計
+    - stats_price_by_floor: 階数ごとの件数・家賃の合計
+    トリガーが無ければ（初回・古い suumo.db）作ってから全件で集計し直す。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_price_by_age (
+            age INTEGER PRIMARY KEY,
+            listings INTEGER NOT NULL,
+            price_sum INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_price_by_floor (
+            floor_number INTEGER PRIMARY KEY,
+            listings INTEGER NOT NULL,
+            price_sum INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_price_by_plan (
+            floor_plan TEXT PRIMARY KEY,
+            listings INTEGER NOT NULL,
+            mean_price REAL NOT NULL,
+            min_price INTEGER NOT NULL,
+            whisker_low INTEGER NOT NULL,
+            q1_price REAL NOT NULL,
+            median_price REAL NOT NULL,
+            q3_price REAL NOT NULL,
+            whisker_high INTEGER NOT NULL,
+            max_price INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE TABLE IF NOT EXISTS stats_dirty_plans (floor_plan TEXT PRIMARY KEY)")
+
+    has_trigger = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'properties_stats_ai'").fetchone()
+    if has_trigger:
+        return
+
+    with conn:
+        conn.execute(f'''
+            CREATE TRIGGER properties_stats_ai AFTER INSERT ON properties BEGIN
+                {_aggregate_sql("new", 1)}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER properties_stats_ad AFTER DELETE ON properties BEGIN
+                {_aggregate_sql("old", -1)}
+            END
+        ''')
+        # 再取得で同じ値が書かれただけ（last_seen の更新など）のときは何もしない
+        conn.execute(f'''
+            CREATE TRIGGER properties_stats_au AFTER UPDATE OF price, age, floor_number, floor_plan, removed_at
+            ON properties
+            WHEN old.price IS NOT new.price OR old.age IS NOT new.age
+              OR old.floor_number IS NOT new.floor_number OR old.floor_plan IS NOT new.floor_plan
+              OR (old.removed_at IS NULL) <> (new.removed_at IS NULL)
+            BEGIN
+                {_aggregate_sql("old", -1)}
+                {_aggregate_sql("new", 1)}
+            END
+        ''')
+        rebuild_aggregates(conn)
+
+
+def rebuild_aggregates(conn):
+    """集計テーブルを properties の全件から作り直す（呼び出し側のトランザクションの中で使う）"""
+    for table, column in (("stats_price_by_age", "age"), ("stats_price_by_floor", "floor_number")):
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f'''
+            INSERT INTO {table} ({column}, listings, price_sum)
+            SELECT {column}, COUNT(*), SUM(price) FROM properties
+            WHERE removed_at IS NULL AND price IS NOT NULL AND {column} IS NOT NULL
+            GROUP BY {column}
+        ''')
+    conn.execute("DELETE FROM stats_price_by_plan")
+    conn.execute('''
+        INSERT OR IGNORE INTO stats_dirty_plans (floor_plan)
+        SELECT DISTINCT floor_plan FROM properties WHERE floor_plan IS NOT NULL
+    ''')
+    refresh_plan_stats(conn)
+
+
+def _quantile(prices, q: float):
+    # 線形補間（pandas / numpy の既定と同じ）
+    position = (len(prices) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(prices) - 1)
+    return prices[lower] + (prices[upper] - prices[lower]) * (position - lower)
+
+
+def refresh_plan_stats(conn):
+    """変更があった間取りだけ箱ひげ図の値を計算し直す（呼び出し側のトランザクションの中で使う）
+
+    間取りごとの家賃は idx_properties_plan_price の順に読めるので並び替えは不要。
+    """
+    plans = [row[0] for row in conn.execute("SELECT floor_plan FROM stats_dirty_plans").fetchall()]
+    for plan in plans:
+        prices = [row[0] for row in conn.execute('''
+            SELECT price FROM properties
+            WHERE floor_plan = ? AND removed_at IS NULL AND price IS NOT NULL
+            ORDER BY price
+        ''', (plan,))]
+        if not prices:
+            conn.execute("DELETE FROM stats_price_by_plan WHERE floor_plan = ?", (plan,))
+            continue
+        q1, median, q3 = _quantile(prices, 0.25), _quantile(prices, 0.5), _quantile(prices, 0.75)
+        # ひげは matplotlib の箱ひげ図と同じく、箱から 1.5×IQR 以内で最も外側の値
+        iqr = q3 - q1
+        whisker_low = min(price for price in prices if price >= q1 - 1.5 * iqr)
+        whisker_high = max(price for price in prices if price <= q3 + 1.5 * iqr)
+        conn.execute('''
+            INSERT OR REPLACE INTO stats_price_by_plan
+                (floor_plan, listings, mean_price, min_price, whisker_low,
+                 q1_price, median_price, q3_price, whisker_high, max_price)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (plan, len(prices), sum(prices) / len(prices), prices[0], whisker_low,
+              q1, median, q3, whisker_high, prices[-1]))
+    conn.execute("DELETE FROM stats_dirty_plans")
+
+
+def get_price_by_plan(conn):
+    """間取りごとの [(floor_plan, listings, mean, whisker_low, q1, median, q3, whisker_high), ...]（狭い順）"""
+    rows = conn.execute('''
+        SELECT floor_plan, listings, mean_price, whisker_low, q1_price, median_price, q3_price, whisker_high
+        FROM stats_price_by_plan
+    ''').fetchall()
+    return sorted(rows, key=lambda row: floor_plan_order(row[0]))
+
+
+def get_price_by_age(conn):
+    """築年数ごとの [(age, listings, mean_price), ...]"""
+    return conn.execute('''
+        SELECT age, listings, CAST(price_sum AS REAL) / listings FROM stats_price_by_age ORDER BY age
+    ''').fetchall()
+
+
+def get_price_by_floor(conn):
+    """階数ごとの [(floor_number, listings, mean_price), ...]"""
+    return conn.execute('''
+        SELECT floor_number, listings, CAST(price_sum AS REAL) / listings
+        FROM stats_price_by_floor ORDER BY floor_number
+    ''').fetchall()
+
+
+def ensure_filter_indexes(conn):
+    """絞り込み・並び替え用の複合索引を作る（スクレイパーがテーブルを作り直しても復元される）"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'properties'").fetchone()
+    if not exists:
+        return
+    with conn:
+        for index_name in OBSOLETE_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+        for index_sql in FILTER_INDEXES:
+            conn.execute(index_sql)
+
+
+def ensure_search_index(conn):
+    """properties の name / station に対する FTS5（trigram）索引とトリガーを用意する
+
+    スクレイパーが properties を DROP して作り直すとトリガーも消えるので、
+    トリガーが無ければ作り直して索引を再構築する。
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'properties'").fetchone()
+    if not exists:
+        return
+
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS properties_fts USING fts5(
+            name, station,
+            content='properties', content_rowid='id',
+            tokenize='trigram'
+        )
+    ''')
+    has_trigger = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'properties_fts_ai'").fetchone()
+    if has_trigger:
+        return
+
+    with conn:
+        conn.execute('''
+            CREATE TRIGGER properties_fts_ai AFTER INSERT ON properties BEGIN
+                INSERT INTO properties_fts (rowid, name, station) VALUES (new.id, new.name, new.station);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER properties_fts_ad AFTER DELETE ON properties BEGIN
+                INSERT INTO properties_fts (properties_fts, rowid, name, station)
+                VALUES ('delete', old.id, old.name, old.station);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER properties_fts_au AFTER UPDATE OF name, station ON properties BEGIN
+                INSERT INTO properties_fts (properties_fts, rowid, name, station)
+                VALUES ('delete', old.id, old.name, old.station);
+                INSERT INTO properties_fts (rowid, name, station) VALUES (new.id, new.name, new.station);
+            END
+        ''')
+        conn.execute("INSERT INTO properties_fts (properties_fts) VALUES ('rebuild')")
+
+
+def _fts_phrase(keyword: str):
+    # フレーズとして検索（" は "" にエスケープ）
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def _keyword_filter(keyword: str):
+    """キーワード検索の (FROM句, WHERE句, パラメータ, 並び替えに使うid列) を返す
+
+    3文字以上は全文検索索引（trigram）で駅名・物件名を探す。
+    2文字以下（「新宿」など）は trigram で引けないので、駅の一覧（stations）から
+    名前に含む駅を探し、その駅の物件を idx_properties_station_active で引く（物件名は探さない）。
+    """
+    # 掲載が終わった物件（removed_at あり）は含めない
+    if not keyword:
+        return "properties p", "p.removed_at IS NULL", [], "p.id"
+    if len(keyword) >= MIN_FTS_KEYWORD_LENGTH:
+        return ("properties_fts JOIN properties p ON p.id = properties_fts.rowid",
+                "properties_fts MATCH ? AND p.removed_at IS NULL", [_fts_phrase(keyword)], "properties_fts.rowid")
+    # 駅の一覧は数百行なので LIKE '%...%' で全件見ても速い
+    station = keyword.removesuffix("駅") or keyword
+    return ("properties p",
+            "p.station_id IN (SELECT station_id FROM stations WHERE name LIKE ?) AND p.removed_at IS NULL",
+            [f'%{station}%'], "p.id")
+
+
+def is_ranked(keyword: str, sort: str):
+    """関連度順（全文検索の bm25）で並べる検索か（それ以外の "rank" は登録順として扱う）"""
+    return sort == "rank" and len(keyword or "") >= MIN_FTS_KEYWORD_LENGTH
+
+
+def uses_keyset_paging(keyword: str = "", sort: str = "rank", descending: bool = False):
+    """id によるキーセットページング（after_id）で続きを取れる並び順か（登録順の昇順だけ）"""
+    return sort in ("id", "rank") and not is_ranked(keyword, sort) and not descending
+
+
+def _filter_clause(filters):
+    """絞り込み条件 filters を WHERE 句の条件とパラメータに変換する
+
+    filters の例: {"price_min": 100000, "price_max": 200000, "age_max": 10,
+                   "floor_min": 2, "area_min": 25, "walk_max": 10, "floor_plans": ["1LDK", "2LDK"],
+                   "station": "新宿"}
+    station は stations の駅名（末尾の「駅」はあってもよい）。どの路線の同じ名前の駅も含む。
+    None や空の値は条件なしとして扱う。
+    """
+    conditions = []
+    params = []
+    if not filters:
+        return conditions, params
+    for name, column in RANGE_COLUMNS.items():
+        low, high = filters.get(f"{name}_min"), filters.get(f"{name}_max")
+        if low is not None and high is not None:
+            conditions.append(f"{column} BETWEEN ? AND ?")
+            params.extend([low, high])
+        elif low is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(low)
+        elif high is not None:
+            conditions.append(f"{column} <= ?")
+            params.append(high)
+    floor_plans = filters.get("floor_plans")
+    if floor_plans:
+        conditions.append(f"p.floor_plan IN ({', '.join('?' * len(floor_plans))})")
+        params.extend(floor_plans)
+    station = filters.get("station")
+    if station:
+        conditions.append("p.station_id IN (SELECT station_id FROM stations WHERE name = ?)")
+        params.append(station.removesuffix("駅"))
+    return conditions, params
+
+
+def build_property_query(keyword: str = "", filters=None, sort: str = "rank", descending: bool = False,
+                         limit: int = None, offset: int = 0, after_id: int = None):
+    """キーワード・絞り込み・並び替え・件数指定から (SQL, パラメータ) を作る
+
+    返す列は (id, name, station, price, age, floor_plan)。
+    sort は SORT_COLUMNS のキー。"rank" は3文字以上のキーワードなら関連度順、それ以外は登録順。
+    after_id を指定すると id によるキーセットページング（uses_keyset_paging が真のときだけ使う）、
+    それ以外は LIMIT / OFFSET で区切る。
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"並び替えできない列です: {sort}")
+    if sort == "rank" and not is_ranked(keyword, sort):
+        sort = "id"
+    source, where, params, id_column = _keyword_filter(keyword)
+    conditions, filter_params = _filter_clause(filters)
+    conditions.insert(0, where)
+    params = params + filter_params
+    if after_id is not None:
+        conditions.append(f"{id_column} > ?")
+        params.append(after_id)
+
+    order_column = id_column if sort == "id" else SORT_COLUMNS[sort]
+    direction = "DESC" if descending else "ASC"
+    query = (f"SELECT p.id, {LIST_COLUMNS} FROM {source} "
+             f"WHERE {' AND '.join(conditions)} ORDER BY {order_column} {direction}")
+    if sort != "id":
+        # 同じ値の行の順番を固定して、ページの境目で行が重複・欠落しないようにする
+        query += f", p.id {direction}"
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+    return query, params
+
+
+def query_properties(conn, keyword: str = "", filters=None, sort: str = "rank", descending: bool = False,
+                     limit: int = PAGE_SIZE, offset: int = 0, after_id: int = None):
+    """build_property_query の条件で (id, name, station, price, age, floor_plan) のリストを返す"""
+    query, params = build_property_query(keyword, filters, sort, descending, limit, offset, after_id)
+    return conn.execute(query, params).fetchall()
+
+
+def explain_property_query(conn, keyword: str = "", filters=None, sort: str = "rank", descending: bool = False):
+    """条件に対する EXPLAIN QUERY PLAN の各行の説明を返す（索引が使われているかの確認用）
+
+    アプリと同じく、登録順の昇順はキーセットページング（after_id）、それ以外は LIMIT / OFFSET の問い合わせを調べる。
+    """
+    after_id = 0 if uses_keyset_paging(keyword, sort, descending) else None
+    query, params = build_property_query(keyword, filters, sort, descending, PAGE_SIZE, 0, after_id)
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+
+
+def explain_count_query(conn, keyword: str = "", filters=None):
+    """count_properties の問い合わせの EXPLAIN QUERY PLAN の各行の説明を返す"""
+    source, where, params, _ = _keyword_filter(keyword)
+    conditions, filter_params = _filter_clause(filters)
+    conditions.insert(0, where)
+    query = f"SELECT COUNT(*) FROM {source} WHERE {' AND '.join(conditions)}"
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params + filter_params)]
+
+
+# 絞り込み・並び替えのパターンごとに、使ってよい索引
+#   名前: (キーワード, 絞り込み, 並び替え, 降順, 索引)
+#   登録順のページは主キー（id）を順に読み、件数は絞り込みの索引で数える
+FILTER_SHAPES = {
+    "条件なし": ("", None, "id", False, ("INTEGER PRIMARY KEY",)),
+    "家賃の範囲": ("", {"price_min": 100000, "price_max": 150000}, "price", False, ("idx_properties_price",)),
+    "家賃の範囲（登録順）": ("", {"price_min": 100000, "price_max": 150000}, "id", False,
+                        ("INTEGER PRIMARY KEY", "idx_properties_price")),
+    "家賃の降順": ("", None, "price", True, ("idx_properties_price",)),
+    "間取り IN + 家賃の範囲": ("", {"floor_plans": ["1LDK", "2LDK"], "price_max": 120000}, "price", False,
+                           ("idx_properties_plan_price", "idx_properties_price")),
+    "築年数の上限": ("", {"age_max": 5}, "age", False, ("idx_properties_age_price",)),
+    "階数の下限": ("", {"floor_min": 10}, "floor", False, ("idx_properties_floor_number",)),
+    "面積の下限": ("", {"area_min": 60}, "area", False, ("idx_properties_area_price",)),
+    "駅徒歩の上限": ("", {"walk_max": 3}, "walk", False, ("idx_properties_walk_price",)),
+    "駅 + 家賃の範囲": ("", {"station": "新宿", "price_max": 120000}, "price", False,
+                    ("idx_properties_station_active", "idx_properties_price")),
+    "キーワード（全文検索）": ("新宿駅", None, "id", False, ("INTEGER PRIMARY KEY",)),
+    "キーワード（全文検索・関連度順）": ("新宿駅", None, "rank", False, ("INTEGER PRIMARY KEY",)),
+    "キーワード（2文字・駅名）": ("新宿", None, "rank", False, ("INTEGER PRIMARY KEY", "idx_properties_station_active")),
+}
+
+
+def find_filter_scans(conn):
+    """FILTER_SHAPES の問い合わせ（1ページ分と件数）のうち、決めた索引を使っていないものを返す
+
+    {名前: [問題のある行]} を返す。properties を索引なしで全件走査する行（"SCAN p"）と、
+    properties を決めた索引以外で読む行を問題とする。全文検索の仮想テーブルは索引として扱う。
+    """
+    problems = {}
+    for name, (keyword, filters, sort, descending, indexes) in FILTER_SHAPES.items():
+        details = explain_property_query(conn, keyword, filters, sort, descending)
+        if keyword or filters:
+            # 条件が無い件数は全件を数えるしかないので調べない
+            details += explain_count_query(conn, keyword, filters)
+        bad = [detail for detail in details
+               if detail == "SCAN p"
+               or (detail.startswith(("SCAN p ", "SEARCH p ")) and not any(index in detail for index in indexes))]
+        if bad:
+            problems[name] = bad
+    return problems
+
+
+def search_properties(conn, keyword: str = "", limit: int = None):
+    """駅名・物件名で検索して (name, station, price, age, floor_plan) のリストを返す
+
+    3文字以上なら全文検索索引から関連度順に返す。
+    2文字以下（「新宿」など）は trigram で引けないので、名前にその文字を含む駅の物件を返す。
+    """
+    source, where, params, _ = _keyword_filter(keyword)
+    query = f"SELECT {LIST_COLUMNS} FROM {source} WHERE {where}"
+    if not keyword:
+        limit = 100 if limit is None else limit
+    elif is_ranked(keyword, "rank"):
+        query += " ORDER BY properties_fts.rank"
+
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(query, params).fetchall()
+
+
+def search_page(conn, keyword: str = "", after_id: int = 0, limit: int = PAGE_SIZE, filters=None):
+    """検索結果を id 順に1ページ分返す（キーセットページング）
+
+    (id, name, station, price, age, floor_plan) のリストを返す。
+    次のページは最後の行の id を after_id に渡して取得する（OFFSETのように読み飛ばさない）。
+    """
+    return query_properties(conn, keyword, filters, "id", limit=limit, after_id=after_id)
+
+
+def count_properties(conn, keyword: str = "", filters=None):
+    """検索結果の件数だけを数える（行の中身は読まない）"""
+    source, where, params, _ = _keyword_filter(keyword)
+    conditions, filter_params = _filter_clause(filters)
+    conditions.insert(0, where)
+    return conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {' AND '.join(conditions)}",
+                        params + filter_params).fetchone()[0]
+
+
+def get_floor_plans(conn):
+    """データに存在する間取りの一覧"""
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT floor_plan FROM properties "
+        "WHERE floor_plan IS NOT NULL AND removed_at IS NULL ORDER BY floor_plan")]
+
+
+def get_station_names(conn):
+    """掲載中の物件がある駅名の一覧（駅の絞り込みの選択肢）"""
+    return [row[0] for row in conn.execute('''
+        SELECT DISTINCT s.name FROM stations s
+        WHERE EXISTS (SELECT 1 FROM properties p WHERE p.station_id = s.station_id AND p.removed_at IS NULL)
+        ORDER BY s.name
+    ''')]
+
+
+# 検証用DBに使う駅（路線, 駅名）と物件名
+BENCH_STATIONS = [
+    ("JR山手線", "新宿"), ("JR山手線", "渋谷"), ("JR山手線", "池袋"), ("JR中央線", "中野"),
+    ("JR中央線", "吉祥寺"), ("東京メトロ丸ノ内線", "新宿三丁目"), ("東京メトロ有楽町線", "麹町"),
+    ("東急東横線", "中目黒"), ("京王線", "笹塚"), ("小田急線", "下北沢"), ("西武新宿線", "高田馬場"),
+    ("都営大江戸線", "月島"),
+]
+BENCH_NAMES = ["パークハウス", "メゾン", "グランドコート", "ハイツ", "レジデンス", "コーポ", "シティタワー"]
+BENCH_FLOOR_PLANS = ["ワンルーム", "1K", "1DK", "1LDK", "2K", "2DK", "2LDK", "3LDK"]
+
+
+def make_synthetic_db(db_path: str = BENCH_DB_PATH, rows: int = 1_000_000):
+    """rows 件の架空の物件を入れた検証用のDBを作る
+
+    トリガーを作る前に行を入れてから、全文検索索引・絞り込み用の索引・集計をまとめて作る。
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    conn = sqlite3.connect(db_path)
+    tune_for_ingest(conn)
+    ensure_schema(conn)
+    with conn:
+        conn.executemany("INSERT INTO stations (line, name) VALUES (?, ?)", BENCH_STATIONS)
+        conn.execute('''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?1),
+            -- 乱数を1行に1回だけ計算する
+            r AS MATERIALIZED (
+                SELECT n, 1 + ABS(RANDOM()) % ?2 AS station_id, ABS(RANDOM()) % ?3 AS name_index,
+                       ABS(RANDOM()) % ?4 AS plan_index, 1 + ABS(RANDOM()) % 20 AS walk,
+                       1 + ABS(RANDOM()) % 15 AS floor, ABS(RANDOM()) % 50 AS age,
+                       50000 + (ABS(RANDOM()) % 300) * 1000 AS price
+                FROM seq
+            )
+            INSERT INTO properties (name, station, price, age, floor_plan, floor_num,
+                                    floor_number, floor_area, management_fee, walk_minutes, station_id,
+                                    listing_key, first_seen, last_seen)
+            SELECT json_extract(?5, '$[' || r.name_index || ']') || s.name || ' ' || r.n,
+                   s.name || '駅',
+                   r.price, r.age, json_extract(?6, '$[' || r.plan_index || ']'), r.floor || '階',
+                   r.floor, 15 + r.plan_index * 8, 5000, r.walk, s.station_id,
+                   'bench-' || r.n, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+            FROM r JOIN stations s ON s.station_id = r.station_id
+        ''', (rows, len(BENCH_STATIONS), len(BENCH_NAMES), len(BENCH_FLOOR_PLANS),
+              json.dumps(BENCH_NAMES), json.dumps(BENCH_FLOOR_PLANS)))
+    ensure_search_index(conn)
+    ensure_filter_indexes(conn)
+    ensure_aggregates(conn)
+    conn.execute("ANALYZE")
+    return conn
+
+
+def _timed(func, repeat: int = 5):
+    """func を repeat 回実行した1回あたりの時間 [ms]"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def benchmark_search(conn, keywords=("新宿駅", "新宿", "パークハウス", "中目黒駅", "該当なしの物件")):
+    """キーワード検索を、索引を使う検索（全文検索・駅の一覧）と以前の LIKE '%...%' で比べる [ms]
+
+    最初の1ページ（PAGE_SIZE 件）の取得（登録順・関連度順）と、件数を数える時間をそれぞれ測る。
+    """
+    like_where = "(p.station LIKE ? OR p.name LIKE ?) AND p.removed_at IS NULL"
+    results = {}
+    for keyword in keywords:
+        like_params = (f"%{keyword}%", f"%{keyword}%")
+        results[keyword] = {
+            "rows": count_properties(conn, keyword),
+            "page_index_ms": round(_timed(lambda: search_page(conn, keyword)), 2),
+            "page_rank_ms": round(_timed(lambda: query_properties(conn, keyword)), 2),
+            "page_like_ms": round(_timed(lambda: conn.execute(
+                f"SELECT p.id, {LIST_COLUMNS} FROM properties p WHERE {like_where} ORDER BY p.id LIMIT ?",
+                like_params + (PAGE_SIZE,)).fetchall()), 2),
+            "count_index_ms": round(_timed(lambda: count_properties(conn, keyword)), 2),
+            "count_like_ms": round(_timed(lambda: conn.execute(
+                f"SELECT COUNT(*) FROM properties p WHERE {like_where}", like_params).fetchone()), 2),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="suumo.db の検索の性能確認")
+    parser.add_argument("--bench", type=int, metavar="ROWS",
+                        help="ROWS 件の検証用DB（suumo_bench.db）でキーワード検索の LIKE と索引を使う検索を比べる")
+    parser.add_argument("--explain", action="store_true",
+                        help="絞り込みのパターンごとに決めた索引が使われているかを EXPLAIN QUERY PLAN で確かめる")
+    parser.add_argument("--db", default=BENCH_DB_PATH, help="--explain で調べるDB（--bench 指定時は作った検証用DB）")
+    args = parser.parse_args()
+
+    if not (args.bench or args.explain):
+        parser.print_help()
+        return
+    if args.bench:
+        conn = make_synthetic_db(BENCH_DB_PATH, args.bench)
+        print(f"{args.bench:,} 件")
+        for keyword, result in benchmark_search(conn).items():
+            print(f"{keyword!r:<14} {result['rows']:>8,} 件: 1ページ 索引 {result['page_index_ms']:>8} ms / "
+                  f"関連度順 {result['page_rank_ms']:>8} ms / LIKE {result['page_like_ms']:>8} ms, "
+                  f"件数 索引 {result['count_index_ms']:>8} ms / LIKE {result['count_like_ms']:>8} ms")
+    else:
+        conn = get_connection(args.db)
+    if args.explain:
+        problems = find_filter_scans(conn)
+        for name, details in problems.items():
+            print(f"{name}: {details}")
+        assert not problems, "決めた索引を使っていない絞り込みがあります"
+        print(f"EXPLAIN QUERY PLAN: {len(FILTER_SHAPES)} パターンとも索引を使用")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""SUUMOの一覧ページのHTMLから物件データを取り出す処理（解析方法を切り替えられる）
+
+- soup:     BeautifulSoup でページ全体を解析する（元の実装。出力の基準）
+- strainer: SoupStrainer で cassetteitem の部分だけ木を作る
+- lxml:     lxml（C実装）で解析し、XPath で取り出す（lxml が無ければ使えない）
+
+どの方法でも出力は soup と同じ
+(name, station, price, age, floor_plan, floor_num, management_fee, floor_area, access) のリスト。
+管理費・専有面積・交通はページの文字列のまま（数値への変換は suumo_db.staging_row で行う）。
+
+使い方（保存したページで速度・メモリを比べる）:
+    python suumo_extract.py pages/        # pages/ 内の *.html を全方法で解析して比較する
+"""
+
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 行ごとに使う正規表現はあらかじめコンパイルしておく
+AGE_PATTERN = re.compile(r'\d+')
+FLOOR_PLAN_PATTERN = re.compile(r'^(ワンルーム|\d[SLDKR]+)')
+# 一覧の件数（<div class="paginate_set-hit">1,234<span>件</span></div>）とページ送り
+HIT_COUNT_PATTERN = re.compile(r'class="paginate_set-hit"[^>]*>\s*([\d,]+)')
+PAGINATION_PATTERN = re.compile(r'class="pagination-parts"[^>]*>(.*?)</ol>', re.S)
+PAGE_NUMBER_PATTERN = re.compile(r'>\s*(\d+)\s*<')
+# 交通の最初の駅（"東京メトロ有楽町線/麹町駅 歩4分" → "麹町駅"）
+STATION_PATTERN = re.compile(r'/(\S+)')
+
+
+def station_from_access(access: str):
+    """交通の文字列から最寄駅の名前を返す（読み取れなければ "不明"）"""
+    match = STATION_PATTERN.search(access)
+    return match.group(1) if match else "不明"
+
+
+def extract_soup(html: str):
+    """BeautifulSoup でページ全体を解析する（元の実装）"""
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.find_all("div", class_="cassetteitem")
+
+    data_list = []
+    for item in items:
+        try:
+            # --- 建物情報の取得 ---
+            title_elem = item.find("div", class_="cassetteitem_content-title")
+            name = title_elem.text.strip() if title_elem else "不明"
+
+            # 交通（最初に書かれている駅。例: "東京メトロ有楽町線/麹町駅 歩4分"）
+            access_elem = item.find("li", class_="cassetteitem_detail-col2")
+            access_text = access_elem.find("div", class_="cassetteitem_detail-text") if access_elem else None
+            access = access_text.text.strip() if access_text else ""
+            # 最寄駅は交通の最初の駅（cassetteitem_detail-col1 は住所で、駅の要素は無い）
+            station = station_from_access(access)
+
+            age_elem = item.find("li", class_="cassetteitem_detail-col3")
+            age = 99
+            if age_elem:
+                age_text = age_elem.find_all("div")[0].text.strip()
+                if "新築" in age_text:
+                    age = 0
+                else:
+                    age_match = re.search(r'\d+', age_text)
+                    age = int(age_match.group()) if age_match else 99
+
+            # --- 部屋情報の取得 ---
+            tbody = item.find("table", class_="cassetteitem_other")
+            if tbody:
+                for tr in tbody.find("tbody").find_all("tr"):
+                    try:
+                        tds = tr.find_all("td")
+                        if len(tds) < 6:
+                            continue
+
+                        # 1. 階数 (列番号 2)
+                        floor_num = tds[2].text.strip()
+
+                        # 2. 家賃 (列番号 3)
+                        price_li = tds[3].find("li")
+                        if price_li:
+                            price_text = price_li.text.strip()
+                            price = int(float(price_text.replace("万円", "")) * 10000)
+                        else:
+                            continue
+
+                        # 管理費 (列番号 3 の2つ目)
+                        price_lis = tds[3].find_all("li")
+                        management_fee = price_lis[1].text.strip() if len(price_lis) > 1 else ""
+
+                        # 3. 間取り (列番号 5)
+                        # "3SLDK81.68m2" のようになっているので分離する
+                        raw_floor_plan = tds[5].text.strip()
+
+                        match = re.search(r'^(ワンルーム|\d[SLDKR]+)', raw_floor_plan)
+                        if match:
+                            floor_plan = match.group(1)
+                        else:
+                            floor_plan = raw_floor_plan # うまく取れなければそのまま保存
+
+                        # 専有面積 (列番号 5 の2つ目)
+                        plan_lis = tds[5].find_all("li")
+                        floor_area = plan_lis[1].text.strip() if len(plan_lis) > 1 else ""
+
+                        data_list.append((name, station, price, age, floor_plan, floor_num,
+                                          management_fee, floor_area, access))
+                    except Exception:
+                        continue
+
+        except Exception:
+            continue
+
+    return data_list
+
+
+def _build_rows(name, access, age_text, rooms):
+    """取り出した文字列から行を作る（soup と同じ変換。最寄駅は交通から取り出す）
+
+    age_text は築年数の文字列（要素が無ければ None）、
+    rooms は (階数, 家賃の文字列 or None, 管理費, 間取りの文字列, 専有面積) のリスト。
+    """
+    station = station_from_access(access)
+    age = 99
+    if age_text is not None:
+        if "新築" in age_text:
+            age = 0
+        else:
+            age_match = AGE_PATTERN.search(age_text)
+            age = int(age_match.group()) if age_match else 99
+
+    rows = []
+    for floor_num, price_text, management_fee, raw_floor_plan, floor_area in rooms:
+        if price_text is None:
+            continue
+        try:
+            price = int(float(price_text.replace("万円", "")) * 10000)
+        except ValueError:
+            continue
+        match = FLOOR_PLAN_PATTERN.search(raw_floor_plan)
+        floor_plan = match.group(1) if match else raw_floor_plan
+        rows.append((name, station, price, age, floor_plan, floor_num,
+                     management_fee, floor_area, access))
+    return rows
+
+
+# cassetteitem の div だけを木にする（それ以外のタグは読み飛ばす）
+CASSETTE_STRAINER = SoupStrainer("div", class_="cassetteitem")
+
+
+def extract_strainer(html: str):
+    """SoupStrainer で物件部分だけを解析する"""
+    soup = BeautifulSoup(html, 'html.parser', parse_only=CASSETTE_STRAINER)
+
+    data_list = []
+    for item in soup.find_all("div", class_="cassetteitem"):
+        try:
+            title_elem = item.find("div", class_="cassetteitem_content-title")
+            access_elem = item.find("li", class_="cassetteitem_detail-col2")
+            access_text = access_elem.find("div", class_="cassetteitem_detail-text") if access_elem else None
+            age_elem = item.find("li", class_="cassetteitem_detail-col3")
+            age_text = age_elem.find_all("div")[0].text.strip() if age_elem else None
+
+            rooms = []
+            table = item.find("table", class_="cassetteitem_other")
+            if table:
+                for tr in table.find("tbody").find_all("tr"):
+                    tds = tr.find_all("td")
+                    if len(tds) < 6:
+                        continue
+                    price_lis = tds[3].find_all("li")
+                    plan_lis = tds[5].find_all("li")
+                    rooms.append((tds[2].text.strip(),
+                                  price_lis[0].text.strip() if price_lis else None,
+                                  price_lis[1].text.strip() if len(price_lis) > 1 else "",
+                                  tds[5].text.strip(),
+                                  plan_lis[1].text.strip() if len(plan_lis) > 1 else ""))
+        except Exception:
+            continue
+
+        data_list.extend(_build_rows(
+            title_elem.text.strip() if title_elem else "不明",
+            access_text.text.strip() if access_text else "",
+            age_text, rooms))
+    return data_list
+
+
+def _has_class(tag: str, class_name: str):
+    """class 属性に class_name を含む tag を探す XPath（子孫から）"""
+    return f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+
+if lxml_html is not None:
+    FIND_ITEMS = etree.XPath(_has_class("div", "cassetteitem"))
+    FIND_TITLE = etree.XPath(_has_class("div", "cassetteitem_content-title"))
+    FIND_ACCESS = etree.XPath(_has_class("li", "cassetteitem_detail-col2"))
+    FIND_ACCESS_TEXT = etree.XPath(_has_class("div", "cassetteitem_detail-text"))
+    FIND_AGE = etree.XPath(_has_class("li", "cassetteitem_detail-col3"))
+    FIND_TABLE = etree.XPath(_has_class("table", "cassetteitem_other"))
+    FIND_TBODY = etree.XPath(".//tbody")
+    FIND_TR = etree.XPath(".//tr")
+    FIND_TD = etree.XPath(".//td")
+    FIND_DIV = etree.XPath(".//div")
+    FIND_LI = etree.XPath(".//li")
+
+
+def _first_text(elements, default=None):
+    """最初の要素の文字列（soup の find(...).text.strip() に相当）"""
+    return elements[0].text_content().strip() if elements else default
+
+
+def extract_lxml(html: str):
+    """lxml で解析し、コンパイル済みの XPath で取り出す"""
+    if lxml_html is None:
+        raise RuntimeError("lxml がインストールされていません（pip install lxml）")
+    if not html.strip():
+        return []
+    root = lxml_html.fromstring(html).getroottree()
+
+    data_list = []
+    for item in FIND_ITEMS(root):
+        try:
+            access_elems = FIND_ACCESS(item)
+            access_text = _first_text(FIND_ACCESS_TEXT(access_elems[0]), "") if access_elems else ""
+            age_elems = FIND_AGE(item)
+            age_text = FIND_DIV(age_elems[0])[0].text_content().strip() if age_elems else None
+
+            rooms = []
+            tables = FIND_TABLE(item)
+            if tables:
+                for tr in FIND_TR(FIND_TBODY(tables[0])[0]):
+                    tds = FIND_TD(tr)
+                    if len(tds) < 6:
+                        continue
+                    price_lis = FIND_LI(tds[3])
+                    plan_lis = FIND_LI(tds[5])
+                    rooms.append((tds[2].text_content().strip(),
+                                  _first_text(price_lis),
+                                  _first_text(price_lis[1:], ""),
+                                  tds[5].text_content().strip(),
+                                  _first_text(plan_lis[1:], "")))
+        except Exception:
+            continue
+
+        data_list.extend(_build_rows(
+            _first_text(FIND_TITLE(item), "不明"),
+            access_text, age_text, rooms))
+    return data_list
+
+
+EXTRACTORS = {
+    "soup": extract_soup,
+    "strainer": extract_strainer,
+    "lxml": extract_lxml,
+}
+DEFAULT_EXTRACTOR = "lxml" if lxml_html is not None else "strainer"
+
+
+def available_extractors():
+    """この環境で使える解析方法の名前"""
+    return [name for name in EXTRACTORS if name != "lxml" or lxml_html is not None]
+
+
+def extract(html: str, backend: str = None):
+    """一覧ページのHTMLから物件のリストを返す（backend を省略すると速い方法を使う）"""
+    return EXTRACTORS[backend or DEFAULT_EXTRACTOR](html)
+
+
+def extract_listing_info(html: str):
+    """一覧の1ページ目から検索結果の件数と最終ページの番号を読み取り (total, last_page) を返す
+
+    読み取れなかった値は None（ブロックされたページ・レイアウトの変更など）。
+    件数が読めてページ送りが無いときは1ページだけの一覧とみなす。
+    """
+    match = HIT_COUNT_PATTERN.search(html)
+    total = int(match.group(1).replace(",", "")) if match else None
+    match = PAGINATION_PATTERN.search(html)
+    pages = [int(number) for number in PAGE_NUMBER_PATTERN.findall(match.group(1))] if match else []
+    if pages:
+        last_page = max(pages)
+    elif total is not None:
+        last_page = 1 if total else 0
+    else:
+        last_page = None
+    return total, last_page
+
+
+def load_pages(directory: str):
+    """directory 内の保存済みページ（*.html）を読み込む"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # Linuxでは KB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_backend(backend: str, pages, repeat: int):
+    # 計測ごとに新しいプロセスで実行し、他の方法のメモリ使用量が混ざらないようにする
+    rss_before = _max_rss_mb()
+    started = time.perf_counter()
+    rows = 0
+    for _ in range(repeat):
+        for html in pages:
+            rows += len(extract(html, backend))
+    seconds = time.perf_counter() - started
+    rss_after = _max_rss_mb()
+    return {
+        "backend": backend,
+        "pages_per_sec": round(len(pages) * repeat / seconds, 1) if seconds else None,
+        "rows": rows // repeat,
+        "peak_rss_mb": None if rss_after is None else round(rss_after - rss_before, 1),
+    }
+
+
+def verify(pages, backends=None):
+    """各方法の出力が soup と同じか確かめ、違ったページの番号を方法ごとに返す"""
+    expected = [extract_soup(html) for html in pages]
+    mismatches = {}
+    for backend in backends or available_extractors():
+        mismatches[backend] = [index for index, html in enumerate(pages)
+                               if extract(html, backend) != expected[index]]
+    return mismatches
+
+
+def benchmark(pages, backends=None, repeat: int = 3):
+    """各方法で pages を解析し、1秒あたりのページ数と最大メモリ増加量を返す"""
+    results = []
+    for backend in backends or available_extractors():
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(_run_backend, backend, pages, repeat).result())
+    return results
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else "pages"
+    pages = load_pages(directory)
+    if not pages:
+        sys.exit(f"{directory} に *.html がありません")
+
+    for backend, indexes in verify(pages).items():
+        if indexes:
+            print(f"{backend}: {len(indexes)} ページで soup と出力が異なります: {indexes[:10]}")
+    print(f"{len(pages)} ページ")
+    for result in benchmark(pages):
+        print(f"{result['backend']:>8}: {result['pages_per_sec']} ページ/秒, "
+              f"{result['rows']} 件, 最大メモリ増加 {result['peak_rss_mb']} MB")
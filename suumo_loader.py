@@ -0,0 +1,210 @@
+"""分析用に suumo.db の物件を pandas の DataFrame に読み込む
+
+- 列: グラフに必要な列だけを SELECT する（CHART_COLUMNS）
+- 分割: chunksize 行ずつ読んで、その都度小さい型に変換する（object 型の全件を一度に持たない）
+- 型: 間取り・駅はカテゴリ型（間取りは狭い順）、家賃は int32、築年数は int16
+- 階数: floor_number 列の無い古い suumo.db では floor_num を str.extract でまとめて変換する
+
+使い方（以前の SELECT * の読み込みと時間・メモリを比べる）:
+    python suumo_loader.py --scale 1000   # suumo.db を1000倍に増やした suumo_scaled.db で比べる
+
+計測例（suumo.db の89件を複製、読み込み方ごとに別プロセス、最大RSSは読み込み前からの増加分）:
+    行数        読み込み方    時間      最大RSS     DataFrame
+    89,000     SELECT *     0.56 秒   +105 MB     63.5 MB
+    89,000     loader       0.18 秒    +13 MB      0.8 MB
+    890,000    SELECT *     7.6 秒   +1036 MB    636 MB
+    890,000    loader       2.5 秒     +27 MB      8.5 MB
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import suumo_db
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CHUNK_SIZE = 20000
+SCALED_DB_PATH = "suumo_scaled.db"
+
+# 数値の列の型（NULL があり得る列は pandas の nullable 整数型）
+DTYPES = {
+    "price": "int32",
+    "age": "int16",
+    "floor_number": "Int16",
+    "floor_area": "float32",
+    "management_fee": "Int32",
+    "walk_minutes": "Int16",
+}
+CATEGORY_COLUMNS = ("floor_plan", "station")
+
+# グラフごとに必要な列
+CHART_COLUMNS = {
+    "plan_price": ["floor_plan", "price"],           # 間取りごとの家賃分布
+    "age_price": ["age", "price", "floor_plan"],     # 築年数と家賃
+    "floor_price": ["floor_number", "price"],        # 階数と家賃
+}
+
+FLOOR_PATTERN = r'(?P<basement>B?)(?P<number>\d+)'
+
+
+def parse_floor_numbers(floor_num: pd.Series):
+    """"3階" / "B1階" の Series を階数（Int16、読めなければ <NA>）に変換する
+
+    行ごとに関数を呼ぶ apply ではなく、str.extract で全行をまとめて処理する。
+    """
+    parts = floor_num.str.extract(FLOOR_PATTERN)
+    numbers = pd.to_numeric(parts["number"], errors="coerce").astype("Int16")
+    return numbers.where(parts["basement"] != "B", -numbers)
+
+
+def _category_dtype(conn, column: str):
+    # 全チャンクで同じカテゴリにしておくと、つなげてもカテゴリ型のまま
+    values = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT {column} FROM properties WHERE {column} IS NOT NULL")]
+    if column == "floor_plan":
+        return pd.CategoricalDtype(sorted(values, key=suumo_db.floor_plan_order), ordered=True)
+    return pd.CategoricalDtype(sorted(values))
+
+
+def load_properties(conn, columns, chunksize: int = CHUNK_SIZE, include_removed: bool = False):
+    """properties から columns の列だけを chunksize 行ずつ読み、小さい型にした DataFrame を返す"""
+    table_columns = {row[1] for row in conn.execute("PRAGMA table_info(properties)")}
+    select_columns = ["floor_num" if column == "floor_number" and column not in table_columns else column
+                      for column in columns]
+    conditions = ["price IS NOT NULL"]
+    if not include_removed and "removed_at" in table_columns:
+        conditions.append("removed_at IS NULL")
+    query = f"SELECT {', '.join(select_columns)} FROM properties WHERE {' AND '.join(conditions)}"
+
+    dtypes = {column: _category_dtype(conn, column) for column in columns if column in CATEGORY_COLUMNS}
+    dtypes.update({column: dtype for column, dtype in DTYPES.items() if column in columns})
+
+    chunks = []
+    for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+        if "floor_num" in chunk.columns and "floor_num" not in columns:
+            chunk["floor_number"] = parse_floor_numbers(chunk.pop("floor_num"))
+        chunks.append(chunk.astype(dtypes))
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=dtypes.get(column, "object")) for column in columns})
+    return pd.concat(chunks, ignore_index=True)[columns]
+
+
+def load_chart(conn, chart: str, chunksize: int = CHUNK_SIZE):
+    """グラフ chart（CHART_COLUMNS のキー）に必要な列だけを読み込む"""
+    return load_properties(conn, CHART_COLUMNS[chart], chunksize)
+
+
+def load_select_all(conn):
+    """以前のノートブックと同じ読み方（全列を既定の型で読み、階数を行ごとの apply で変換）"""
+    df = pd.read_sql("SELECT * FROM properties WHERE removed_at IS NULL", conn)
+
+    def extract_floor(text):
+        if not text: return None
+        match = re.search(r'(\d+)', str(text))
+        if match:
+            return int(match.group(1))
+        return None
+
+    df['floor_number'] = df['floor_num'].apply(extract_floor)
+    return df
+
+
+def load_chart_columns(conn):
+    """グラフに使う列（間取り・家賃・築年数・階数）だけを分割して読み込む（比較用）"""
+    return load_properties(conn, ["floor_plan", "price", "age", "floor_number"])
+
+
+LOADERS = {
+    "select_all": load_select_all,
+    "loader": load_chart_columns,
+}
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # Linuxでは KB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(name: str, db_path: str):
+    """LOADERS[name] で db_path を読み込み、時間・メモリ・できた DataFrame の大きさを測る
+
+    peak_rss_mb は読み込みで増えたプロセスの最大メモリ（RSS）。
+    """
+    conn = sqlite3.connect(db_path)
+    rss_before = _max_rss_mb()
+    started = time.perf_counter()
+    df = LOADERS[name](conn)
+    seconds = time.perf_counter() - started
+    rss_after = _max_rss_mb()
+    conn.close()
+    return {
+        "rows": len(df),
+        "seconds": round(seconds, 3),
+        "peak_rss_mb": None if rss_after is None else round(rss_after - rss_before, 1),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 1024 / 1024, 1),
+    }
+
+
+def compare_loaders(db_path: str = suumo_db.DB_PATH):
+    """SELECT * の読み込みと、グラフに必要な列だけの分割読み込みを比べる
+
+    最大RSSはプロセスの中で減らないので、読み込み方ごとに新しいプロセスで測る。
+    """
+    results = {}
+    for name in LOADERS:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results[name] = pool.submit(measure, name, db_path).result()
+    return results
+
+
+def make_scaled_db(src_path: str = suumo_db.DB_PATH, dest_path: str = SCALED_DB_PATH, factor: int = 1000):
+    """src_path の掲載中の物件を factor 回複製した検証用のDBを作る
+
+    src_path はコピーしてから使う（古い suumo.db でも、元のファイルには列を追加しない）。
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(dest_path + suffix):
+            os.remove(dest_path + suffix)
+    shutil.copyfile(src_path, dest_path)
+    conn = suumo_db.get_connection(dest_path)  # 古い suumo.db なら列を追加する
+    columns = f"{suumo_db.PROPERTY_COLUMNS}, {suumo_db.TYPED_COLUMNS}"
+    with conn:
+        conn.execute("DELETE FROM properties WHERE removed_at IS NOT NULL")
+        # コピーした行を1件目として、2件目以降を足す
+        conn.execute(f'''
+            WITH RECURSIVE copies(n) AS (SELECT 2 UNION ALL SELECT n + 1 FROM copies WHERE n < ?)
+            INSERT INTO properties ({columns}, listing_key, first_seen, last_seen)
+            SELECT {columns}, listing_key || '-' || n, first_seen, last_seen
+            FROM properties, copies
+        ''', (factor,))
+        suumo_db.refresh_plan_stats(conn)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="suumo.db の読み込み方法を比べる")
+    parser.add_argument("--db", default=suumo_db.DB_PATH, help="元にするDB")
+    parser.add_argument("--scale", type=int, default=1000, help="物件を何倍に増やして比べるか")
+    args = parser.parse_args()
+
+    make_scaled_db(args.db, SCALED_DB_PATH, args.scale)
+    for name, result in compare_loaders(SCALED_DB_PATH).items():
+        print(f"{name:>10}: {result['rows']:,} 行, {result['seconds']} 秒, "
+              f"最大RSS +{result['peak_rss_mb']} MB, "
+              f"DataFrame {result['frame_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""SUUMOの賃貸物件一覧をスクレイピングして suumo.db に差分で取り込む
+
+取得したページは作業用テーブル（properties_staging）に書き、最後に1トランザクションで
+properties に反映する。取り込み中もアプリは前回のデータをそのまま検索できる。
+
+使い方:
+    python suumo_scraper.py
+"""
+
+import re
+import time
+from functools import partial
+
+import page_crawler
+import suumo_db
+import suumo_extract
+from ingest_pipeline import normalize
+from page_crawler import ConcurrentCrawler, PageFetcher, pages_to_fetch
+
+# 東京４区（千代田・中央・港・新宿）
+BASE_URL = "https://suumo.jp/jj/chintai/ichiran/FR301FC001/?ar=030&bs=040&ta=13&sc=13101&sc=13102&sc=13103&sc=13104&cb=0.0&ct=9999999&et=9999999&cn=9999999&mb=0&mt=9999999&shkr1=03&shkr2=03&shkr3=03&shkr4=03&fw2=&srch_navi=1"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+# 東京23区（千代田区 13101 〜 江戸川区 13123）
+TOKYO_23_WARDS_URL = re.sub(r"(&sc=\d+)+", "".join(f"&sc={code}" for code in range(13101, 13124)), BASE_URL)
+
+MAX_PAGES = 1000                # 1ページ目のページ送りの最終ページか、0件のページが出たらそこで終わる
+REQUESTS_PER_SECOND = 0.5       # サーバーへの負荷を抑える（平均2秒に1リクエスト）
+PARSE_WORKERS = 2               # 解析用のプロセス数（取得は2秒に1ページなので少なくて足りる）
+# 取得した件数が1ページ目の件数のこの割合以上なら全件そろったとみなす（取得中の掲載の増減の分）
+COMPLETE_RATIO = 0.95
+
+
+def parse_page(html: str, backend: str = None):
+    """一覧ページのHTMLから物件（部屋）ごとの行のリストを返す
+
+    行は (name, station, price, age, floor_plan, floor_num, management_fee, floor_area, access)。
+    解析方法（soup / strainer / lxml）は suumo_extract を参照。省略すると速い方法を使う。
+    """
+    return suumo_extract.extract(html, backend)
+
+
+class CrawlScheduler:
+    """一覧ページの取得（スレッド）と解析（プロセス）を分けて並行に進めるクローラ
+
+    - 取得: 同時実行数 max_in_flight、頻度はトークンバケット（rate 件/秒）で制限し、
+      429/5xx と通信エラーは指数バックオフで再試行する（page_crawler）
+    - 解析: HTMLの解析は parse_workers 個のプロセスで行う（0ならその場で解析）。
+      解析方法は extractor で選ぶ（suumo_extract）
+    - 書き込み: 解析した行はバッチで作業用テーブルに書き、同じトランザクションで
+      crawl_progress に取得済みページを記録する（中断しても続きのページから再開できる）
+    全ページを取得できたときだけ properties に反映する。
+
+    掲載終了（removed_at）を付けるのは、1ページ目の件数とページ送りから分かる最終ページまで
+    すべて物件のあるページを取得でき、件数もほぼそろったときだけ。0件のページだけでは
+    一覧の終わりとみなさない（ブロック・キャプチャのページやレイアウトの変更でも0件になるため）。
+    """
+
+    def __init__(self, db_path: str = suumo_db.DB_PATH, base_url: str = BASE_URL,
+                 max_pages: int = MAX_PAGES, rate: float = REQUESTS_PER_SECOND, burst: int = 2,
+                 max_in_flight: int = 4, parse_workers: int = PARSE_WORKERS, retries: int = 3,
+                 backoff: float = 2.0, timeout: float = 10, extractor: str = None,
+                 save_dir: str = None):
+        self.db_path = db_path
+        self.base_url = base_url
+        self.max_pages = max_pages
+        # 指定すると取得したHTMLを page_<番号>.html として保存する（ベンチマーク・検証用）
+        self.fetcher = PageFetcher(base_url + "&page={page}", headers=HEADERS, rate=rate, burst=burst,
+                                   retries=retries, backoff=backoff, timeout=timeout, save_dir=save_dir)
+        self.crawler = ConcurrentCrawler(self._fetch, partial(parse_page, backend=extractor),
+                                         max_in_flight=max_in_flight, parse_workers=parse_workers)
+        # 件数を読むために先に取得した1ページ目（クロールではこれを使い、もう一度は取得しない）
+        self._first_page = None
+
+    def _fetch(self, page: int):
+        if page == 1 and self._first_page is not None:
+            html, self._first_page = self._first_page, None
+            return html
+        return self.fetcher.fetch(page)
+
+    def read_listing(self, conn, progress):
+        """検索結果の件数と最終ページ (total, last_page) を返す（読めなかった値は None）
+
+        前回の続きなら記録した値を使い、無ければ1ページ目を取得して読み取る。
+        """
+        listing = suumo_db.load_crawl_listing(conn, self.base_url)
+        if listing is not None:
+            return listing
+        html = self.fetcher.fetch(1)
+        total, last_page = suumo_extract.extract_listing_info(html)
+        if last_page is None:
+            print("1ページ目から件数・ページ数を読み取れませんでした（掲載終了は付けません）")
+        suumo_db.record_crawl_listing(conn, self.base_url, total, last_page)
+        if 1 not in progress:
+            self._first_page = html
+        return total, last_page
+
+    def iter_pages(self, progress=None, max_pages: int = None):
+        """取得・解析が終わったページから順に (page, rows) を返すジェネレーター
+
+        progress（取得済みページ {page: row_count}）にあるページは取得しない。
+        """
+        pages, last_page = pages_to_fetch(progress or {}, max_pages or self.max_pages)
+        for page, rows in self.crawler.iter_pages(pages, last_page):
+            print(f"Page {page}: {len(rows)} 件")
+            yield page, rows
+
+    def run(self):
+        """クロールを実行し、反映結果（未完了なら取得状況）を辞書で返す"""
+        conn = suumo_db.get_connection(self.db_path)
+        progress = suumo_db.load_crawl_progress(conn, self.base_url)
+        if not progress:
+            # この URL の前回の取り込みの残りは捨てて最初から
+            suumo_db.clear_staging(conn, self.base_url)
+
+        started = time.perf_counter()
+        try:
+            total, listed_pages = self.read_listing(conn, progress)
+        except Exception as e:
+            print(f"Page 1: 取得に失敗しました（{e}）")
+            self.fetcher.close()
+            conn.close()
+            return {"pages": None, "failed": [1], "batches": 0,
+                    "seconds": round(time.perf_counter() - started, 2)}
+        max_pages = self.max_pages if listed_pages is None else min(self.max_pages, listed_pages)
+
+        # 取得 → 解析 → listing_key の付与 → 作業用テーブルへのバッチ書き込み
+        pages = normalize(self.iter_pages(progress, max_pages),
+                          partial(suumo_db.staging_row, base_url=self.base_url))
+        with suumo_db.staging_writer(conn, self.base_url) as writer:
+            written = writer.write_pages(pages)
+        self.fetcher.close()
+
+        progress = suumo_db.load_crawl_progress(conn, self.base_url)
+        failed = set(self.crawler.failed)
+        if listed_pages is not None:
+            # 最終ページより前の0件のページはブロック・キャプチャなどとみなし、失敗として取り直す
+            empty = [page for page, count in progress.items() if count == 0 and page <= listed_pages]
+            suumo_db.forget_crawl_pages(conn, self.base_url, empty)
+            failed.update(empty)
+        failed = sorted(failed)
+        stats = {"pages": self.crawler.last_page, "failed": failed,
+                 "batches": written["batches"], "seconds": round(time.perf_counter() - started, 2)}
+        if failed:
+            # 作業用テーブルと進捗を残しておき、次回は失敗したページだけ取得する
+            conn.close()
+            return stats
+
+        # 1ページ目から分かる最終ページまで全ページあり、件数もそろっていれば全件そろっている
+        complete = (listed_pages is not None
+                    and all(progress.get(page, 0) > 0 for page in range(1, listed_pages + 1))
+                    and (total is None or sum(progress.values()) >= total * COMPLETE_RATIO))
+        result = suumo_db.merge_staging(conn, self.base_url, complete=complete)
+        suumo_db.clear_crawl_progress(conn, self.base_url)
+        conn.close()
+        result.update(stats, complete=complete)
+        return result
+
+
+def start_fixture_server(directory: str, port: int = 0):
+    """保存したHTML（directory/page_<番号>.html）を返すローカルサーバーを起動する（オフライン検証用）
+
+    ファイルの無いページには物件が0件のページを返す。
+    返り値の base_url を CrawlScheduler(base_url=...) に渡して使う。
+    """
+    server, root_url = page_crawler.start_fixture_server(directory, port)
+    return server, f"{root_url}/list?fixture=1"
+
+
+def get_data(db_path: str = suumo_db.DB_PATH, base_url: str = BASE_URL, max_pages: int = MAX_PAGES):
+    """一覧を全ページ取得し、properties へ差分を反映する"""
+    return CrawlScheduler(db_path, base_url, max_pages).run()
+
+
+if __name__ == "__main__":
+    result = get_data()
+    if result.get("failed"):
+        print(f"未完了: 失敗したページ {result['failed']}（もう一度実行すると続きから再開します）")
+    else:
+        print(f"完了！ 追加 {result['inserted']} 件 / 更新 {result['seen']} 件 / 掲載終了 {result['removed']} 件")
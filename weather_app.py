@@ -1,5 +1,7 @@
 import flet as ft
-import requests
+
+from area_tasks import SUPERSEDED, AreaTaskRunner
+from jma_cache import HttpCache
 
 # 定数：気象庁API
 AREA_URL = "https://www.jma.go.jp/bosai/common/const/area.json"
@@ -11,6 +13,11 @@ def main(page: ft.Page):
     page.vertical_alignment = ft.MainAxisAlignment.CENTER
     page.padding = 0
 
+    # 条件付きGETのディスクキャッシュ（DB版アプリと共有）
+    http_cache = HttpCache()
+    # API取得をハンドラの外（スレッド）で実行する
+    task_runner = AreaTaskRunner()
+
     bg_container = ft.Container(
         bgcolor="#e3f2fd",
         expand=True,
@@ -26,9 +33,7 @@ def main(page: ft.Page):
     def get_area_options():
         """地域リストを取得し、Dropdownの選択肢(Option)のリストとして返す"""
         try:
-            response = requests.get(AREA_URL)
-            response.raise_for_status()
-            data = response.json()
+            data = http_cache.get_json(AREA_URL)
             offices = data['offices']
             
             options = []
@@ -42,9 +47,7 @@ def main(page: ft.Page):
         """指定された地域コードの天気を取得して辞書で返す"""
         url = FORECAST_URL_TEMPLATE.format(area_code)
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            data = http_cache.get_json(url)
             
             # データ構造から直近の天気を抽出
             time_series = data[0]['timeSeries'][0]
@@ -84,7 +87,7 @@ def main(page: ft.Page):
                 "icon_color": "#f44336"
             }
 
-    def on_click_get_weather(e):
+    async def on_click_get_weather(e):
         # 地域が選択されていない場合
         if not region_dropdown.value:
             result_text.value = "地域を選択してください！"
@@ -99,9 +102,11 @@ def main(page: ft.Page):
         result_icon.color = "#2196f3"
         page.update()
 
-        # 天気取得
+        # 天気取得。待っている間も画面は操作できる
         area_code = region_dropdown.value
-        weather_data = get_weather_forecast(area_code)
+        weather_data = await task_runner.run(area_code, "API", get_weather_forecast)
+        if weather_data is SUPERSEDED:
+            return
         
         # 結果表示
         result_text.value = f"【{weather_data['area_name']}】の天気\n{weather_data['weather']}"
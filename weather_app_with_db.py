@@ -1,137 +1,12 @@
 import flet as ft
-import requests
-import sqlite3
 from datetime import datetime
 from pathlib import Path
 
-# 定数：気象庁API
-AREA_URL = "https://www.jma.go.jp/bosai/common/const/area.json"
-FORECAST_URL_TEMPLATE = "https://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
-DB_PATH = "weather_data.db"
-
-
-class WeatherDatabase:
-    """SQLiteを使用した天気データベースの管理"""
-    
-    def __init__(self, db_path: str = DB_PATH):
-        self.db_path = db_path
-        self.init_database()
-    
-    def init_database(self):
-        """データベーススキーマを初期化"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # テーブル1: 地域情報
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS areas (
-                area_code TEXT PRIMARY KEY,
-                area_name TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # テーブル2: 天気予報
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS forecasts (
-                forecast_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                area_code TEXT NOT NULL,
-                forecast_date DATE NOT NULL,
-                forecast_time TEXT NOT NULL,
-                weather_description TEXT NOT NULL,
-                retrieved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (area_code) REFERENCES areas(area_code),
-                UNIQUE(area_code, forecast_date, forecast_time)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def get_connection(self):
-        """データベース接続を取得"""
-        return sqlite3.connect(self.db_path)
-    
-    def insert_area(self, area_code: str, area_name: str):
-        """地域情報をDBに挿入"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO areas (area_code, area_name)
-                VALUES (?, ?)
-            ''', (area_code, area_name))
-            conn.commit()
-        except Exception as e:
-            print(f"Error inserting area: {e}")
-        finally:
-            conn.close()
-    
-    def insert_forecast(self, area_code: str, forecast_date: str, forecast_time: str, weather: str):
-        """天気予報をDBに挿入"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO forecasts 
-                (area_code, forecast_date, forecast_time, weather_description)
-                VALUES (?, ?, ?, ?)
-            ''', (area_code, forecast_date, forecast_time, weather))
-            conn.commit()
-        except Exception as e:
-            print(f"Error inserting forecast: {e}")
-        finally:
-            conn.close()
-    
-    def get_forecast(self, area_code: str, forecast_date: str = None):
-        """DBから天気予報を取得"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        if forecast_date:
-            cursor.execute('''
-                SELECT forecast_time, weather_description, retrieved_at
-                FROM forecasts
-                WHERE area_code = ? AND forecast_date = ?
-                ORDER BY forecast_time
-            ''', (area_code, forecast_date))
-        else:
-            # 最新の日付のデータを取得
-            cursor.execute('''
-                SELECT DISTINCT forecast_date FROM forecasts
-                WHERE area_code = ?
-                ORDER BY forecast_date DESC
-                LIMIT 1
-            ''', (area_code,))
-            result = cursor.fetchone()
-            
-            if result:
-                latest_date = result[0]
-                cursor.execute('''
-                    SELECT forecast_time, weather_description, retrieved_at
-                    FROM forecasts
-                    WHERE area_code = ? AND forecast_date = ?
-                    ORDER BY forecast_time
-                ''', (area_code, latest_date))
-            else:
-                return []
-        
-        forecasts = cursor.fetchall()
-        conn.close()
-        return forecasts
-    
-    def get_available_dates(self, area_code: str):
-        """特定の地域の利用可能な日付を取得"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT DISTINCT forecast_date FROM forecasts
-            WHERE area_code = ?
-            ORDER BY forecast_date DESC
-        ''', (area_code,))
-        dates = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return dates
+from area_tasks import SUPERSEDED, AreaTaskRunner, cancel_requested
+from jma_cache import HttpCache
+from jma_fetcher import (AREA_URL, FORECAST_URL_TEMPLATE, parse_forecast,
+                         parse_forecast_rows, parse_latest_weather)
+from weather_db import RetentionJob, WeatherDatabase
 
 
 def main(page: ft.Page):
@@ -142,6 +17,12 @@ def main(page: ft.Page):
     
     # データベース初期化
     db = WeatherDatabase()
+    # 古い予報の間引き・空き領域の回収をバックグラウンドで定期実行
+    RetentionJob(db).start()
+    # 条件付きGETのディスクキャッシュ（通常版アプリと共有）
+    http_cache = HttpCache()
+    # API・DBの処理をハンドラの外（スレッド）で実行する
+    task_runner = AreaTaskRunner()
     
     # 背景コンテナ
     bg_container = ft.Container(
@@ -162,17 +43,15 @@ def main(page: ft.Page):
     def get_area_options():
         """地域リストを取得し、Dropdownの選択肢(Option)のリストとして返す"""
         try:
-            response = requests.get(AREA_URL)
-            response.raise_for_status()
-            data = response.json()
+            data = http_cache.get_json(AREA_URL)
             offices = data['offices']
             
             # FletのDropdown用オプションを作成
             options = []
             for code, info in offices.items():
                 options.append(ft.dropdown.Option(key=code, text=info['name']))
-                # DBに地域情報を保存
-                db.insert_area(code, info['name'])
+            # DBに地域情報をまとめて保存（1トランザクション）
+            db.insert_areas((code, info['name']) for code, info in offices.items())
             return options
         except Exception as e:
             return [ft.dropdown.Option(key="error", text="地域リスト取得失敗")]
@@ -181,23 +60,17 @@ def main(page: ft.Page):
         """気象庁APIから天気を取得してDBに保存"""
         url = FORECAST_URL_TEMPLATE.format(area_code)
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            data = http_cache.get_json(url)
             
-            # データ構造から直近の天気を抽出
-            time_series = data[0]['timeSeries'][0]
-            weather_area = time_series['areas'][0]
-            
-            area_name = weather_area['area']['name']
-            weather = weather_area['weathers'][0]
+            # 取得中に同じ地域の別の処理で取り消されていれば、結果は表示されないので保存しない
+            if cancel_requested():
+                return None
             
-            # 今日の日付
-            today = datetime.now().strftime('%Y-%m-%d')
-            current_time = datetime.now().strftime('%H:%M')
+            # データ構造から直近の天気を抽出
+            area_name, weather = parse_latest_weather(data)
             
-            # DBに保存
-            db.insert_forecast(area_code, today, current_time, weather)
+            # 全timeSeries（週間予報を含む）を予報の日時で1トランザクションで保存
+            db.insert_forecast_report(area_code, parse_forecast(data), parse_forecast_rows(area_code, data))
             
             # 天気に応じてアイコンを選択
             if "晴" in weather:
@@ -234,21 +107,17 @@ def main(page: ft.Page):
     
     def get_weather_from_db(area_code):
         """DBから天気情報を取得"""
-        forecasts = db.get_forecast(area_code)
+        # 今日の予報があればそれを、なければ保存されている最新の日付の予報を使う
+        today = datetime.now().strftime('%Y-%m-%d')
+        forecasts = db.get_forecast_with_area(area_code, today) or db.get_forecast_with_area(area_code)
         
         if not forecasts:
             return None
         
-        # 最新の予報を取得
+        # 最新の予報と地域名（JOINで同時に取得済み）
         latest_forecast = forecasts[0]
-        forecast_time, weather, retrieved_at = latest_forecast
-        
-        # 天気情報を取得
-        cursor = db.get_connection().cursor()
-        cursor.execute('SELECT area_name FROM areas WHERE area_code = ?', (area_code,))
-        result = cursor.fetchone()
-        area_name = result[0] if result else "不明"
-        cursor.connection.close()
+        forecast_time, weather, retrieved_at, area_name = latest_forecast
+        area_name = area_name or "不明"
         
         # 天気に応じてアイコンを選択
         if "晴" in weather:
@@ -279,7 +148,7 @@ def main(page: ft.Page):
     # --------------------------------------------------
     # イベントハンドラ
     # --------------------------------------------------
-    def on_click_get_weather(e):
+    async def on_click_get_weather(e):
         # 地域が選択されていない場合
         if not region_dropdown.value:
             result_text.value = "地域を選択してください！"
@@ -294,9 +163,11 @@ def main(page: ft.Page):
         result_icon.color = "#2196f3"
         page.update()
         
-        # 天気取得（APIから取得してDBに保存）
+        # 天気取得（APIから取得してDBに保存）。待っている間も画面は操作できる
         area_code = region_dropdown.value
-        weather_data = get_weather_forecast_api(area_code)
+        weather_data = await task_runner.run(area_code, "API", get_weather_forecast_api)
+        if weather_data is SUPERSEDED:
+            return
         
         # 結果表示
         result_text.value = f"【{weather_data['area_name']}】の天気\n{weather_data['weather']}\n(ソース: {weather_data['source']})"
@@ -304,7 +175,7 @@ def main(page: ft.Page):
         result_icon.color = weather_data['icon_color']
         page.update()
     
-    def on_click_load_from_db(e):
+    async def on_click_load_from_db(e):
         # 地域が選択されていない場合
         if not region_dropdown.value:
             result_text.value = "地域を選択してください！"
@@ -314,7 +185,9 @@ def main(page: ft.Page):
             return
         
         area_code = region_dropdown.value
-        weather_data = get_weather_from_db(area_code)
+        weather_data = await task_runner.run(area_code, "DB", get_weather_from_db)
+        if weather_data is SUPERSEDED:
+            return
         
         if weather_data:
             result_text.value = f"【{weather_data['area_name']}】の天気\n{weather_data['weather']}\n(ソース: {weather_data['source']})\n取得: {weather_data['retrieved_at']}"
@@ -0,0 +1,144 @@
+"""気象庁の予報を定期的に取得して weather_data.db に保存する常駐プログラム（Flet不要）
+
+使い方:
+    python weather_collector.py          # 05/11/17時（日本時間）の発表に合わせて取得し続ける
+    python weather_collector.py --once   # 1回だけ取得して終了
+"""
+
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from jma_cache import HttpCache
+from jma_fetcher import ForecastFetcher, parse_forecast, parse_forecast_rows
+from weather_db import RetentionJob, WeatherDatabase
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+JST = timezone(timedelta(hours=9), "JST")
+PUBLISH_HOURS = (5, 11, 17)              # 気象庁の定時発表
+PUBLISH_DELAY = timedelta(minutes=10)    # 発表直後は反映待ちのため少し遅らせる
+SPREAD_SECONDS = 300                     # 1回の巡回で全地域へのリクエストを分散させる時間
+
+
+def next_run_time(now: datetime):
+    """now より後で最初の取得時刻（発表時刻 + PUBLISH_DELAY）"""
+    now = now.astimezone(JST)
+    for days in (0, 1):
+        day = now + timedelta(days=days)
+        for hour in PUBLISH_HOURS:
+            candidate = day.replace(hour=hour, minute=0, second=0, microsecond=0) + PUBLISH_DELAY
+            if candidate > now:
+                return candidate
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # Linuxでは KB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ForecastCollector:
+    """全地域の予報を巡回し、発表日時が変わった地域だけDBに保存する"""
+
+    def __init__(self, db: WeatherDatabase, fetcher: ForecastFetcher,
+                 spread_seconds: float = SPREAD_SECONDS):
+        self.db = db
+        self.fetcher = fetcher
+        self.spread_seconds = spread_seconds
+        self._stop_event = threading.Event()
+        # 地域ごとに最後に保存した短期予報の発表日時
+        self.last_reports = self._load_last_reports()
+
+    def _load_last_reports(self):
+        cursor = self.db.get_connection().cursor()
+        cursor.execute('''
+            SELECT office_code, MAX(report_datetime) FROM forecast_reports
+            WHERE report_kind = 'short'
+            GROUP BY office_code
+        ''')
+        return dict(cursor.fetchall())
+
+    def run_cycle(self):
+        """全地域を1巡し、この巡回の計測値を辞書で返す"""
+        started = time.perf_counter()
+        updated = skipped = errors = 0
+
+        offices = self.fetcher.fetch_offices()
+        self.db.insert_areas((code, info['name']) for code, info in offices.items())
+
+        # リクエストが一度に集中しないよう、spread_seconds の間に均等に分散させる
+        interval = self.spread_seconds / max(len(offices), 1)
+        for index, code in enumerate(offices):
+            if index and self._stop_event.wait(interval):
+                break
+            try:
+                data = self.fetcher.fetch_forecast(code)
+                report_datetime = data[0]['reportDatetime']
+                if self.last_reports.get(code) == report_datetime:
+                    skipped += 1
+                    continue
+                # 保存に失敗した発表は記録せず、次の巡回で取り直す
+                if not self.db.insert_forecast_report(code, parse_forecast(data), parse_forecast_rows(code, data)):
+                    errors += 1
+                    continue
+                self.last_reports[code] = report_datetime
+                updated += 1
+            except Exception as e:
+                print(f"Error collecting {code}: {e}")
+                errors += 1
+
+        return {
+            "finished_at": datetime.now(JST).strftime('%Y-%m-%d %H:%M:%S'),
+            "offices": len(offices),
+            "updated": updated,
+            "skipped": skipped,
+            "errors": errors,
+            "seconds": round(time.perf_counter() - started, 2),
+            "max_rss_mb": _max_rss_mb(),
+        }
+
+    def run_forever(self):
+        """起動時に1回、その後は発表時刻ごとに巡回する（stop() で終了）"""
+        while not self._stop_event.is_set():
+            try:
+                print(f"Cycle: {self.run_cycle()}", flush=True)
+            except Exception as e:
+                print(f"Error in cycle: {e}", flush=True)
+            wait = (next_run_time(datetime.now(JST)) - datetime.now(JST)).total_seconds()
+            self._stop_event.wait(max(wait, 0))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="気象庁の予報を定期取得してDBに保存する")
+    parser.add_argument("--once", action="store_true", help="1回だけ取得して終了する")
+    parser.add_argument("--spread", type=float, default=SPREAD_SECONDS,
+                        help="1巡回でリクエストを分散させる秒数")
+    args = parser.parse_args()
+
+    # 別プロセス（アプリ）と同じDBに書き込むので読み込みキャッシュは使わない
+    db = WeatherDatabase(cache_size=0)
+    fetcher = ForecastFetcher(cache=HttpCache())
+    collector = ForecastCollector(db, fetcher, spread_seconds=args.spread)
+    try:
+        if args.once:
+            print(f"Cycle: {collector.run_cycle()}")
+        else:
+            RetentionJob(db).start()
+            collector.run_forever()
+    except KeyboardInterrupt:
+        collector.stop()
+    finally:
+        fetcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,671 @@
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from weather_migrations import migrate
+
+DB_PATH = "weather_data.db"
+RETENTION_DAYS = 30           # この日数より古い予報は1地域1日1件に間引く
+RETENTION_INTERVAL = 6 * 3600  # 保守ジョブの実行間隔（秒）
+READ_CACHE_SIZE = 512          # 読み込みキャッシュに保持する件数
+BENCH_DB_PATH = "weather_bench.db"
+BENCH_AREAS = 58               # 気象庁の府県予報区の数
+BENCH_TIMES = ("05:00", "11:00", "17:00")
+
+
+class LRUCache:
+    """件数上限付きのLRUキャッシュ（スレッドセーフ）
+
+    キーはタプルで、2番目の要素を地域コードにしておくと invalidate_area で消せる。
+    読み込みの前に generation() を取っておき put に渡すと、読み込み中に無効化された
+    地域の（古いかもしれない）結果は保存しない。
+    """
+    
+    MISSING = object()
+    
+    def __init__(self, maxsize: int = READ_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # 地域ごとの世代（invalidate_area で増える）と全体の世代（clear で増える）
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return self.MISSING
+    
+    def generation(self, area_code):
+        """地域の現在の世代。読み込みを始める前に取得して put に渡す"""
+        with self._lock:
+            return self._epoch, self._generations.get(area_code, 0)
+    
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key[1], 0)):
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def invalidate_area(self, area_codes):
+        """指定した地域コードのエントリを削除"""
+        area_codes = set(area_codes)
+        with self._lock:
+            for area_code in area_codes:
+                self._generations[area_code] = self._generations.get(area_code, 0) + 1
+            for key in [k for k in self._data if k[1] in area_codes]:
+                del self._data[key]
+    
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._data.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._data), "maxsize": self.maxsize}
+
+
+class WeatherDatabase:
+    """SQLiteを使用した天気データベースの管理"""
+    
+    # SQL文は定数にしておき、sqlite3の文キャッシュで再利用されるようにする
+    INSERT_AREA_SQL = '''
+        INSERT OR REPLACE INTO areas (area_code, area_name)
+        VALUES (?, ?)
+    '''
+    INSERT_FORECAST_SQL = '''
+        INSERT OR REPLACE INTO forecasts 
+        (area_code, forecast_date, forecast_time, weather_description)
+        VALUES (?, ?, ?, ?)
+    '''
+    INSERT_REPORT_SQL = '''
+        INSERT OR IGNORE INTO forecast_reports
+        (office_code, report_kind, publishing_office, report_datetime)
+        VALUES (?, ?, ?, ?)
+    '''
+    SELECT_REPORT_ID_SQL = '''
+        SELECT report_id FROM forecast_reports
+        WHERE office_code = ? AND report_kind = ? AND report_datetime = ?
+    '''
+    INSERT_FORECAST_AREA_SQL = '''
+        INSERT OR REPLACE INTO forecast_areas (area_code, area_name)
+        VALUES (?, ?)
+    '''
+    INSERT_FORECAST_VALUE_SQL = '''
+        INSERT OR REPLACE INTO forecast_values
+        (report_id, area_code, time_define, element, value)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+    SELECT_FORECAST_SQL = '''
+        SELECT forecast_time, weather_description, retrieved_at
+        FROM forecasts
+        WHERE area_code = ? AND forecast_date = ?
+        ORDER BY forecast_time
+    '''
+    # 最新の日付は MAX で索引の先頭だけを見て求める
+    SELECT_LATEST_FORECAST_SQL = '''
+        SELECT forecast_time, weather_description, retrieved_at
+        FROM forecasts
+        WHERE area_code = ? AND forecast_date = (
+            SELECT MAX(forecast_date) FROM forecasts WHERE area_code = ?
+        )
+        ORDER BY forecast_time
+    '''
+    SELECT_AVAILABLE_DATES_SQL = '''
+        SELECT DISTINCT forecast_date FROM forecasts
+        WHERE area_code = ?
+        ORDER BY forecast_date DESC
+    '''
+    SELECT_AREA_NAME_SQL = 'SELECT area_name FROM areas WHERE area_code = ?'
+    SELECT_FORECAST_WITH_AREA_SQL = '''
+        SELECT f.forecast_time, f.weather_description, f.retrieved_at, a.area_name
+        FROM forecasts f
+        LEFT JOIN areas a ON a.area_code = f.area_code
+        WHERE f.area_code = ?1 AND f.forecast_date = COALESCE(?2, (
+            SELECT MAX(forecast_date) FROM forecasts WHERE area_code = ?3
+        ))
+        ORDER BY f.forecast_time
+    '''
+    
+    def __init__(self, db_path: str = DB_PATH, cache_size: int = READ_CACHE_SIZE):
+        self.db_path = db_path
+        # スレッドごとに1本の接続を保持する（sqlite3の接続はスレッド間で共有できない）
+        self._local = threading.local()
+        # 読み込み結果のキャッシュ（書き込み時に該当地域のエントリを無効化する）
+        self._cache = LRUCache(cache_size)
+        self.init_database()
+    
+    def init_database(self):
+        """データベーススキーマを最新の版まで移行（weather_migrations.MIGRATIONS）"""
+        migrate(self.get_connection())
+    
+    def get_connection(self):
+        """現在のスレッド用のデータベース接続を取得（初回のみ接続を開く）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=256)
+            # WALモード: 書き込み中でも読み込みをブロックしない
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        """現在のスレッドの接続を閉じる"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def insert_area(self, area_code: str, area_name: str):
+        """地域情報をDBに挿入"""
+        self.insert_areas([(area_code, area_name)])
+    
+    def insert_areas(self, areas):
+        """地域情報 (area_code, area_name) をまとめて1トランザクションで挿入"""
+        areas = list(areas)
+        conn = self.get_connection()
+        try:
+            with conn:
+                conn.executemany(self.INSERT_AREA_SQL, areas)
+        except Exception as e:
+            print(f"Error inserting area: {e}")
+        finally:
+            self._cache.invalidate_area(code for code, _ in areas)
+    
+    def insert_forecast(self, area_code: str, forecast_date: str, forecast_time: str, weather: str):
+        """天気予報をDBに挿入"""
+        self.insert_forecasts([(area_code, forecast_date, forecast_time, weather)])
+    
+    def insert_forecasts(self, forecasts):
+        """天気予報 (area_code, forecast_date, forecast_time, weather) をまとめて1トランザクションで挿入"""
+        forecasts = list(forecasts)
+        conn = self.get_connection()
+        try:
+            with conn:
+                conn.executemany(self.INSERT_FORECAST_SQL, forecasts)
+        except Exception as e:
+            print(f"Error inserting forecast: {e}")
+        finally:
+            self._cache.invalidate_area(row[0] for row in forecasts)
+    
+    def insert_forecast_report(self, office_code: str, reports, forecasts=()):
+        """1回分のAPIレスポンスを1トランザクションで保存
+
+        reports は jma_fetcher.parse_forecast の結果、forecasts は
+        insert_forecasts と同じ形式の行（forecastsテーブル用）。
+        保存できたら True、エラーでロールバックしたら False を返す。
+        """
+        conn = self.get_connection()
+        try:
+            with conn:
+                for report in reports:
+                    conn.execute(self.INSERT_REPORT_SQL, (
+                        office_code, report['kind'], report['publishing_office'], report['report_datetime']))
+                    report_id = conn.execute(self.SELECT_REPORT_ID_SQL, (
+                        office_code, report['kind'], report['report_datetime'])).fetchone()[0]
+                    conn.executemany(self.INSERT_FORECAST_AREA_SQL, report['areas'])
+                    conn.executemany(self.INSERT_FORECAST_VALUE_SQL, (
+                        (report_id, area_code, time_define, element, value)
+                        for area_code, time_define, element, value in report['values']))
+                conn.executemany(self.INSERT_FORECAST_SQL, forecasts)
+            return True
+        except Exception as e:
+            print(f"Error inserting forecast report: {e}")
+            return False
+        finally:
+            self._cache.invalidate_area([office_code])
+
+    def insert_forecast_reports(self, batch):
+        """複数地域のAPIレスポンスをまとめて1トランザクションで保存
+
+        batch は (office_code, reports, forecasts) の並び（insert_forecast_report の引数と同じ）。
+        表ごとに executemany でまとめて書き込む。保存できたら True、
+        エラーでロールバックしたら（どの地域も保存せず）False を返す。
+        """
+        batch = list(batch)
+        conn = self.get_connection()
+        try:
+            with conn:
+                reports = [(office_code, report) for office_code, reports, _ in batch for report in reports]
+                conn.executemany(self.INSERT_REPORT_SQL, (
+                    (office_code, report['kind'], report['publishing_office'], report['report_datetime'])
+                    for office_code, report in reports))
+                values = []
+                for office_code, report in reports:
+                    report_id = conn.execute(self.SELECT_REPORT_ID_SQL, (
+                        office_code, report['kind'], report['report_datetime'])).fetchone()[0]
+                    values.extend((report_id, area_code, time_define, element, value)
+                                  for area_code, time_define, element, value in report['values'])
+                conn.executemany(self.INSERT_FORECAST_AREA_SQL,
+                                 (area for _, report in reports for area in report['areas']))
+                conn.executemany(self.INSERT_FORECAST_VALUE_SQL, values)
+                conn.executemany(self.INSERT_FORECAST_SQL, (row for _, _, forecasts in batch for row in forecasts))
+            return True
+        except Exception as e:
+            print(f"Error inserting forecast reports: {e}")
+            return False
+        finally:
+            self._cache.invalidate_area([office_code for office_code, _, _ in batch])
+    
+    def get_report_values(self, office_code: str, report_kind: str = "short", element: str = None):
+        """最新の発表の予報値を (区域名, 時刻, 要素, 値) のリストで取得"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('''
+            SELECT report_id FROM forecast_reports
+            WHERE office_code = ? AND report_kind = ?
+            ORDER BY report_datetime DESC
+            LIMIT 1
+        ''', (office_code, report_kind))
+        result = cursor.fetchone()
+        if not result:
+            return []
+        
+        query = '''
+            SELECT fa.area_name, fv.time_define, fv.element, fv.value
+            FROM forecast_values fv
+            JOIN forecast_areas fa ON fa.area_code = fv.area_code
+            WHERE fv.report_id = ?
+        '''
+        params = [result[0]]
+        if element:
+            query += ' AND fv.element = ?'
+            params.append(element)
+        cursor.execute(query + ' ORDER BY fv.area_code, fv.element, fv.time_define', params)
+        return cursor.fetchall()
+    
+    def get_forecast(self, area_code: str, forecast_date: str = None):
+        """DBから天気予報を取得（日付を省略すると最新の日付）"""
+        key = ("forecast", area_code, forecast_date)
+        cached = self._cache.get(key)
+        if cached is not LRUCache.MISSING:
+            return list(cached)
+        
+        generation = self._cache.generation(area_code)
+        cursor = self.get_connection().cursor()
+        
+        if forecast_date:
+            cursor.execute(self.SELECT_FORECAST_SQL, (area_code, forecast_date))
+        else:
+            cursor.execute(self.SELECT_LATEST_FORECAST_SQL, (area_code, area_code))
+        
+        forecasts = cursor.fetchall()
+        self._cache.put(key, forecasts, generation)
+        return list(forecasts)
+    
+    def get_forecast_with_area(self, area_code: str, forecast_date: str = None):
+        """天気予報と地域名を1回のJOINで取得（日付を省略すると最新の日付）
+
+        (forecast_time, weather_description, retrieved_at, area_name) のリストを返す。
+        """
+        key = ("forecast_with_area", area_code, forecast_date)
+        cached = self._cache.get(key)
+        if cached is not LRUCache.MISSING:
+            return list(cached)
+        
+        generation = self._cache.generation(area_code)
+        cursor = self.get_connection().cursor()
+        cursor.execute(self.SELECT_FORECAST_WITH_AREA_SQL,
+                       (area_code, forecast_date, area_code))
+        forecasts = cursor.fetchall()
+        self._cache.put(key, forecasts, generation)
+        return list(forecasts)
+    
+    def get_area_name(self, area_code: str):
+        """地域コードから地域名を取得"""
+        key = ("area_name", area_code)
+        cached = self._cache.get(key)
+        if cached is not LRUCache.MISSING:
+            return cached
+        
+        generation = self._cache.generation(area_code)
+        cursor = self.get_connection().cursor()
+        cursor.execute(self.SELECT_AREA_NAME_SQL, (area_code,))
+        result = cursor.fetchone()
+        area_name = result[0] if result else None
+        self._cache.put(key, area_name, generation)
+        return area_name
+    
+    def cache_stats(self):
+        """読み込みキャッシュのヒット・ミス数"""
+        return self._cache.stats()
+    
+    def get_available_dates(self, area_code: str):
+        """特定の地域の利用可能な日付を取得"""
+        cursor = self.get_connection().cursor()
+        cursor.execute(self.SELECT_AVAILABLE_DATES_SQL, (area_code,))
+        return [row[0] for row in cursor.fetchall()]
+    
+    def apply_retention(self, keep_days: int = RETENTION_DAYS):
+        """keep_days より古い予報を1地域・1日につき最新の1件に間引き、空き領域を回収する
+
+        削除件数と回収できたバイト数を辞書で返す。
+        """
+        cutoff = (datetime.now() - timedelta(days=keep_days)).strftime('%Y-%m-%d')
+        conn = self.get_connection()
+        
+        with conn:
+            # forecasts: 地域・日付ごとに最後に保存された行だけ残す
+            forecasts_deleted = conn.execute('''
+                DELETE FROM forecasts
+                WHERE forecast_date < ?1 AND forecast_id NOT IN (
+                    SELECT MAX(forecast_id) FROM forecasts
+                    WHERE forecast_date < ?1
+                    GROUP BY area_code, forecast_date
+                )
+            ''', (cutoff,)).rowcount
+            
+            # forecast_reports: 地域・種類・発表日ごとに最後の発表だけ残す
+            conn.execute('DROP TABLE IF EXISTS temp.expired_reports')
+            conn.execute('''
+                CREATE TEMP TABLE expired_reports AS
+                SELECT report_id FROM forecast_reports
+                WHERE report_datetime < ?1 AND report_id NOT IN (
+                    SELECT MAX(report_id) FROM forecast_reports
+                    WHERE report_datetime < ?1
+                    GROUP BY office_code, report_kind, substr(report_datetime, 1, 10)
+                )
+            ''', (cutoff,))
+            conn.execute('DELETE FROM forecast_values WHERE report_id IN (SELECT report_id FROM temp.expired_reports)')
+            reports_deleted = conn.execute(
+                'DELETE FROM forecast_reports WHERE report_id IN (SELECT report_id FROM temp.expired_reports)'
+            ).rowcount
+            conn.execute('DROP TABLE temp.expired_reports')
+        
+        self._cache.clear()
+        return {
+            "forecasts_deleted": forecasts_deleted,
+            "reports_deleted": reports_deleted,
+            "bytes_reclaimed": self.compact(),
+        }
+    
+    def compact(self):
+        """空きページをファイルから回収し（incremental vacuum）、統計情報を更新する
+
+        回収したバイト数（incremental vacuum の前後の空きページ数の差 × ページサイズ）を返す。
+        """
+        conn = self.get_connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # incremental_vacuum は1ステップで1ページしか解放しないので executescript で最後まで実行する
+        conn.executescript("PRAGMA incremental_vacuum;")
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.executescript("PRAGMA optimize;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return max(free_before - free_after, 0) * page_size
+    
+    def get_database_size(self):
+        """データベースの使用サイズ（バイト）"""
+        conn = self.get_connection()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+    
+    def find_full_scans(self):
+        """よく使うクエリのうち、テーブルか索引の全体を走査しているものを返す（EXPLAIN QUERY PLAN）
+
+        {クエリ名: [SCAN を含む行]} を返す。空の辞書なら、すべて索引の検索（SEARCH）で済んでいる。
+        """
+        hot_queries = {
+            "get_forecast(date)": (self.SELECT_FORECAST_SQL, ("", "")),
+            "get_forecast(latest)": (self.SELECT_LATEST_FORECAST_SQL, ("", "")),
+            "get_forecast_with_area": (self.SELECT_FORECAST_WITH_AREA_SQL, ("", None, "")),
+            "get_available_dates": (self.SELECT_AVAILABLE_DATES_SQL, ("",)),
+            "get_area_name": (self.SELECT_AREA_NAME_SQL, ("",)),
+        }
+        cursor = self.get_connection().cursor()
+        scans = {}
+        for name, (query, params) in hot_queries.items():
+            details = [row[3] for row in cursor.execute("EXPLAIN QUERY PLAN " + query, params)]
+            # "SCAN f USING COVERING INDEX ..." も索引全体を読むので走査とみなす
+            bad = [d for d in details if d.startswith("SCAN") and d != "SCAN CONSTANT ROW"]
+            if bad:
+                scans[name] = bad
+        return scans
+
+
+class RetentionJob(threading.Thread):
+    """WeatherDatabase.apply_retention を一定間隔でバックグラウンド実行するスレッド"""
+    
+    def __init__(self, db: WeatherDatabase, keep_days: int = RETENTION_DAYS,
+                 interval: float = RETENTION_INTERVAL):
+        super().__init__(daemon=True)
+        self.db = db
+        self.keep_days = keep_days
+        self.interval = interval
+        self.last_result = None
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.last_result = self.db.apply_retention(self.keep_days)
+                print(f"Retention: {self.last_result}")
+            except Exception as e:
+                print(f"Error in retention job: {e}")
+            self._stop_event.wait(self.interval)
+        # このスレッド用に開いた接続を閉じる
+        self.db.close()
+    
+    def stop(self):
+        self._stop_event.set()
+
+
+def _connect_per_call_insert_area(db_path, area_code, area_name):
+    """以前の insert_area と同じく、1件ごとに接続・コミット・切断する（比較用）"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(WeatherDatabase.INSERT_AREA_SQL, (area_code, area_name))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def benchmark_startup(offices: int = 60, repeat: int = 5):
+    """起動時の地域同期（offices 件の insert_area）を、1件ごとの接続と insert_areas で比べる [ms]"""
+    areas = [(f"{130000 + i:06d}", f"地域{i}") for i in range(offices)]
+    with tempfile.TemporaryDirectory() as directory:
+        db = WeatherDatabase(os.path.join(directory, "bench.db"))
+        db.close()
+
+        before = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for code, name in areas:
+                _connect_per_call_insert_area(db.db_path, code, name)
+            before.append((time.perf_counter() - started) * 1000)
+
+        after = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            db.insert_areas(areas)
+            after.append((time.perf_counter() - started) * 1000)
+        db.close()
+
+    return {"offices": offices, "before_ms": round(min(before), 2), "after_ms": round(min(after), 2)}
+
+
+def make_synthetic_db(path: str = BENCH_DB_PATH, rows: int = 1_000_000):
+    """地域 BENCH_AREAS 件 × 1日3回の予報を、合計 rows 行になる日数分だけ入れた検証用DBを作る"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = WeatherDatabase(path, cache_size=0)
+    conn = db.get_connection()
+    db.insert_areas((f"{(i + 1) * 10000:06d}", f"地域{i}") for i in range(BENCH_AREAS))
+    days = -(-rows // (BENCH_AREAS * len(BENCH_TIMES)))
+    with conn:
+        conn.execute('''
+            WITH RECURSIVE d(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM d WHERE n + 1 < ?1),
+                 t(forecast_time) AS (SELECT value FROM json_each(?2))
+            INSERT INTO forecasts (area_code, forecast_date, forecast_time, weather_description)
+            SELECT a.area_code, date('2000-01-01', '+' || d.n || ' days'), t.forecast_time,
+                   CASE abs(random()) % 4 WHEN 0 THEN '晴れ' WHEN 1 THEN 'くもり' WHEN 2 THEN '雨' ELSE '雪' END
+            FROM d, t, areas a
+            LIMIT ?3
+        ''', (days, json.dumps(BENCH_TIMES), rows))
+    conn.execute("ANALYZE")
+    return db
+
+
+def _timed(func, repeat: int = 200):
+    """func を repeat 回実行した1回あたりの時間 [ms]"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def benchmark(db: WeatherDatabase, repeat: int = 200):
+    """「最新の予報＋地域名」などのよく使う読み込みを、以前のクエリ・索引なしの走査と比べる [ms]
+
+    db は cache_size=0 で開いておく（キャッシュではなくクエリの時間を測る）。
+    """
+    conn = db.get_connection()
+    codes = [row[0] for row in conn.execute("SELECT area_code FROM areas")]
+    latest_date = conn.execute("SELECT MAX(forecast_date) FROM forecasts").fetchone()[0]
+    picks = itertools.cycle(codes)
+
+    def old_latest_with_area(not_indexed=""):
+        # 以前の get_weather_from_db: 最新日付・予報・地域名を別々のクエリで取得していた
+        code = next(picks)
+        row = conn.execute(f'''
+            SELECT DISTINCT forecast_date FROM forecasts {not_indexed}
+            WHERE area_code = ? ORDER BY forecast_date DESC LIMIT 1
+        ''', (code,)).fetchone()
+        conn.execute(f'''
+            SELECT forecast_time, weather_description, retrieved_at FROM forecasts {not_indexed}
+            WHERE area_code = ? AND forecast_date = ? ORDER BY forecast_time
+        ''', (code, row[0])).fetchall()
+        conn.execute(db.SELECT_AREA_NAME_SQL, (code,)).fetchone()
+
+    cases = {
+        "最新の予報＋地域名": (
+            lambda: db.get_forecast_with_area(next(picks)),
+            old_latest_with_area,
+            lambda: old_latest_with_area("NOT INDEXED")),
+        "日付指定の予報": (
+            lambda: db.get_forecast(next(picks), latest_date),
+            lambda: conn.execute('''
+                SELECT forecast_time, weather_description, retrieved_at FROM forecasts INDEXED BY sqlite_autoindex_forecasts_1
+                WHERE area_code = ? AND forecast_date = ? ORDER BY forecast_time
+            ''', (next(picks), latest_date)).fetchall(),
+            lambda: conn.execute('''
+                SELECT forecast_time, weather_description, retrieved_at FROM forecasts NOT INDEXED
+                WHERE area_code = ? AND forecast_date = ? ORDER BY forecast_time
+            ''', (next(picks), latest_date)).fetchall()),
+    }
+    return {name: {"new_ms": round(_timed(new, repeat), 3),
+                   "old_ms": round(_timed(old, repeat), 3),
+                   "scan_ms": round(_timed(scan, max(repeat // 100, 1)), 2)}
+            for name, (new, old, scan) in cases.items()}
+
+
+def benchmark_click(db: WeatherDatabase, clicks: int = 1000):
+    """「DBから取得」ボタンのクリックから表示文字列ができるまでの時間 [ms] を、キャッシュなし・ありで比べる
+
+    weather_app_with_db.py と同じく AreaTaskRunner でスレッドに渡して読み込み、表示用の文字列を作る。
+    キャッシュありは、全地域を一度読んだ後（ウォームキャッシュ）の時間。
+    """
+    import asyncio
+
+    from area_tasks import AreaTaskRunner
+
+    codes = [row[0] for row in db.get_connection().execute("SELECT area_code FROM areas")]
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    def get_weather_from_db(area_code):
+        forecasts = db.get_forecast_with_area(area_code, today) or db.get_forecast_with_area(area_code)
+        forecast_time, weather, retrieved_at, area_name = forecasts[0]
+        return f"【{area_name or '不明'}】の天気\n{weather}\n(ソース: DB)\n取得: {retrieved_at}"
+
+    async def click_all():
+        runner = AreaTaskRunner()
+        latencies = []
+        for i in range(clicks):
+            started = time.perf_counter()
+            await runner.run(codes[i % len(codes)], "DB", get_weather_from_db)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        return {"median_ms": round(latencies[len(latencies) // 2], 3),
+                "p99_ms": round(latencies[int(len(latencies) * 0.99)], 3)}
+
+    maxsize = db._cache.maxsize
+    try:
+        db._cache.clear()
+        db._cache.maxsize = 0
+        cold = asyncio.run(click_all())
+        db._cache.maxsize = max(maxsize, len(codes) * 2)
+        for code in codes:
+            get_weather_from_db(code)
+        before = db.cache_stats()
+        warm = asyncio.run(click_all())
+        after = db.cache_stats()
+    finally:
+        db._cache.maxsize = maxsize
+    warm["hits"] = after["hits"] - before["hits"]
+    warm["misses"] = after["misses"] - before["misses"]
+    return {"clicks": clicks, "no_cache": cold, "warm_cache": warm}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="weather_data.db の性能確認")
+    parser.add_argument("--bench-startup", type=int, metavar="OFFICES", nargs="?", const=60,
+                        help="起動時の地域同期（OFFICES 件）を以前の書き込み方と比べる")
+    parser.add_argument("--bench", type=int, metavar="ROWS",
+                        help="ROWS 行の検証用DB（weather_bench.db）でよく使う読み込みの時間を測る")
+    parser.add_argument("--bench-click", action="store_true",
+                        help="--bench の検証用DBで「DBから取得」のクリック→表示の時間をキャッシュなし・ありで比べる")
+    parser.add_argument("--explain", action="store_true",
+                        help="よく使うクエリが走査になっていないかを EXPLAIN QUERY PLAN で確かめる")
+    parser.add_argument("--db", default=DB_PATH, help="--explain で調べるDB（--bench 指定時は検証用DB）")
+    args = parser.parse_args()
+
+    if args.bench:
+        db = make_synthetic_db(BENCH_DB_PATH, args.bench)
+        print(f"forecasts {args.bench:,} 行")
+        for name, result in benchmark(db).items():
+            print(f"{name:<10}: 新 {result['new_ms']:>7} ms / 以前 {result['old_ms']:>7} ms / "
+                  f"索引なし {result['scan_ms']:>8} ms")
+        if args.bench_click:
+            result = benchmark_click(db)
+            print(f"クリック→表示 {result['clicks']} 回: キャッシュなし {result['no_cache']} / "
+                  f"ウォームキャッシュ {result['warm_cache']}")
+    if args.explain:
+        db = db if args.bench else WeatherDatabase(args.db)
+        scans = db.find_full_scans()
+        for name, details in scans.items():
+            print(f"{name}: {details}")
+        assert not scans, "よく使うクエリがテーブルを走査しています"
+        print("EXPLAIN QUERY PLAN: 走査なし")
+    if args.bench or args.explain:
+        return
+
+    if args.bench_startup:
+        result = benchmark_startup(args.bench_startup)
+        print(f"地域 {result['offices']} 件: 1件ごとに接続 {result['before_ms']} ms / "
+              f"insert_areas {result['after_ms']} ms")
+        return
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""weather_data.db のスキーマ移行（PRAGMA user_version で版を管理）
+
+MIGRATIONS に (版, 説明, 関数, トランザクションを自分で管理するか) を追加していく。
+版は1から順番に適用され、適用済みの版は二度と実行されない。
+"""
+
+import time
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _create_base_tables(conn):
+    # テーブル1: 地域情報
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS areas (
+            area_code TEXT PRIMARY KEY,
+            area_name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # テーブル2: 天気予報
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS forecasts (
+            forecast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            area_code TEXT NOT NULL,
+            forecast_date DATE NOT NULL,
+            forecast_time TEXT NOT NULL,
+            weather_description TEXT NOT NULL,
+            retrieved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (area_code) REFERENCES areas(area_code),
+            UNIQUE(area_code, forecast_date, forecast_time)
+        )
+    ''')
+
+
+def _create_report_tables(conn):
+    # テーブル3: 発表（1回のAPIレスポンスに含まれる短期予報・週間予報）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_reports (
+            report_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            office_code TEXT NOT NULL,
+            report_kind TEXT NOT NULL,
+            publishing_office TEXT,
+            report_datetime TEXT NOT NULL,
+            retrieved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (office_code) REFERENCES areas(area_code),
+            UNIQUE(office_code, report_kind, report_datetime)
+        )
+    ''')
+
+    # テーブル4: 予報区域（一次細分区域・地点など、officeより細かい区域）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_areas (
+            area_code TEXT PRIMARY KEY,
+            area_name TEXT NOT NULL
+        )
+    ''')
+
+    # テーブル5: 予報値（区域×時刻×要素ごとに1行）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_values (
+            report_id INTEGER NOT NULL,
+            area_code TEXT NOT NULL,
+            time_define TEXT NOT NULL,
+            element TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (report_id, area_code, element, time_define),
+            FOREIGN KEY (report_id) REFERENCES forecast_reports(report_id),
+            FOREIGN KEY (area_code) REFERENCES forecast_areas(area_code)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _create_forecast_index(conn):
+    # 地域ごとの最新日付・日付指定の検索を索引だけで返せるようにする（カバリングインデックス）
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_forecasts_area_date
+        ON forecasts (area_code, forecast_date DESC, forecast_time, weather_description, retrieved_at)
+    ''')
+
+
+def _enable_incremental_vacuum(conn):
+    # auto_vacuum の変更は VACUUM で作り直したときに反映される（トランザクション外で実行）
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+# (版, 説明, 関数, 関数が自分でトランザクションを管理するか)
+MIGRATIONS = [
+    (1, "areas / forecasts テーブルを作成", _create_base_tables, False),
+    (2, "forecast_reports / forecast_areas / forecast_values テーブルを作成", _create_report_tables, False),
+    (3, "forecasts にカバリングインデックスを追加", _create_forecast_index, False),
+    (4, "auto_vacuum を INCREMENTAL に変更", _enable_incremental_vacuum, True),
+]
+
+
+def get_version(conn):
+    """現在のスキーマの版"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, migrations=None, verbose: bool = False):
+    """未適用のマイグレーションを版の順に適用し、適用した版のリストを返す
+
+    通常のマイグレーションは1つずつ1トランザクションで実行し、
+    同じトランザクションの中で user_version を更新する（途中で失敗しても版は進まない）。
+    """
+    migrations = sorted(MIGRATIONS if migrations is None else migrations, key=lambda m: m[0])
+    current = get_version(conn)
+    applied = []
+    for version, description, func, manages_transaction in migrations:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        if manages_transaction:
+            func(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        else:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                func(conn)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        applied.append(version)
+        if verbose:
+            print(f"migration {version}: {description} ({time.perf_counter() - started:.2f} 秒)")
+    return applied
+
+
+def _primary_key(conn, table):
+    """テーブルの主キーの列名（主キーの順）"""
+    columns = [(row[5], row[1]) for row in conn.execute(f"PRAGMA table_info({table})") if row[5] > 0]
+    return [name for _, name in sorted(columns)]
+
+
+def _replay_changes(conn, table, new_table, log_table, key_list, column_list, upto):
+    """変更ログの seq <= upto の行のキーについて、新しいテーブルの行を元のテーブルの今の内容に合わせる"""
+    changed = f"SELECT {key_list} FROM {log_table} WHERE seq <= ?"
+    conn.execute(f"DELETE FROM {new_table} WHERE ({key_list}) IN ({changed})", (upto,))
+    conn.execute(f"INSERT INTO {new_table} ({column_list}) "
+                 f"SELECT {column_list} FROM {table} WHERE ({key_list}) IN ({changed})", (upto,))
+    conn.execute(f"DELETE FROM {log_table} WHERE seq <= ?", (upto,))
+
+
+def rebuild_table(conn, table: str, create_sql: str, columns, index_sqls=(),
+                  chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """テーブルを作り直す（列の変更・STRICT・WITHOUT ROWID化など）
+
+    create_sql は新しいテーブルを "{table}" の名前で作るCREATE TABLE文。
+    columns は元のテーブルからコピーする列で、元のテーブルの主キーの列を含める
+    （主キーの無いテーブルは ValueError）。行は主キー順に chunk_size 件ずつ
+    別トランザクションでコピーするので、コピー中も元のテーブルは読み書きできる。
+    コピー中の追加・更新・削除はトリガーで変更ログに主キーを記録しておき、
+    最後に BEGIN IMMEDIATE の中でログの行だけを元のテーブルに合わせてから
+    テーブルを入れ替えて索引を作り直す。
+    トランザクションを自分で管理するマイグレーションから呼び出す。
+    """
+    key = _primary_key(conn, table)
+    if not key:
+        raise ValueError(f"{table} には主キーが無いため作り直せません")
+    missing = [name for name in key if name not in columns]
+    if missing:
+        raise ValueError(f"columns に主キーの列 {', '.join(missing)} が含まれていません")
+
+    new_table = f"{table}__rebuild"
+    log_table = f"{table}__rebuild_log"
+    column_list = ", ".join(columns)
+    key_list = ", ".join(key)
+    new_keys = ", ".join(f"NEW.{name}" for name in key)
+    old_keys = ", ".join(f"OLD.{name}" for name in key)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {new_table}")
+        conn.execute(f"DROP TABLE IF EXISTS {log_table}")
+        conn.execute(create_sql.format(table=new_table))
+        conn.execute(f"CREATE TABLE {log_table} (seq INTEGER PRIMARY KEY, {key_list})")
+        # ここから先の変更はすべてログに残る（コピーと同じトランザクションで有効にする）
+        conn.execute(f"""CREATE TRIGGER {table}__rebuild_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {log_table} ({key_list}) VALUES ({new_keys}); END""")
+        conn.execute(f"""CREATE TRIGGER {table}__rebuild_update AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {log_table} ({key_list}) VALUES ({old_keys});
+            INSERT INTO {log_table} ({key_list}) VALUES ({new_keys}); END""")
+        conn.execute(f"""CREATE TRIGGER {table}__rebuild_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {log_table} ({key_list}) VALUES ({old_keys}); END""")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # 主キー順に chunk_size 件ずつコピーする（rowid を持たないテーブルも同じ方法で読める）
+    after = f"({key_list}) > ({', '.join('?' for _ in key)})"
+    upper = f"({key_list}) <= ({', '.join('?' for _ in key)})"
+    boundary_sql = f"SELECT {key_list} FROM {table} {{where}} ORDER BY {key_list} LIMIT 1 OFFSET ?"
+    copy_sql = f"INSERT OR REPLACE INTO {new_table} ({column_list}) SELECT {column_list} FROM {table} {{where}}"
+    last_key = ()
+    while True:
+        with conn:
+            # チャンクの最後の行の主キーを索引だけで求めてから、その範囲をまとめてコピーする
+            where = f"WHERE {after}" if last_key else ""
+            boundary = conn.execute(boundary_sql.format(where=where), (*last_key, chunk_size - 1)).fetchone()
+            if boundary is None:
+                conn.execute(copy_sql.format(where=where), last_key)
+                break
+            where = f"WHERE {after} AND {upper}" if last_key else f"WHERE {upper}"
+            conn.execute(copy_sql.format(where=where), (*last_key, *boundary))
+        last_key = tuple(boundary)
+
+    # コピー中に溜まった変更を先に取り込み、最後のロック中の作業を短くする
+    upto = conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {log_table}").fetchone()[0]
+    with conn:
+        _replay_changes(conn, table, new_table, log_table, key_list, column_list, upto)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _replay_changes(conn, table, new_table, log_table, key_list, column_list, 2 ** 63 - 1)
+        # 元のテーブルを消すとトリガーも消える
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"DROP TABLE {log_table}")
+        conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        for index_sql in index_sqls:
+            conn.execute(index_sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# 検証用: forecasts を STRICT テーブルに作り直す（列の型を STRICT で使える型に変える）
+STRICT_FORECASTS_SQL = '''
+    CREATE TABLE {table} (
+        forecast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        area_code TEXT NOT NULL,
+        forecast_date TEXT NOT NULL,
+        forecast_time TEXT NOT NULL,
+        weather_description TEXT NOT NULL,
+        retrieved_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (area_code) REFERENCES areas(area_code),
+        UNIQUE(area_code, forecast_date, forecast_time)
+    ) STRICT
+'''
+FORECAST_COLUMNS = ("forecast_id", "area_code", "forecast_date", "forecast_time",
+                    "weather_description", "retrieved_at")
+
+
+def benchmark(rows: int = 1_000_000, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """rows 行の forecasts を持つDBでマイグレーションの時間を測る
+
+    1. 版1のDBに rows 行を入れ、版2以降（索引の作成・VACUUM）を適用する時間
+    2. rebuild_table で forecasts を STRICT に作り直す時間。作り直している間、
+       別の接続で追加・更新・削除を続け、読み込みの最大待ち時間と、
+       作り直した後の内容が書き込みをすべて反映しているかを確かめる
+    """
+    import os
+    import random
+    import sqlite3
+    import tempfile
+    import threading
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "migration_bench.db")
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        migrate(conn, MIGRATIONS[:1])
+        areas = [f"{(i + 1) * 10000:06d}" for i in range(58)]
+        days = -(-rows // (len(areas) * 3))
+        with conn:
+            conn.executemany("INSERT INTO areas (area_code, area_name) VALUES (?, ?)",
+                             [(code, f"地域{i}") for i, code in enumerate(areas)])
+            conn.execute('''
+                WITH RECURSIVE d(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM d WHERE n + 1 < ?1)
+                INSERT INTO forecasts (area_code, forecast_date, forecast_time, weather_description)
+                SELECT a.area_code, date('2000-01-01', '+' || d.n || ' days'), t.column1, '晴れ'
+                FROM d, (VALUES ('05:00'), ('11:00'), ('17:00')) t, areas a
+                LIMIT ?2
+            ''', (days, rows))
+
+        started = time.perf_counter()
+        migrate(conn, verbose=True)
+        results["migrate_seconds"] = round(time.perf_counter() - started, 2)
+
+        # 書き込みを同じトランザクションで mirror にも反映し、作り直した結果と比べる
+        with conn:
+            conn.execute("CREATE TABLE mirror AS SELECT * FROM forecasts")
+            conn.execute("CREATE UNIQUE INDEX idx_mirror_id ON mirror (forecast_id)")
+
+        stop = threading.Event()
+        stats = {"writes": 0, "max_read_ms": 0.0}
+
+        def writer():
+            wconn = sqlite3.connect(path, timeout=30)
+            rng = random.Random(0)
+            n = 0
+            while not stop.is_set():
+                forecast_id = rng.randint(1, rows)
+                with wconn:
+                    op = n % 3
+                    if op == 0:
+                        params = (areas[n % len(areas)], f"2100-01-{n % 28 + 1:02d}", f"{n:08d}")
+                        wconn.execute("INSERT INTO forecasts (area_code, forecast_date, forecast_time, "
+                                      "weather_description) VALUES (?, ?, ?, '雨')", params)
+                        wconn.execute("INSERT INTO mirror SELECT * FROM forecasts WHERE forecast_id = ?",
+                                      (wconn.execute("SELECT last_insert_rowid()").fetchone()[0],))
+                    else:
+                        for target in ("forecasts", "mirror"):
+                            if op == 1:
+                                wconn.execute(f"UPDATE {target} SET weather_description = ? "
+                                              "WHERE forecast_id = ?", (f"更新{n}", forecast_id))
+                            else:
+                                wconn.execute(f"DELETE FROM {target} WHERE forecast_id = ?", (forecast_id,))
+                n += 1
+                stats["writes"] = n
+                time.sleep(0.001)
+            wconn.close()
+
+        def reader():
+            rconn = sqlite3.connect(path, timeout=30)
+            while not stop.is_set():
+                started = time.perf_counter()
+                rconn.execute("SELECT COUNT(*) FROM forecasts WHERE area_code = ?", (areas[0],)).fetchone()
+                stats["max_read_ms"] = max(stats["max_read_ms"], (time.perf_counter() - started) * 1000)
+                time.sleep(0.01)
+            rconn.close()
+
+        threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+        for thread in threads:
+            thread.start()
+        started = time.perf_counter()
+        rebuild_table(conn, "forecasts", STRICT_FORECASTS_SQL, FORECAST_COLUMNS, chunk_size=chunk_size)
+        results["rebuild_seconds"] = round(time.perf_counter() - started, 2)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        columns = ", ".join(FORECAST_COLUMNS)
+        diff = conn.execute(f'''
+            SELECT COUNT(*) FROM (
+                SELECT {columns} FROM forecasts EXCEPT SELECT {columns} FROM mirror
+                UNION ALL
+                SELECT {columns} FROM mirror EXCEPT SELECT {columns} FROM forecasts
+            )
+        ''').fetchone()[0]
+        strict = conn.execute("SELECT strict FROM pragma_table_list WHERE name = 'forecasts'").fetchone()[0]
+        conn.close()
+
+    results.update(rows=rows, writes_during_rebuild=stats["writes"],
+                   max_read_ms=round(stats["max_read_ms"], 1), mismatched_rows=diff, strict=bool(strict))
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="weather_data.db のマイグレーション")
+    parser.add_argument("--bench", type=int, metavar="ROWS",
+                        help="ROWS 行の forecasts でマイグレーションとテーブルの作り直しの時間を測る")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.print_help()
+        return
+    result = benchmark(args.bench, args.chunk_size)
+    print(f"forecasts {result['rows']:,} 行")
+    print(f"版2以降の適用: {result['migrate_seconds']} 秒")
+    print(f"STRICT への作り直し: {result['rebuild_seconds']} 秒（その間の書き込み {result['writes_during_rebuild']} 回、"
+          f"読み込みの最大待ち {result['max_read_ms']} ms）")
+    print(f"書き込みの反映漏れ: {result['mismatched_rows']} 行")
+    assert result["mismatched_rows"] == 0 and result["strict"], "作り直したテーブルが元の内容と一致しません"
+
+
+if __name__ == "__main__":
+    main()